@@ -0,0 +1,145 @@
+"""extract_model_tm 微基准 - 对比原来逐个模式 re.findall 的实现和预编译的 FieldExtractor
+
+用法: python bench_extract.py [--repeat N]
+"""
+import argparse
+import random
+import re
+import timeit
+
+from ocr_server import extract_model_tm
+
+
+def legacy_extract_model_tm(text):
+    """原实现，作为结果一致性和性能的基准"""
+    if not text:
+        return {"model": None, "tm": None}
+
+    result = {"model": None, "tm": None}
+    text_upper = text.upper()
+
+    tm_patterns = [
+        r'TM[:\s]*(\d+-\d+-\d+-\d+[A-Z]*)',
+        r'TM[:\s]*(\d+-\d+-\d+-\d+)',
+        r'\b(\d+-\d+-\d+-\d+[A-Z]*)\b',
+        r'TM[:\s]*(\d+-\d+-\d+-\d+-\d+)',
+    ]
+
+    for pattern in tm_patterns:
+        matches = re.findall(pattern, text_upper)
+        for match in matches:
+            clean_match = match.strip()
+            if len(clean_match) >= 8 and re.match(r'\d+-\d+-\d+-', clean_match):
+                result['tm'] = clean_match
+                break
+        if result['tm']:
+            break
+
+    model_patterns = [
+        r'\b(MEP[-\s]*[0-9]+[A-Z]*)\b',
+        r'MODEL[:\s]*([A-Z0-9\-/]+)',
+        r'\b(M[0-9]+[A-Z]*/?[A-Z]*)\b',
+        r'\b([A-Z]{2,4}[-]?[0-9]{2,5}[A-Z]*/?[A-Z]*)\b'
+    ]
+
+    for pattern in model_patterns:
+        matches = re.findall(pattern, text_upper)
+        for match in matches:
+            clean_match = re.sub(r'\s+', '', match.strip())
+
+            exclude_patterns = [
+                r'^TM\b', r'^TO\b', r'^\d+-\d+-\d+-',
+                r'^120\b|^208\b|^240\b|^480\b'
+            ]
+
+            exclude_words = [
+                'US', 'NATO', 'DEPARTMENT', 'GENERATOR', 'ENGINE', 'DIESEL',
+                'POWER', 'ARMY', 'SYSTEM'
+            ]
+
+            should_exclude = (
+                any(re.match(exclude_pattern, clean_match) for exclude_pattern in exclude_patterns) or
+                any(word in clean_match for word in exclude_words) or
+                len(clean_match) < 2 or clean_match.isdigit()
+            )
+
+            if not should_exclude:
+                result['model'] = clean_match
+                break
+        if result['model']:
+            break
+
+    return result
+
+
+NAMEPLATES = [
+    "GENERATOR SET, DIESEL ENGINE\nMODEL MEP-803A\nNSN 6115-01-274-7389\nTM 9-6115-642-10\n120/208 VOLTS 3 PHASE\nSERIAL NO. FZ12345",
+    "U.S. ARMY\nMEP-831A\n3 KW TACTICAL QUIET GENERATOR\nTM 9-6115-639-13\nCONTRACT DAAE07-91-C-1234",
+    "RADIO SET AN/PRC-119\nSEE TM 11-5820-890-10-3\nMFR CAGE 80058",
+    "TRAILER MOUNTED POWER UNIT M200A/P\nTM 9-6150-226-13\nGVW 2500 LBS",
+    "MODEL: MEP-1030A\n240/416 V 50/60 HZ\nDEPARTMENT OF THE ARMY",
+    "HMMWV M1151\nREFER TM 9-2320-387-10 FOR OPERATION",
+    "NO TM ON PLATE\nSERIAL 240-XYZ\nTYPE AB-1234C",
+]
+
+FILLER = (
+    "THIS MANUAL CONTAINS INSTRUCTIONS FOR THE OPERATION AND MAINTENANCE OF THE EQUIPMENT. "
+    "DISTRIBUTION STATEMENT A: APPROVED FOR PUBLIC RELEASE. HEADQUARTERS, DEPARTMENT OF THE ARMY. "
+    "WARNING HIGH VOLTAGE 120 208 240 480 VOLTS. NSN 6115-01-275-5061 LIN J35813. "
+)
+
+
+def build_corpus(seed=7):
+    """短铭牌文本 + 拼接成的长文本（完整数据铭牌、手册封面）"""
+    rnd = random.Random(seed)
+    corpus = list(NAMEPLATES)
+    for size in (5, 20, 80):
+        parts = [FILLER * rnd.randint(1, 3) for _ in range(size)]
+        parts.insert(rnd.randrange(len(parts)), rnd.choice(NAMEPLATES))
+        corpus.append('\n'.join(parts))
+    return corpus
+
+
+def build_fuzz_corpus(count=20000, seed=11):
+    """随机拼接易混淆片段，用于验证两种实现结果完全一致"""
+    rnd = random.Random(seed)
+    tokens = ['TM', 'TM:', 'TM ', 'MODEL', 'MODEL:', 'MEP', 'MEP-', 'M', 'TO', 'US', ' ', '\n', '-', '/',
+              '1', '9', '24', '639', '6115', '10', '13', 'A', 'B', 'P', 'AN', 'PRC', '120', '480', 'ARMY']
+    return [''.join(rnd.choice(tokens) for _ in range(rnd.randint(1, 30))) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark extract_model_tm')
+    parser.add_argument('--repeat', type=int, default=200, help='passes over the corpus per timing')
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    fuzz = build_fuzz_corpus()
+
+    def with_candidates(text):
+        fields = extract_model_tm(text, with_candidates=True)
+        return {"model": fields["model"], "tm": fields["tm"]}
+
+    # 两种模式选出的字段都必须与原实现一致
+    mismatches = [text for text in corpus + fuzz
+                  if not legacy_extract_model_tm(text) == extract_model_tm(text) == with_candidates(text)]
+    print(f"consistency: {len(corpus) + len(fuzz) - len(mismatches)}/{len(corpus) + len(fuzz)} texts identical")
+    for text in mismatches[:5]:
+        print(f"  MISMATCH {text!r}: {legacy_extract_model_tm(text)} != {extract_model_tm(text)}")
+
+    print(f"corpus: {len(corpus)} texts, {sum(len(text) for text in corpus)} chars, {args.repeat} passes")
+    timings = [
+        ('legacy findall', lambda: [legacy_extract_model_tm(text) for text in corpus]),
+        ('FieldExtractor', lambda: [extract_model_tm(text) for text in corpus]),
+        ('FieldExtractor + candidates', lambda: [extract_model_tm(text, with_candidates=True) for text in corpus]),
+    ]
+    baseline = None
+    for name, func in timings:
+        elapsed = min(timeit.repeat(func, number=args.repeat, repeat=3))
+        per_text_us = elapsed / (args.repeat * len(corpus)) * 1e6
+        baseline = baseline or elapsed
+        print(f"  {name:<28} {per_text_us:8.1f} µs/text  ({baseline / elapsed:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""链接提取微基准 - 对比完整 BeautifulSoup 解析和流式 LinkExtractor
+
+用法: python bench_links.py [--links N] [--repeat N] [--url URL]
+
+默认使用生成的手册页面（结构类似 Green Mountain 的 manuals-and-support 页面），
+--url 时下载真实页面。早停场景模拟要找的 TM 出现在页面中部。
+"""
+import argparse
+import random
+import timeit
+
+import requests
+from bs4 import BeautifulSoup
+
+from ocr_server import iter_response_links
+
+
+class ChunkedResponse:
+    """模拟 stream=True 的响应，按块返回页面内容并记录读取的字节数"""
+
+    def __init__(self, body, encoding='utf-8'):
+        self.body = body
+        self.encoding = encoding
+        self.bytes_read = 0
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            chunk = self.body[start:start + chunk_size]
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+def build_page(link_count=2000, seed=5):
+    """生成带导航、段落和大量 TM PDF 链接的手册页面"""
+    rng = random.Random(seed)
+    parts = ['<html><head><title>Manuals &amp; Support</title>',
+             '<script>var x = "<a href=\'/not-a-link\'>";</script></head><body>']
+    parts += [f'<nav><a href="/page-{i}/" class="menu">Page {i}</a></nav>' for i in range(40)]
+    for i in range(link_count):
+        tm = f"9-6115-{rng.randint(100, 999)}-{rng.choice(['10', '12', '13', '14', '24P', '34'])}"
+        parts.append(
+            f'<p class="manual">Generator manual {i} &mdash; <strong>TM {tm}</strong><br>'
+            f'<a href="https://greenmountaingenerators.com/wp-content/uploads/2012/10/MEP-{i}-TM-{tm}.pdf">'
+            f'<span>Download</span> TM {tm}</a></p>'
+        )
+    parts.append('</body></html>')
+    return ''.join(parts).encode('utf-8')
+
+
+def soup_links(body):
+    soup = BeautifulSoup(body.decode('utf-8'), 'html.parser')
+    return [(link.get('href', ''), link.get_text().strip()) for link in soup.find_all('a', href=True)]
+
+
+def stream_links(body):
+    return list(iter_response_links(ChunkedResponse(body)))
+
+
+def stream_until(body, target, needed=3):
+    """流式扫描，找到 needed 个包含 target 的 PDF 链接后停止"""
+    response = ChunkedResponse(body)
+    found = 0
+    for href, _ in iter_response_links(response):
+        if href.endswith('.pdf') and target in href:
+            found += 1
+            if found >= needed:
+                break
+    return response.bytes_read
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark link extraction')
+    parser.add_argument('--links', type=int, default=2000, help='PDF links in the generated page')
+    parser.add_argument('--repeat', type=int, default=20, help='parses per timing')
+    parser.add_argument('--url', help='benchmark a live page instead of the generated one')
+    args = parser.parse_args()
+
+    if args.url:
+        body = requests.get(args.url, timeout=30).content
+        target = None
+    else:
+        body = build_page(args.links)
+        # 目标TM放在页面中部，重复三次
+        middle = body.index(b'<p class="manual">Generator manual', len(body) // 2)
+        extra = b''.join(
+            b'<a href="https://greenmountaingenerators.com/wp-content/uploads/TM-9-6115-000-%d.pdf">x</a>' % i
+            for i in range(3)
+        )
+        body = body[:middle] + extra + body[middle:]
+        target = 'TM-9-6115-000-'
+
+    expected = soup_links(body)
+    actual = stream_links(body)
+    print(f"page: {len(body)} bytes, {len(expected)} links")
+    print(f"consistency: {'identical' if expected == actual else 'MISMATCH'}")
+    if expected != actual:
+        for index, (old, new) in enumerate(zip(expected, actual)):
+            if old != new:
+                print(f"  first difference at link {index}: {old!r} != {new!r}")
+                break
+
+    timings = [
+        ('BeautifulSoup find_all', lambda: soup_links(body)),
+        ('LinkExtractor full scan', lambda: stream_links(body)),
+    ]
+    if target:
+        bytes_read = stream_until(body, target)
+        print(f"early termination reads {bytes_read}/{len(body)} bytes ({bytes_read / len(body):.0%})")
+        timings.append(('LinkExtractor early stop', lambda: stream_until(body, target)))
+
+    baseline = None
+    for name, func in timings:
+        elapsed = min(timeit.repeat(func, number=args.repeat, repeat=3))
+        per_parse_ms = elapsed / args.repeat * 1e3
+        baseline = baseline or elapsed
+        print(f"  {name:<26} {per_parse_ms:8.2f} ms/page  ({baseline / elapsed:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""/search 负载基准 - 并发请求下的吞吐量和延迟
+
+用法: python bench_server.py [--url URL] [--concurrency N] [--requests N] [--tm TM ...]
+                              [--tm-template 'TEMPLATE{n}']
+
+先启动服务（python ocr_server.py 或 gunicorn -c gunicorn.conf.py ocr_server:app）。
+压测期间另有一个线程定时请求 /health，用来观察慢搜索是否阻塞了其他请求。
+结果缓存会让重复的TM号直接命中，测实时搜索时用 RESULT_CACHE_ENABLED=0 CATALOG_ENABLED=0 启动服务。
+相同的TM号还会被合并成一次搜索；--tm-template 给每个请求生成不同的TM号（{n} 为请求序号），
+保证每个请求都真的跑一遍站点搜索。
+"""
+import argparse
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_TMS = ['9-6115-639-13', '9-6115-585-24P', '9-6115-545-10', '9-6115-464-12']
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(name, latencies, errors, elapsed=None):
+    line = (f"  {name:<8} n={len(latencies):<5} errors={errors:<4}"
+            f" p50={percentile(latencies, 0.5) * 1e3:7.1f} ms"
+            f" p95={percentile(latencies, 0.95) * 1e3:7.1f} ms"
+            f" max={max(latencies, default=0) * 1e3:7.1f} ms")
+    if elapsed:
+        line += f"  {len(latencies) / elapsed:7.1f} req/s"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /search under concurrent load')
+    parser.add_argument('--url', default='http://127.0.0.1:3000', help='server base URL')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=400, help='total /search requests')
+    parser.add_argument('--tm', action='append', help='TM number to search (repeatable)')
+    parser.add_argument('--tm-template', help="distinct TM number per request, e.g. '9-6115-{n}-10'")
+    parser.add_argument('--health-interval', type=float, default=0.1, help='seconds between /health probes')
+    args = parser.parse_args()
+
+    if args.tm_template:
+        tm_numbers = (args.tm_template.format(n=n) for n in itertools.count(1))
+    else:
+        tm_numbers = itertools.cycle(args.tm or DEFAULT_TMS)
+    tm_lock = threading.Lock()
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency + 1))
+
+    search_latencies, search_errors = [], 0
+    health_latencies, health_errors = [], 0
+    done = threading.Event()
+
+    def search_once(_):
+        nonlocal search_errors
+        with tm_lock:
+            tm_number = next(tm_numbers)
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{args.url}/search", json={'tm': tm_number}, timeout=120)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        search_latencies.append(time.perf_counter() - start)
+        if not ok:
+            search_errors += 1
+
+    def probe_health():
+        nonlocal health_errors
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                ok = session.get(f"{args.url}/health", timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            health_latencies.append(time.perf_counter() - start)
+            if not ok:
+                health_errors += 1
+            done.wait(args.health_interval)
+
+    print(f"{args.requests} /search requests, concurrency {args.concurrency}, {args.url}")
+    prober = threading.Thread(target=probe_health, daemon=True)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(search_once, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+
+    summarize('/search', search_latencies, search_errors, elapsed)
+    summarize('/health', health_latencies, health_errors)
+
+
+if __name__ == '__main__':
+    main()
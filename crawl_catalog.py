@@ -0,0 +1,26 @@
+"""离线爬取目标站点的PDF链接，写入本地手册索引
+
+用法:
+    python crawl_catalog.py              # 收集所有PDF链接
+    python crawl_catalog.py --verify     # 同时HEAD验证每个PDF并记录大小
+"""
+import argparse
+
+from ocr_server import searcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl target manual sites into the local PDF catalog')
+    parser.add_argument('--verify', action='store_true', help='HEAD each PDF to record last-verified time and content-length')
+    parser.add_argument('--max-pages', type=int, default=None, help='maximum pages to crawl per site')
+    args = parser.parse_args()
+
+    if not searcher.catalog:
+        print("⚠️ CATALOG_ENABLED=0, nothing to do")
+        return
+
+    searcher.crawl_catalog(verify_pdfs=args.verify, max_pages=args.max_pages)
+
+
+if __name__ == '__main__':
+    main()
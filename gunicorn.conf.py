@@ -0,0 +1,37 @@
+"""gunicorn 生产环境配置
+
+用法: gunicorn -c gunicorn.conf.py ocr_server:app
+
+gthread 工作模式：每个进程一个线程池，慢搜索、OCR轮询和SSE流只占用各自的线程，
+不会阻塞 /health 等其他请求。不预加载应用，每个进程在fork之后自己导入 ocr_server，
+搜索器、HTTP会话、线程池和SQLite连接都按进程创建一次。
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '3000')}"
+
+# 异步OCR任务、熔断状态和合并中的搜索都保存在进程内存里，
+# 多进程时 GET /extract-jobs/<id> 可能落到没有该任务的进程，默认单进程多线程
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '32'))
+
+# gthread 的 timeout 是进程心跳超时，不限制单个请求（SSE流可以长时间保持）
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+# 收到 SIGTERM 后等待进行中的请求完成的秒数
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+preload_app = False
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    import ocr_server
+    ocr_server.init_worker()
+
+
+def worker_exit(server, worker):
+    import ocr_server
+    ocr_server.shutdown_worker()
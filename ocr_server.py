@@ -1,18 +1,182 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify
 from flask_cors import CORS
-from bs4 import BeautifulSoup
-from urllib.parse import quote
+from werkzeug.exceptions import RequestEntityTooLarge
+from urllib.parse import quote, urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import aclosing
 import urllib.parse
 import os
 import time
 import re
+import json
+import sqlite3
+import threading
 import requests
-import tempfile
+import uuid
+import hashlib
+import io
 import urllib3
+import socket
+import ipaddress
+import codecs
+import copy
+import asyncio
+import itertools
+import csv
+from html.parser import HTMLParser
+from collections import OrderedDict, deque
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow为可选依赖
+    Image = None
+
+try:
+    import pytesseract
+except ImportError:  # 本地OCR为可选依赖，还需要系统安装tesseract
+    pytesseract = None
+
+try:
+    import aiohttp
+except ImportError:  # requirements.txt 已包含；本地开发环境没装时 /search-async 返回503
+    aiohttp = None
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，单进程运行时不需要文件锁
+    fcntl = None
+
+class InMemoryUploadRequest(Request):
+    """上传的文件保存在内存中而不是磁盘临时文件，大小由MAX_CONTENT_LENGTH限制
+
+    批量OCR一次上传多张照片，请求体上限单独使用 OCR_BATCH_MAX_BYTES
+    """
+    
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'extract_batch':
+            return OCR_BATCH_MAX_BYTES
+        return super().max_content_length
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
 
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 CORS(app, origins=['*'])
 
+# 上传大小上限，在读取请求体之前检查
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# 站点并发搜索配置
+SEARCH_PARALLEL = os.environ.get('SEARCH_PARALLEL', '1') != '0'
+SEARCH_MAX_WORKERS = int(os.environ.get('SEARCH_MAX_WORKERS', '8'))
+SEARCH_DEADLINE = float(os.environ.get('SEARCH_DEADLINE', '20'))
+PROBE_MAX_WORKERS = int(os.environ.get('PROBE_MAX_WORKERS', '16'))
+STREAM_HEARTBEAT_INTERVAL = float(os.environ.get('STREAM_HEARTBEAT_INTERVAL', '10'))
+CANCEL_POLL_INTERVAL = float(os.environ.get('CANCEL_POLL_INTERVAL', '0.2'))
+ASYNC_HTTP_LIMIT = int(os.environ.get('ASYNC_HTTP_LIMIT', '100'))
+LINK_SCAN_CHUNK_SIZE = int(os.environ.get('LINK_SCAN_CHUNK_SIZE', '16384'))
+
+# 批量TM解析配置（/search-bulk）
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', '1000'))
+BULK_MAX_CONCURRENCY = int(os.environ.get('BULK_MAX_CONCURRENCY', '4'))
+BULK_HOST_RATE = float(os.environ.get('BULK_HOST_RATE', '4'))
+BULK_HOST_BURST = int(os.environ.get('BULK_HOST_BURST', '8'))
+
+# 搜索结果缓存配置
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', '1') != '0'
+RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', 'search_cache.db')
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', str(7 * 24 * 3600)))
+RESULT_CACHE_NEGATIVE_TTL = float(os.environ.get('RESULT_CACHE_NEGATIVE_TTL', '3600'))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '5000'))
+
+# 页面条件请求缓存：保存索引页面解析出的链接和ETag/Last-Modified，304时直接使用
+PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '1') != '0'
+PAGE_CACHE_PATH = os.environ.get('PAGE_CACHE_PATH', 'page_cache.db')
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+# 页面的最近访问时间先记在内存里，每隔这么多秒批量写回SQLite（只影响LRU淘汰顺序）
+PAGE_CACHE_ACCESS_FLUSH_INTERVAL = float(os.environ.get('PAGE_CACHE_ACCESS_FLUSH_INTERVAL', '30'))
+
+# 本地PDF索引配置
+CATALOG_ENABLED = os.environ.get('CATALOG_ENABLED', '1') != '0'
+CATALOG_PATH = os.environ.get('CATALOG_PATH', 'manual_catalog.db')
+CATALOG_REFRESH_INTERVAL = float(os.environ.get('CATALOG_REFRESH_INTERVAL', '0'))
+CATALOG_MAX_PAGES = int(os.environ.get('CATALOG_MAX_PAGES', '50'))
+
+# OCR任务配置
+OCR_TIMEOUT = float(os.environ.get('OCR_TIMEOUT', '60'))
+OCR_JOB_WORKERS = int(os.environ.get('OCR_JOB_WORKERS', '4'))
+OCR_JOB_DEADLINE = float(os.environ.get('OCR_JOB_DEADLINE', '120'))
+OCR_JOB_RETENTION = float(os.environ.get('OCR_JOB_RETENTION', '3600'))
+# 排队中的任务各自在内存中保存整张图片，超过上限时新任务返回429
+OCR_JOB_MAX_QUEUED = int(os.environ.get('OCR_JOB_MAX_QUEUED', '32'))
+# 逗号分隔的回调主机白名单（.example.com 匹配所有子域名）；为空时拒绝回调到内网和本机地址
+OCR_CALLBACK_ALLOWED_HOSTS = [host.strip().lower() for host in os.environ.get('OCR_CALLBACK_ALLOWED_HOSTS', '').split(',')
+                              if host.strip()]
+OCR_POLL_INITIAL = float(os.environ.get('OCR_POLL_INITIAL', '0.25'))
+OCR_POLL_MAX = float(os.environ.get('OCR_POLL_MAX', '2'))
+OCR_POLL_BACKOFF = float(os.environ.get('OCR_POLL_BACKOFF', '1.6'))
+OCR_STREAM_UPLOAD = os.environ.get('OCR_STREAM_UPLOAD', '0') == '1'
+
+# OCR上传前的图片预处理配置
+OCR_PREPROCESS = os.environ.get('OCR_PREPROCESS', '1') != '0'
+OCR_MAX_DIMENSION = int(os.environ.get('OCR_MAX_DIMENSION', '2000'))
+OCR_GRAYSCALE = os.environ.get('OCR_GRAYSCALE', '1') != '0'
+OCR_TARGET_BYTES = int(os.environ.get('OCR_TARGET_BYTES', '1500000'))
+OCR_JPEG_QUALITY = int(os.environ.get('OCR_JPEG_QUALITY', '85'))
+OCR_MIN_JPEG_QUALITY = int(os.environ.get('OCR_MIN_JPEG_QUALITY', '50'))
+
+# 批量OCR配置
+OCR_BATCH_MAX_FILES = int(os.environ.get('OCR_BATCH_MAX_FILES', '50'))
+# 整个批量请求体的上限（每张图片仍受MAX_UPLOAD_BYTES限制）。上传的图片全部在内存中，
+# 每个并发的批量请求最多占用这么多内存，调大前先确认worker的内存余量
+OCR_BATCH_MAX_BYTES = int(os.environ.get('OCR_BATCH_MAX_BYTES', str(64 * 1024 * 1024)))
+OCR_BATCH_WORKERS = int(os.environ.get('OCR_BATCH_WORKERS', '8'))
+OCR_BATCH_TIMEOUT = float(os.environ.get('OCR_BATCH_TIMEOUT', '180'))
+
+# OCR结果缓存配置
+OCR_CACHE_ENABLED = os.environ.get('OCR_CACHE_ENABLED', '1') != '0'
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get('OCR_CACHE_MAX_ENTRIES', '256'))
+OCR_CACHE_TTL = float(os.environ.get('OCR_CACHE_TTL', '86400'))
+# 感知哈希只反映铭牌的整体布局，看不到文字：同型号不同TM的铭牌哈希可能完全相同，
+# 近似匹配会返回另一块铭牌的字段，因此默认关闭（-1），只在确定照片来源单一时开启
+OCR_CACHE_PHASH_DISTANCE = int(os.environ.get('OCR_CACHE_PHASH_DISTANCE', '-1'))
+
+# OCR后端配置：azure / tesseract / auto（先本地识别，提取不到字段再升级到Azure）
+OCR_BACKEND = os.environ.get('OCR_BACKEND', 'azure').lower()
+OCR_TESSERACT_LANG = os.environ.get('OCR_TESSERACT_LANG', 'eng')
+OCR_TESSERACT_CONFIG = os.environ.get('OCR_TESSERACT_CONFIG', '')
+OCR_BACKEND_STATS_WINDOW = int(os.environ.get('OCR_BACKEND_STATS_WINDOW', '200'))
+
+# HTTP连接池配置：每个主机的连接池大小、是否阻塞等待空闲连接、连接重试和TCP keep-alive
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', '20'))
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', str(PROBE_MAX_WORKERS)))
+HTTP_POOL_BLOCK = os.environ.get('HTTP_POOL_BLOCK', '0') == '1'
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '1'))
+HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', '0.3'))
+HTTP_KEEPALIVE = os.environ.get('HTTP_KEEPALIVE', '1') != '0'
+OCR_HTTP_POOL_MAXSIZE = int(os.environ.get('OCR_HTTP_POOL_MAXSIZE', str(max(OCR_BATCH_WORKERS, OCR_JOB_WORKERS) * 2)))
+
+# 站点熔断配置：连续失败或滚动错误率过高时，在冷却时间内跳过该站点
+SITE_BREAKER_FAILURES = int(os.environ.get('SITE_BREAKER_FAILURES', '3'))
+SITE_BREAKER_ERROR_RATE = float(os.environ.get('SITE_BREAKER_ERROR_RATE', '0.5'))
+SITE_BREAKER_MIN_CALLS = int(os.environ.get('SITE_BREAKER_MIN_CALLS', '6'))
+SITE_BREAKER_COOLDOWN = float(os.environ.get('SITE_BREAKER_COOLDOWN', '60'))
+SITE_HEALTH_WINDOW = int(os.environ.get('SITE_HEALTH_WINDOW', '50'))
+SITE_SLOW_LATENCY = float(os.environ.get('SITE_SLOW_LATENCY', '5'))
+
+# TLS回退策略：证书验证失败、跳过验证后成功的主机，在TTL内直接跳过验证，过期后重新验证
+TLS_FALLBACK_TTL = float(os.environ.get('TLS_FALLBACK_TTL', '3600'))
+
+# 版面分析配置：利用Azure返回的行/词坐标，按标签位置提取字段
+OCR_LAYOUT_EXTRACTION = os.environ.get('OCR_LAYOUT_EXTRACTION', '1') != '0'
+
 class ModelToTMMapper:
     """模型号到TM号的映射数据库"""
     
@@ -128,6 +292,907 @@ class ModelToTMMapper:
         
         return model
 
+class TMPrefixIndex:
+    """按段组织的TM号前缀树 - 查询 9-6115-639-* 下的所有TM号以及最接近的兄弟TM号"""
+    
+    def __init__(self, tm_numbers=()):
+        self.root = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        for tm in tm_numbers:
+            self.add(tm)
+
+    @staticmethod
+    def split(tm):
+        clean_tm = re.sub(r'^TM\s*', '', tm.upper().strip())
+        return [part for part in clean_tm.split('-') if part]
+
+    @staticmethod
+    def _segment_key(segment):
+        """拆分段为数字和后缀，如 24P → (24, 'P')"""
+        match = re.match(r'(\d*)(.*)', segment)
+        return (int(match.group(1)) if match.group(1) else 0, match.group(2))
+
+    def add(self, tm):
+        parts = self.split(tm)
+        if len(parts) < 3:
+            return
+        
+        with self.lock:
+            node = self.root
+            for part in parts:
+                node = node.setdefault(part, {})
+            # None键标记完整的TM号
+            if None not in node:
+                node[None] = '-'.join(parts)
+                self.size += 1
+
+    def under(self, prefix):
+        """返回prefix下的所有TM号（按段匹配）"""
+        parts = self.split(prefix)
+        found = []
+        
+        with self.lock:
+            node = self.root
+            for part in parts:
+                node = node.get(part)
+                if node is None:
+                    return []
+            
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                for key, child in current.items():
+                    if key is None:
+                        found.append(child)
+                    else:
+                        stack.append(child)
+        
+        return sorted(found)
+
+    def siblings(self, tm):
+        """前三段相同的其他TM号，按第四段的接近程度排序"""
+        parts = self.split(tm)
+        if len(parts) < 3:
+            return []
+        
+        target_tm = '-'.join(parts)
+        target_key = self._segment_key(parts[3]) if len(parts) > 3 else (0, '')
+        
+        def distance(candidate):
+            candidate_parts = candidate.split('-')
+            number, suffix = self._segment_key(candidate_parts[3]) if len(candidate_parts) > 3 else (0, '')
+            return (abs(number - target_key[0]), suffix != target_key[1],
+                    len(candidate_parts) != len(parts), candidate)
+        
+        candidates = [candidate for candidate in self.under('-'.join(parts[:3])) if candidate != target_tm]
+        return sorted(candidates, key=distance)
+
+    def closest_sibling(self, tm):
+        siblings = self.siblings(tm)
+        return siblings[0] if siblings else None
+
+class ManualCatalog:
+    """本地PDF索引 - 由离线爬虫从目标站点收集，SQLite持久化，内存中按TM号索引"""
+    
+    def __init__(self, path, tm_index=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.by_tm = {}
+        self.tm_index = tm_index if tm_index is not None else TMPrefixIndex()
+        
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS manual_catalog ('
+            'url TEXT PRIMARY KEY, tm TEXT NOT NULL, site TEXT NOT NULL, '
+            'last_verified REAL, content_length INTEGER)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_manual_catalog_tm ON manual_catalog (tm)')
+        self.conn.commit()
+        self.load()
+
+    def load(self):
+        """从SQLite加载索引到内存"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT url, tm, site, last_verified, content_length FROM manual_catalog'
+            ).fetchall()
+            self.by_tm = {}
+            for url, tm, site, last_verified, content_length in rows:
+                self.by_tm.setdefault(tm, {})[url] = {
+                    'url': url,
+                    'tm': tm,
+                    'site': site,
+                    'last_verified': last_verified,
+                    'content_length': content_length
+                }
+        
+        for tm in self.by_tm:
+            self.tm_index.add(tm)
+        print(f"📚 Manual catalog loaded: {len(rows)} PDFs, {len(self.by_tm)} TM numbers")
+
+    def add(self, tm, site, url, last_verified=None, content_length=None):
+        """添加或更新一个PDF条目"""
+        entry = {
+            'url': url,
+            'tm': tm,
+            'site': site,
+            'last_verified': last_verified,
+            'content_length': content_length
+        }
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO manual_catalog (url, tm, site, last_verified, content_length) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (url, tm, site, last_verified, content_length)
+            )
+            self.conn.commit()
+            self.by_tm.setdefault(tm, {})[url] = entry
+        
+        self.tm_index.add(tm)
+
+    def lookup(self, tm):
+        """精确查找TM号"""
+        with self.lock:
+            return list(self.by_tm.get(tm, {}).values())
+
+    def lookup_prefix(self, tm):
+        """查找与tm前三段相同的TM号，最接近的排在前面"""
+        entries = []
+        with self.lock:
+            for sibling in self.tm_index.siblings(tm):
+                entries.extend(self.by_tm.get(sibling, {}).values())
+        return entries
+
+    def stats(self):
+        with self.lock:
+            return {
+                'tm_numbers': len(self.by_tm),
+                'pdfs': sum(len(urls) for urls in self.by_tm.values())
+            }
+
+class InstrumentedPoolMixin:
+    """统计等待空闲连接的次数/时间，以及连接池满时被丢弃的连接数"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.num_waits = 0
+        self.wait_time = 0.0
+        self.num_discarded = 0
+    
+    def _get_conn(self, timeout=None):
+        start = time.time()
+        conn = super()._get_conn(timeout=timeout)
+        waited = time.time() - start
+        if waited > 0.001:
+            with self.stats_lock:
+                self.num_waits += 1
+                self.wait_time += waited
+        return conn
+    
+    def _put_conn(self, conn):
+        if self.pool is not None and self.pool.full():
+            with self.stats_lock:
+                self.num_discarded += 1
+        super()._put_conn(conn)
+
+class InstrumentedHTTPConnectionPool(InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+class InstrumentedHTTPSConnectionPool(InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """带统计的连接池适配器，可选为连接开启TCP keep-alive"""
+    
+    def __init__(self, keepalive=True, **kwargs):
+        self.keepalive = keepalive
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.keepalive:
+            pool_kwargs['socket_options'] = HTTPConnectionPool.ConnectionCls.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': InstrumentedHTTPConnectionPool,
+            'https': InstrumentedHTTPSConnectionPool,
+        }
+
+class HTTPClient:
+    """共享的requests.Session，按主机挂载独立配置的连接池
+
+    requests会按URL前缀选择适配器；每个适配器内urllib3为每个主机维护一个连接池，
+    池的取放是线程安全的，所以同一个Session可以被所有Flask线程和搜索线程共用。
+    host_settings: {主机: {'pool_maxsize', 'retries', 'pool_block'}}，未列出的主机使用默认配置
+    """
+    
+    def __init__(self, headers=None, host_settings=None, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 retries=HTTP_RETRIES, pool_block=HTTP_POOL_BLOCK, keepalive=HTTP_KEEPALIVE):
+        self.defaults = {'pool_maxsize': pool_maxsize, 'retries': retries, 'pool_block': pool_block}
+        self.keepalive = keepalive
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        self.session.headers['Connection'] = 'keep-alive' if keepalive else 'close'
+        
+        default_adapter = self._make_adapter(self.defaults)
+        self.session.mount('http://', default_adapter)
+        self.session.mount('https://', default_adapter)
+        
+        self.host_settings = {}
+        for host, settings in (host_settings or {}).items():
+            settings = {**self.defaults, **settings}
+            self.host_settings[host] = settings
+            adapter = self._make_adapter(settings)
+            self.session.mount(f'http://{host}/', adapter)
+            self.session.mount(f'https://{host}/', adapter)
+    
+    def _make_adapter(self, settings):
+        # 只重试连接失败，读超时和HTTP状态不重试，避免把慢站点的超时翻倍
+        retry = Retry(
+            total=settings['retries'], connect=settings['retries'], read=0, status=0,
+            backoff_factor=HTTP_RETRY_BACKOFF, allowed_methods=frozenset({'HEAD', 'GET'}),
+            raise_on_status=False
+        )
+        return PooledHTTPAdapter(
+            keepalive=self.keepalive,
+            pool_connections=HTTP_POOL_CONNECTIONS,
+            pool_maxsize=settings['pool_maxsize'],
+            pool_block=settings['pool_block'],
+            max_retries=retry
+        )
+    
+    def stats(self):
+        """每个主机连接池的新建连接数、请求数、复用率和等待次数"""
+        pools = []
+        seen_adapters = set()
+        for adapter in self.session.adapters.values():
+            if id(adapter) in seen_adapters:
+                continue
+            seen_adapters.add(id(adapter))
+            
+            for key in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                num_requests = pool.num_requests
+                pools.append({
+                    'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                    'maxsize': adapter._pool_maxsize,
+                    'block': adapter._pool_block,
+                    # 队列中预填了None占位，只统计真正空闲的连接
+                    'idle_connections': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+                    'connections_created': pool.num_connections,
+                    'requests': num_requests,
+                    'reuse_ratio': round(1 - pool.num_connections / num_requests, 3) if num_requests else None,
+                    'waits': getattr(pool, 'num_waits', 0),
+                    'wait_time': round(getattr(pool, 'wait_time', 0.0), 3),
+                    'discarded': getattr(pool, 'num_discarded', 0),
+                })
+        
+        total_requests = sum(pool['requests'] for pool in pools)
+        total_connections = sum(pool['connections_created'] for pool in pools)
+        return {
+            'defaults': self.defaults,
+            'host_settings': self.host_settings,
+            'keepalive': self.keepalive,
+            'requests': total_requests,
+            'connections_created': total_connections,
+            'reuse_ratio': round(1 - total_connections / total_requests, 3) if total_requests else None,
+            'pools': sorted(pools, key=lambda pool: pool['host']),
+        }
+
+class LinkExtractor(HTMLParser):
+    """只提取 <a href> 和链接文字的增量HTML解析器，不建立文档树
+
+    可以分块feed，每块解析完后用pop_links()取出新出现的链接
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self._href = None
+        self._text = []
+    
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        # 未闭合的<a>遇到下一个<a>时先结束
+        self._finish_link()
+        for name, value in attrs:
+            if name == 'href':
+                self._href = value or ''
+                self._text = []
+                break
+    
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._finish_link()
+    
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+    
+    def _finish_link(self):
+        if self._href is not None:
+            self.links.append((self._href, ''.join(self._text).strip()))
+            self._href = None
+            self._text = []
+    
+    def close(self):
+        super().close()
+        self._finish_link()
+    
+    def pop_links(self):
+        links = self.links
+        self.links = []
+        return links
+
+def iter_response_links(response, chunk_size=None):
+    """边下载边解析响应中的链接，逐个产出 (href, 链接文字)
+
+    请求用stream=True时，调用方找到足够结果后停止迭代，剩余的页面内容就不再下载
+    """
+    parser = LinkExtractor()
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    for chunk in response.iter_content(chunk_size or LINK_SCAN_CHUNK_SIZE):
+        parser.feed(decoder.decode(chunk))
+        yield from parser.pop_links()
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    yield from parser.pop_links()
+
+class SiteUnavailableError(Exception):
+    """站点熔断中，请求未发出"""
+
+class SiteSearchError(Exception):
+    """站点搜索没有结果，但其中有请求出错，这次的空结果不完整，不能写入缓存"""
+
+    def __init__(self, site_name, errors):
+        self.site_name = site_name
+        self.errors = errors
+        super().__init__(f"{site_name}: {len(errors)} request(s) failed, last error: {errors[-1]}")
+
+class SiteHealthTracker:
+    """每个站点的滚动延迟/错误率和熔断状态
+
+    连接错误、超时和5xx算失败（SSL证书错误由_make_safe_request处理，不计入）。
+    连续失败SITE_BREAKER_FAILURES次，或最近窗口内错误率达到SITE_BREAKER_ERROR_RATE时熔断，
+    冷却期内跳过该站点；冷却结束后放行请求（半开），成功则恢复，失败则重新熔断
+    """
+    
+    def __init__(self, window, failure_threshold, error_rate, min_calls, cooldown):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.sites = {}
+        self.lock = threading.Lock()
+    
+    def _site(self, site):
+        return self.sites.setdefault(site, {
+            'calls': deque(maxlen=self.window),
+            'consecutive_failures': 0,
+            'open_until': None,
+            'times_opened': 0,
+            'skipped': 0
+        })
+    
+    def is_open(self, site):
+        """熔断中返回True"""
+        with self.lock:
+            entry = self.sites.get(site)
+            return bool(entry and entry['open_until'] and time.time() < entry['open_until'])
+    
+    def skip(self, site):
+        """熔断中时记录一次跳过并返回True"""
+        with self.lock:
+            entry = self.sites.get(site)
+            if entry and entry['open_until'] and time.time() < entry['open_until']:
+                entry['skipped'] += 1
+                return True
+            return False
+    
+    def record(self, site, elapsed, ok):
+        with self.lock:
+            entry = self._site(site)
+            entry['calls'].append((elapsed, ok))
+            now = time.time()
+            
+            if ok:
+                entry['consecutive_failures'] = 0
+                if entry['open_until'] is not None and now >= entry['open_until']:
+                    entry['open_until'] = None
+                    print(f"  🟢 {site} recovered, circuit closed")
+                return
+            
+            entry['consecutive_failures'] += 1
+            if entry['open_until'] is not None and now < entry['open_until']:
+                return
+            
+            half_open = entry['open_until'] is not None
+            failures = sum(1 for _, call_ok in entry['calls'] if not call_ok)
+            rate_tripped = len(entry['calls']) >= self.min_calls and failures / len(entry['calls']) >= self.error_rate
+            if half_open or entry['consecutive_failures'] >= self.failure_threshold or rate_tripped:
+                entry['open_until'] = now + self.cooldown
+                entry['times_opened'] += 1
+                print(f"  🔴 {site} circuit open for {self.cooldown:.0f}s "
+                      f"({entry['consecutive_failures']} consecutive failures, {failures}/{len(entry['calls'])} recent)")
+    
+    def stats(self):
+        with self.lock:
+            now = time.time()
+            sites = {}
+            for site, entry in self.sites.items():
+                calls = list(entry['calls'])
+                latencies = sorted(elapsed for elapsed, _ in calls)
+                error_rate = sum(1 for _, ok in calls if not ok) / len(calls) if calls else 0.0
+                avg_latency = sum(latencies) / len(latencies) if latencies else 0.0
+                # 健康分：无错误且平均延迟不超过SITE_SLOW_LATENCY时为1
+                latency_factor = min(1.0, SITE_SLOW_LATENCY / avg_latency) if avg_latency else 1.0
+                open_now = bool(entry['open_until'] and now < entry['open_until'])
+                sites[site] = {
+                    'state': 'open' if open_now else ('half_open' if entry['open_until'] else 'closed'),
+                    'retry_in': round(entry['open_until'] - now, 1) if open_now else None,
+                    'recent_calls': len(calls),
+                    'error_rate': round(error_rate, 3),
+                    'avg_latency': round(avg_latency, 3),
+                    'p95_latency': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else None,
+                    'consecutive_failures': entry['consecutive_failures'],
+                    'times_opened': entry['times_opened'],
+                    'skipped': entry['skipped'],
+                    'health_score': round((1 - error_rate) * latency_factor, 3)
+                }
+            return sites
+
+class TLSPolicyCache:
+    """记住哪些主机需要跳过SSL验证，避免每次请求都先失败一次TLS握手
+
+    跳过验证成功后记住该主机TTL秒；过期后的第一个请求重新带验证探测，
+    其余并发请求在探测期间继续跳过验证。每个决策都记入计数和审计日志
+    """
+    
+    def __init__(self, ttl, audit_size=100):
+        self.ttl = ttl
+        self.hosts = {}
+        self.metrics = {
+            'ssl_failures': 0,
+            'fallback_succeeded': 0,
+            'fallback_failed': 0,
+            'insecure_direct': 0,
+            'reprobes': 0,
+            'recovered': 0
+        }
+        self.audit = deque(maxlen=audit_size)
+        self.lock = threading.Lock()
+    
+    def _log(self, host, decision, detail=None):
+        self.audit.append({'time': round(time.time(), 3), 'host': host, 'decision': decision, 'detail': detail})
+    
+    def should_verify(self, host):
+        """该主机的请求是否带SSL验证"""
+        if host not in self.hosts:
+            return True
+        with self.lock:
+            entry = self.hosts.get(host)
+            if entry is None:
+                return True
+            now = time.time()
+            if now < entry['expires_at']:
+                self.metrics['insecure_direct'] += 1
+                return False
+            # 过期：本次请求重新验证，期间其他请求仍按旧策略
+            entry['expires_at'] = now + self.ttl
+            self.metrics['reprobes'] += 1
+            self._log(host, 'reprobe')
+            return True
+    
+    def record_verified(self, host):
+        """带验证的请求成功 - 主机证书已修复时移除回退策略"""
+        if host not in self.hosts:
+            return
+        with self.lock:
+            if self.hosts.pop(host, None) is not None:
+                self.metrics['recovered'] += 1
+                self._log(host, 'verified', 'certificate valid again, fallback removed')
+                print(f"  🔒 {host}: SSL verification works again")
+    
+    def record_ssl_failure(self, host, error):
+        with self.lock:
+            self.metrics['ssl_failures'] += 1
+            self._log(host, 'ssl_failure', str(error)[:200])
+    
+    def record_fallback(self, host, ok, error=None):
+        """跳过验证重试的结果，成功时记住该主机"""
+        with self.lock:
+            if ok:
+                self.metrics['fallback_succeeded'] += 1
+                now = time.time()
+                entry = self.hosts.setdefault(host, {'learned_at': now, 'fallbacks': 0})
+                entry['fallbacks'] += 1
+                entry['expires_at'] = now + self.ttl
+                self._log(host, 'insecure', f'verification skipped for {self.ttl:.0f}s')
+            else:
+                self.metrics['fallback_failed'] += 1
+                self._log(host, 'fallback_failed', str(error)[:200] if error else None)
+    
+    def stats(self):
+        with self.lock:
+            now = time.time()
+            return {
+                'ttl': self.ttl,
+                'metrics': dict(self.metrics),
+                'insecure_hosts': {
+                    host: {
+                        'learned_at': round(entry['learned_at'], 3),
+                        'reprobe_in': round(max(entry['expires_at'] - now, 0), 1),
+                        'fallbacks': entry['fallbacks']
+                    }
+                    for host, entry in self.hosts.items()
+                },
+                'audit': list(self.audit)
+            }
+
+class PageCache:
+    """页面链接缓存 - SQLite持久化，保存解析出的链接及ETag/Last-Modified，用于条件请求
+
+    按链接数据的总字节数限制大小，超出时按最近访问时间LRU淘汰。
+    读取不写数据库：最近访问时间记在内存中，每隔access_flush_interval秒或淘汰前批量写回
+    """
+    
+    def __init__(self, path, max_bytes, access_flush_interval=PAGE_CACHE_ACCESS_FLUSH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.access_flush_interval = access_flush_interval
+        self.pending_access = {}
+        self.last_access_flush = time.time()
+        self.hits = 0
+        self.fresh_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bytes_saved = 0
+        self.lock = threading.Lock()
+        
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS page_cache ('
+            'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, links TEXT NOT NULL, '
+            'size INTEGER NOT NULL, body_bytes INTEGER NOT NULL, fresh_until REAL NOT NULL, '
+            'last_access REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_page_cache_access ON page_cache (last_access)')
+        self.conn.commit()
+
+    def get(self, url):
+        """返回 {'etag', 'last_modified', 'links', 'fresh', 'body_bytes'}，未缓存时返回None"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT etag, last_modified, links, fresh_until, body_bytes FROM page_cache WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            
+            self.pending_access[url] = now
+            if now - self.last_access_flush >= self.access_flush_interval:
+                self._write_access()
+                self.conn.commit()
+            return {
+                'etag': row[0],
+                'last_modified': row[1],
+                'links': [tuple(link) for link in json.loads(row[2])],
+                'fresh': row[3] > now,
+                'body_bytes': row[4]
+            }
+
+    def _write_access(self):
+        """把内存中的最近访问时间写入数据库（调用方持有锁并负责commit）"""
+        if self.pending_access:
+            self.conn.executemany(
+                'UPDATE page_cache SET last_access = ? WHERE url = ?',
+                [(accessed, url) for url, accessed in self.pending_access.items()]
+            )
+            self.pending_access = {}
+        self.last_access_flush = time.time()
+
+    def flush(self):
+        """写回尚未保存的访问时间，进程退出前调用"""
+        with self.lock:
+            if self.pending_access:
+                self._write_access()
+                self.conn.commit()
+
+    def record_hit(self, body_bytes, fresh=False):
+        """304或仍在max-age内时记一次命中，body_bytes为省下的下载量"""
+        with self.lock:
+            if fresh:
+                self.fresh_hits += 1
+            else:
+                self.hits += 1
+            self.bytes_saved += body_bytes
+
+    def revalidated(self, url, max_age=None):
+        """304后按新的max-age延长新鲜期"""
+        with self.lock:
+            self.conn.execute(
+                'UPDATE page_cache SET fresh_until = ? WHERE url = ?',
+                (time.time() + (max_age or 0), url)
+            )
+            self.conn.commit()
+
+    def set(self, url, etag, last_modified, links, body_bytes, max_age=None):
+        data = json.dumps(links)
+        size = len(data)
+        if size > self.max_bytes // 4:
+            return
+        
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO page_cache '
+                '(url, etag, last_modified, links, size, body_bytes, fresh_until, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, etag, last_modified, data, size, body_bytes, now + (max_age or 0), now)
+            )
+            self.stores += 1
+            self.pending_access.pop(url, None)
+            
+            # 超出容量时淘汰最久未访问的页面，先写回内存中的访问时间
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM page_cache').fetchone()[0]
+            if total > self.max_bytes:
+                self._write_access()
+                evict = []
+                for old_url, old_size in self.conn.execute(
+                    'SELECT url, size FROM page_cache WHERE url != ? ORDER BY last_access ASC', (url,)
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((old_url,))
+                    total -= old_size
+                self.conn.executemany('DELETE FROM page_cache WHERE url = ?', evict)
+                for (old_url,) in evict:
+                    self.pending_access.pop(old_url, None)
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM page_cache'
+            ).fetchone()
+            return {
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'not_modified_hits': self.hits,
+                'fresh_hits': self.fresh_hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'bytes_saved': self.bytes_saved
+            }
+
+def parse_max_age(response):
+    """Cache-Control的max-age秒数；no-store时返回-1，没有时返回None"""
+    cache_control = response.headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control:
+        return -1
+    match = re.search(r'max-age=(\d+)', cache_control)
+    return int(match.group(1)) if match else None
+
+class SearchCancelledError(BaseException):
+    """搜索已被取消（客户端断开等）
+
+    与 asyncio.CancelledError 一样继承 BaseException，站点搜索里大量的
+    except Exception 不会把取消当成普通错误吞掉，而是一直传到发起搜索的地方
+    """
+
+class CancellationStats:
+    """被取消的工作计数：取消的搜索、没有发出的请求、放弃的探测和页面等"""
+    
+    def __init__(self):
+        self.counts = {
+            'searches_cancelled': 0,
+            'streams_disconnected': 0,
+            'requests_skipped': 0,
+            'probes_cancelled': 0,
+            'pages_aborted': 0,
+            'flight_waits_abandoned': 0,
+            'sites_abandoned': 0,
+            'batches_disconnected': 0
+        }
+        self.lock = threading.Lock()
+    
+    def record(self, name, count=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + count
+    
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+cancel_stats = CancellationStats()
+
+class CancellationToken:
+    """协作式取消标记，随搜索一路传到HTTP层，在探测和请求之间检查
+
+    rate_limiter不为None时，HTTP层每次发请求前先按目标主机限速（批量解析使用）；
+    parent不为None时是子标记：父标记取消时一起取消，自己取消不影响父标记，没有自己的限速器时沿用父标记当前的
+    """
+    
+    def __init__(self, rate_limiter=None, parent=None):
+        self.event = threading.Event()
+        self.parent = parent
+        self.own_rate_limiter = rate_limiter
+    
+    @property
+    def rate_limiter(self):
+        if self.own_rate_limiter is not None:
+            return self.own_rate_limiter
+        return self.parent.rate_limiter if self.parent is not None else None
+    
+    def cancel(self, counter='searches_cancelled', count=1):
+        if not self.event.is_set():
+            self.event.set()
+            if counter and count:
+                cancel_stats.record(counter, count)
+    
+    @property
+    def cancelled(self):
+        return self.event.is_set() or (self.parent is not None and self.parent.cancelled)
+    
+    def check(self, counter=None):
+        """已取消时抛出 SearchCancelledError，并把被跳过的工作记到 counter"""
+        if self.cancelled:
+            if counter:
+                cancel_stats.record(counter)
+            raise SearchCancelledError('search cancelled')
+
+class SharedCancellationToken(CancellationToken):
+    """多个调用方共享一次搜索时使用：所有调用方都取消后才算取消，有不可取消的调用方时永不取消"""
+    
+    def __init__(self):
+        super().__init__()
+        self.tokens = []
+        self.lock = threading.Lock()
+    
+    def attach(self, token):
+        with self.lock:
+            self.tokens.append(token)
+    
+    @property
+    def rate_limiter(self):
+        """所有调用方都用同一个限速器（都是批量解析）时才限速，交互式调用方加入后立即不再限速"""
+        with self.lock:
+            tokens = list(self.tokens)
+        limiters = [token.rate_limiter if token is not None else None for token in tokens]
+        if limiters and limiters[0] is not None and all(limiter is limiters[0] for limiter in limiters):
+            return limiters[0]
+        return None
+    
+    @property
+    def cancelled(self):
+        with self.lock:
+            return bool(self.tokens) and all(token is not None and token.cancelled for token in self.tokens)
+
+class HostRateLimiter:
+    """按主机的令牌桶：每个主机每秒最多 rate 个请求，允许 burst 个突发，rate<=0 时不限速"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.buckets = {}  # host -> (剩余令牌, 上次补充时间)
+        self.requests = {}
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.lock = threading.Lock()
+    
+    def acquire(self, host, cancel_token=None):
+        """等到 host 有可用令牌；等待期间按 CANCEL_POLL_INTERVAL 检查取消"""
+        if self.rate <= 0:
+            return
+        
+        started = None
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                tokens, updated = self.buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                if tokens >= 1:
+                    self.buckets[host] = (tokens - 1, now)
+                    self.requests[host] = self.requests.get(host, 0) + 1
+                    if started is not None:
+                        self.waits += 1
+                        self.wait_seconds += now - started
+                    return
+                self.buckets[host] = (tokens, now)
+                delay = (1 - tokens) / self.rate
+            
+            if started is None:
+                started = now
+            time.sleep(min(delay, CANCEL_POLL_INTERVAL))
+            if cancel_token:
+                cancel_token.check('requests_skipped')
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'requests': dict(self.requests),
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 2)
+            }
+
+class SingleFlight:
+    """相同键的并发调用只执行一次，其余调用方等待并共享同一结果（或同一异常）
+
+    结果在完成时深拷贝一份快照，每个等待者拿到各自的副本，调用方可以放心修改。
+    cancellable为True时，func以 cancel_token=共享取消标记 调用，所有调用方都取消后才会停止；
+    单个等待者取消时只放弃等待
+    """
+    
+    def __init__(self, name, cancellable=False):
+        self.name = name
+        self.cancellable = cancellable
+        self.calls = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.lock = threading.Lock()
+    
+    def do(self, key, func, *args, cancel_token=None, **kwargs):
+        if cancel_token:
+            cancel_token.check()
+        
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None,
+                        'token': SharedCancellationToken() if self.cancellable else None}
+                self.calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+            if call['token']:
+                call['token'].attach(cancel_token)
+        
+        if not leader:
+            print(f"  🔗 Joining in-flight {self.name}: {key}")
+            while not call['done'].wait(CANCEL_POLL_INTERVAL if cancel_token else None):
+                cancel_token.check('flight_waits_abandoned')
+            if isinstance(call['error'], SearchCancelledError) and not (cancel_token and cancel_token.cancelled):
+                # 加入时其他调用方恰好都已取消，自己重新发起一次
+                return self.do(key, func, *args, cancel_token=cancel_token, **kwargs)
+            if call['error'] is not None:
+                raise call['error']
+            return copy.deepcopy(call['result'])
+        
+        if call['token']:
+            kwargs['cancel_token'] = call['token']
+        try:
+            result = func(*args, **kwargs)
+            call['result'] = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['done'].set()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': len(self.calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced
+            }
+
 class RealisticManualSearcher:
     def __init__(self):
         self.target_sites = [
@@ -135,6 +1200,7 @@ class RealisticManualSearcher:
                 'name': 'Liberated Manuals',
                 'domain': 'www.liberatedmanuals.com',
                 'priority': 1,
+                'index_pages': ['https://www.liberatedmanuals.com/'],
                 'methods': [
                     {
                         'type': 'direct_pdf_patterns',
@@ -150,6 +1216,7 @@ class RealisticManualSearcher:
                 'name': 'Green Mountain Generators',
                 'domain': 'greenmountaingenerators.com',
                 'priority': 2,
+                'index_pages': ['https://greenmountaingenerators.com/manuals-and-support/'],
                 'methods': [
                     {
                         'type': 'direct_and_search',
@@ -166,6 +1233,7 @@ class RealisticManualSearcher:
                 'name': 'Combat Index',
                 'domain': 'combatindex.com',
                 'priority': 3,
+                'index_pages': ['http://combatindex.com/store/tech_man/Sample/Generators/'],
                 'methods': [
                     {
                         'type': 'direct_pdf_patterns',
@@ -181,6 +1249,7 @@ class RealisticManualSearcher:
                 'name': 'Radio Nerds',
                 'domain': 'radionerds.com',
                 'priority': 4,
+                'index_pages': ['https://radionerds.com/index.php?title=Special:ListFiles&limit=500'],
                 'methods': [
                     {
                         'type': 'site_search_only',  # No more hardcoded paths
@@ -191,45 +1260,195 @@ class RealisticManualSearcher:
             },            
         ]
         
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Connection': 'keep-alive'
-        })
+        # 所有搜索线程共用的HTTP客户端，每个站点一个连接池；站点可用 'http' 覆盖池大小/重试
+        self.http = HTTPClient(
+            headers={
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.9'
+            },
+            host_settings={site['domain']: site.get('http', {}) for site in self.target_sites}
+        )
+        self.session = self.http.session
         
         # 初始化模型映射器
         self.model_mapper = ModelToTMMapper()
 
+        # 所有已知TM号的前缀树，由映射表和爬取到的链接填充
+        self.tm_index = TMPrefixIndex(
+            tm for tm_list in self.model_mapper.all_mappings.values() for tm in tm_list
+        )
+
+        # 本地PDF索引
+        self.catalog = ManualCatalog(CATALOG_PATH, self.tm_index) if CATALOG_ENABLED else None
+
+        # 各站点的专用搜索方法
+        self.site_search_methods = {
+            'Liberated Manuals': self.search_liberated_manuals,
+            'Green Mountain Generators': self.search_green_mountain,
+            'Combat Index': self.search_combat_index,
+            'Radio Nerds': self.search_radio_nerds,
+        }
+
+        # 站点健康状态和熔断器，请求按主机归属到站点
+        self.site_health = SiteHealthTracker(
+            SITE_HEALTH_WINDOW, SITE_BREAKER_FAILURES, SITE_BREAKER_ERROR_RATE,
+            SITE_BREAKER_MIN_CALLS, SITE_BREAKER_COOLDOWN
+        )
+        self.site_hosts = {site['domain'].replace('www.', '', 1): site['name'] for site in self.target_sites}
+
+        # 索引页面的条件请求缓存
+        self.page_cache = PageCache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES) if PAGE_CACHE_ENABLED else None
+
+        # 需要跳过SSL验证的主机
+        self.tls_policy = TLSPolicyCache(TLS_FALLBACK_TTL)
+
+        # 同一站点、同一TM号的并发搜索只执行一次
+        self.site_flight = SingleFlight('site search', cancellable=True)
+
+        # 并发搜索站点用的有界线程池
+        self.site_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix='site-search')
+
+        # URL模式探测用的线程池和每个模式的统计
+        self.probe_executor = ThreadPoolExecutor(max_workers=PROBE_MAX_WORKERS, thread_name_prefix='url-probe')
+        
+        # 限速的（批量）搜索单独使用的线程池，等待令牌时不占用交互式搜索的线程
+        self.throttled_site_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS,
+                                                          thread_name_prefix='bulk-site-search')
+        self.throttled_probe_executor = ThreadPoolExecutor(max_workers=PROBE_MAX_WORKERS,
+                                                           thread_name_prefix='bulk-url-probe')
+        self.probe_stats = {}
+        self.probe_stats_lock = threading.Lock()
+
         # 禁用SSL警告（仅对有证书问题的网站）
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+    def site_for_url(self, url):
+        """URL所属的目标站点名，不属于任何目标站点时返回None"""
+        host = (urlparse(url).hostname or '').lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        return self.site_hosts.get(host)
+
+    def _site_request(self, method, url, cancel_token=None, **kwargs):
+        """发起GET/HEAD请求并记录所属站点的健康状态，站点熔断中时直接抛出SiteUnavailableError
+
+        已知证书有问题的主机直接跳过SSL验证；搜索已取消时不再发出请求，
+        cancel_token带限速器时先等待目标主机的令牌
+        """
+        if cancel_token:
+            cancel_token.check('requests_skipped')
+        site = self.site_for_url(url)
+        if site and self.site_health.is_open(site):
+            raise SiteUnavailableError(f"{site} temporarily skipped (circuit open)")
+        
+        host = (urlparse(url).hostname or '').lower()
+        if cancel_token and cancel_token.rate_limiter:
+            cancel_token.rate_limiter.acquire(host, cancel_token)
+        if 'verify' not in kwargs and not self.tls_policy.should_verify(host):
+            kwargs['verify'] = False
+        
+        start_time = time.time()
+        try:
+            response = getattr(self.session, method)(url, **kwargs)
+        except requests.exceptions.SSLError:
+            raise
+        except requests.exceptions.RequestException:
+            if site:
+                self.site_health.record(site, time.time() - start_time, False)
+            raise
+        
+        if site:
+            self.site_health.record(site, time.time() - start_time, response.status_code < 500)
+        if kwargs.get('verify', True) and url.startswith('https'):
+            self.tls_policy.record_verified(host)
+        return response
+
     def _make_safe_request(self, url, **kwargs):
         """
         安全地发起HTTP请求，自动处理SSL证书问题
         """
         try:
             # 首先尝试正常请求（带SSL验证）
-            response = self.session.get(url, **kwargs)
+            response = self._site_request('get', url, **kwargs)
             return response
         except requests.exceptions.SSLError as ssl_error:
             print(f"  ⚠️ SSL certificate error for {url}: {ssl_error}")
             print(f"  🔄 Retrying without SSL verification...")
+            host = (urlparse(url).hostname or '').lower()
+            self.tls_policy.record_ssl_failure(host, ssl_error)
             
-            # 如果SSL验证失败，跳过验证重试
+            # 如果SSL验证失败，跳过验证重试；成功后记住该主机，之后的请求直接跳过验证
             kwargs['verify'] = False
             try:
-                response = self.session.get(url, **kwargs)
+                response = self._site_request('get', url, **kwargs)
+                self.tls_policy.record_fallback(host, True)
                 print(f"  ✅ Request successful without SSL verification")
                 return response
             except Exception as retry_error:
+                self.tls_policy.record_fallback(host, False, retry_error)
                 print(f"  ❌ Request failed even without SSL verification: {retry_error}")
                 raise retry_error
         except Exception as other_error:
             print(f"  ❌ Request failed: {other_error}")
             raise other_error
 
+    def fetch_links(self, url, timeout=15, safe=False, cancel_token=None):
+        """逐个产出页面中的链接 (href, 文字)，带条件请求缓存
+
+        已缓存的页面带If-None-Match/If-Modified-Since重新验证，304（或仍在max-age内）时
+        直接使用缓存的解析结果；200时边下载边解析，完整读完且带ETag/Last-Modified时写入缓存。
+        调用方提前停止时页面不完整，不写入缓存。非200响应不产出链接。
+        safe为True时通过_make_safe_request请求（SSL回退）；搜索取消时中止下载并关闭连接
+        """
+        cached = self.page_cache.get(url) if self.page_cache else None
+        if cached and cached['fresh']:
+            self.page_cache.record_hit(cached['body_bytes'], fresh=True)
+            yield from cached['links']
+            return
+        
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        
+        if safe:
+            response = self._make_safe_request(url, timeout=timeout, stream=True, headers=headers,
+                                               cancel_token=cancel_token)
+        else:
+            response = self._site_request('get', url, timeout=timeout, stream=True, headers=headers,
+                                          cancel_token=cancel_token)
+        
+        with response:
+            max_age = parse_max_age(response)
+            if response.status_code == 304 and cached:
+                print(f"  ♻️ Not modified, using cached links: {url}")
+                self.page_cache.record_hit(cached['body_bytes'])
+                self.page_cache.revalidated(url, max_age if max_age and max_age > 0 else None)
+                links = cached['links']
+            elif response.status_code == 200:
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                collected = [] if self.page_cache and (etag or last_modified) and max_age != -1 else None
+                
+                for link in iter_response_links(response):
+                    if cancel_token:
+                        cancel_token.check('pages_aborted')
+                    if collected is not None:
+                        collected.append(link)
+                    yield link
+                
+                if collected is not None:
+                    body_bytes = response.raw.tell() if hasattr(response.raw, 'tell') else 0
+                    self.page_cache.set(url, etag, last_modified, collected, body_bytes, max_age)
+                return
+            else:
+                return
+        
+        yield from links
+
     def format_tm_number(self, tm_number):
         """格式化TM号为不同的模式，支持4段和5段TM号"""
         if not tm_number:
@@ -282,292 +1501,419 @@ class RealisticManualSearcher:
         
         return None
 
-    def search_liberated_manuals(self, tm_formats):
-        """搜索Liberated Manuals"""
-        results = []
+    def probe_candidate_urls(self, patterns, tm_formats, timeout=10, cancel_token=None, site_name=None):
+        """并发HEAD探测候选URL模式，返回第一个响应PDF的URL，其余放弃
+
+        返回 {'url', 'pattern', 'elapsed', 'timings'}，没有命中时返回None；
+        没有命中且有探测请求出错时抛出 SiteSearchError（site_name为报告的站点名）；
+        探测使用子取消标记，命中后取消排队和等待中的其余探测；
+        搜索取消时放弃其余探测并抛出 SearchCancelledError
+        """
+        candidates = self._candidate_urls(patterns, tm_formats)
+        if not candidates:
+            return None
         
-        print("📚 Searching Liberated Manuals...")
+        if cancel_token:
+            cancel_token.check()
         
-        patterns = [
-            'https://www.liberatedmanuals.com/TM-{tm_dashed}.pdf',
-            'https://www.liberatedmanuals.com/TM_{tm_underscore}.pdf',
-            'https://www.liberatedmanuals.com/{tm_dashed}.pdf'
+        start_time = time.time()
+        probe_token = CancellationToken(parent=cancel_token)
+        _, probe_executor = self.executors_for(cancel_token)
+        futures = [
+            probe_executor.submit(self._probe_candidate_url, pattern, url, timeout, probe_token)
+            for pattern, url in candidates
         ]
+        pending = set(futures)
+        timings = []
+        
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL if cancel_token else None,
+                                     return_when=FIRST_COMPLETED)
+                if cancel_token and cancel_token.cancelled:
+                    cancel_stats.record('probes_cancelled', len(pending))
+                    cancel_token.check()
+                for future in done:
+                    probe = future.result()
+                    timings.append(probe)
+                    if probe['is_pdf']:
+                        print(f"    ✅ Found PDF! ({probe['elapsed']:.2f}s)")
+                        return {
+                            'url': probe['url'],
+                            'pattern': probe['pattern'],
+                            'elapsed': round(time.time() - start_time, 3),
+                            'timings': timings
+                        }
+        finally:
+            for future in pending:
+                future.cancel()
+            if pending and not probe_token.cancelled:
+                probe_token.cancel('probes_cancelled', len(pending))
         
+        errors = [probe['error'] for probe in timings if probe['error']]
+        if errors:
+            raise SiteSearchError(site_name or urlparse(candidates[0][1]).hostname, errors)
+        return None
+
+    def executors_for(self, cancel_token=None):
+        """返回 (站点线程池, 探测线程池)：限速的搜索用单独的线程池，在那里等待主机令牌"""
+        if cancel_token is not None and cancel_token.rate_limiter is not None:
+            return self.throttled_site_executor, self.throttled_probe_executor
+        return self.site_executor, self.probe_executor
+
+    @staticmethod
+    def _candidate_urls(patterns, tm_formats):
+        """按模式生成去重后的候选URL [(模式, URL)]，缺少字段的模式跳过"""
+        candidates = []
+        seen_urls = set()
         for pattern in patterns:
             try:
                 url = pattern.format(**tm_formats)
-                print(f"  🔗 Testing: {url}")
-                
-                response = self.session.head(url, timeout=10, allow_redirects=True)
-                if response.status_code == 200:
-                    content_type = response.headers.get('content-type', '').lower()
-                    if 'pdf' in content_type:
-                        results.append({
-                            'url': url,
-                            'title': f"TM {tm_formats['tm_dashed']}",
-                            'confidence': 95,
-                            'method': 'direct_pdf',
-                            'site': 'Liberated Manuals',
-                            'verified': True
-                        })
-                        print(f"    ✅ Found PDF!")
-                        break
-                        
-            except Exception as e:
-                print(f"    ❌ Error testing {url}: {e}")
+            except (KeyError, IndexError):
+                continue
+            if url not in seen_urls:
+                seen_urls.add(url)
+                candidates.append((pattern, url))
+        return candidates
+
+    def _probe_candidate_url(self, pattern, url, timeout, cancel_token=None):
+        """HEAD探测单个候选URL并记录该模式的耗时统计"""
+        print(f"  🔗 Testing: {url}")
+        start_time = time.time()
+        status = None
+        is_pdf = False
         
-        return results
+        try:
+            response = self._site_request('head', url, timeout=timeout, allow_redirects=True,
+                                          cancel_token=cancel_token)
+            status = response.status_code
+            if status == 200:
+                content_type = response.headers.get('content-type', '').lower()
+                is_pdf = 'pdf' in content_type
+        except SearchCancelledError:
+            # 未发出的探测不计入模式统计
+            return {'pattern': pattern, 'url': url, 'status': None, 'is_pdf': False, 'elapsed': 0.0,
+                    'error': None}
+        except Exception as e:
+            print(f"    ❌ Error testing {url}: {e}")
+            error = e
+        else:
+            error = None
+        
+        return self._record_probe(pattern, url, status, is_pdf, time.time() - start_time, error)
 
-    def search_radio_nerds(self, tm_formats):
-        """Hybrid RadioNerds search: try intelligent patterns first, then fallbacks"""
-        results = []
+    def _record_probe(self, pattern, url, status, is_pdf, elapsed, error=None):
+        """记录一次探测到该模式的统计，返回探测结果，error为探测请求抛出的异常"""
+        with self.probe_stats_lock:
+            stats = self.probe_stats.setdefault(pattern, {
+                'attempts': 0, 'hits': 0, 'errors': 0, 'total_time': 0.0, 'last_status': None
+            })
+            stats['attempts'] += 1
+            stats['total_time'] += elapsed
+            stats['last_status'] = status
+            if is_pdf:
+                stats['hits'] += 1
+            if status is None:
+                stats['errors'] += 1
         
-        print("📻 Searching Radio Nerds (hybrid method)...")
-        print("  🔍 Trying MediaWiki search...")
+        return {'pattern': pattern, 'url': url, 'status': status, 'is_pdf': is_pdf, 'elapsed': round(elapsed, 3),
+                'error': str(error) if error is not None else None}
+
+    def get_probe_stats(self):
+        """每个URL模式的命中率和平均耗时"""
+        with self.probe_stats_lock:
+            return {
+                pattern: {
+                    'attempts': stats['attempts'],
+                    'hits': stats['hits'],
+                    'errors': stats['errors'],
+                    'hit_rate': round(stats['hits'] / stats['attempts'], 3) if stats['attempts'] else 0,
+                    'avg_time': round(stats['total_time'] / stats['attempts'], 3) if stats['attempts'] else 0,
+                    'last_status': stats['last_status']
+                }
+                for pattern, stats in self.probe_stats.items()
+            }
+
+    # 各站点的直接PDF链接模式（同步和异步搜索器共用）
+    LIBERATED_MANUALS_PATTERNS = [
+        'https://www.liberatedmanuals.com/TM-{tm_dashed}.pdf',
+        'https://www.liberatedmanuals.com/TM_{tm_underscore}.pdf',
+        'https://www.liberatedmanuals.com/{tm_dashed}.pdf'
+    ]
+    
+    COMBAT_INDEX_PATTERNS = [
+        'http://combatindex.com/store/tech_man/Sample/Generators/TM_{tm_underscore}.pdf',
+        'http://combatindex.com/store/tech_man/Sample/Generators/TM_{tm_dashed}.pdf',
+        'https://combatindex.com/store/tech_man/Sample/Generators/TM_{tm_underscore}.pdf',
+        'https://combatindex.com/store/tech_man/Sample/Generators/TM_{tm_dashed}.pdf',
+        'http://combatindex.com/store/tech_man/Sample/TM_{tm_underscore}.pdf'
+    ]
+    
+    GREEN_MOUNTAIN_MANUAL_PAGES = [
+        'https://greenmountaingenerators.com/manuals-and-support/'
+    ]
+
+    @staticmethod
+    def _direct_pdf_result(hit, tm_formats, site, confidence):
+        """直接PDF探测命中时的结果"""
+        return {
+            'url': hit['url'],
+            'title': f"TM {tm_formats['tm_dashed']}",
+            'confidence': confidence,
+            'method': 'direct_pdf',
+            'site': site,
+            'verified': True
+        }
+
+    def search_liberated_manuals(self, tm_formats, cancel_token=None):
+        """搜索Liberated Manuals"""
+        results = []
+        
+        print("📚 Searching Liberated Manuals...")
+        
+        hit = self.probe_candidate_urls(self.LIBERATED_MANUALS_PATTERNS, tm_formats, timeout=10,
+                                        cancel_token=cancel_token, site_name='Liberated Manuals')
+        if hit:
+            results.append(self._direct_pdf_result(hit, tm_formats, 'Liberated Manuals', 95))
+        
+        return results
+
+    @staticmethod
+    def _radio_nerds_search_urls(tm_formats):
+        """RadioNerds MediaWiki搜索页URL，按尝试顺序"""
         search_queries = [
             tm_formats['tm_dashed'],
             f"TM {tm_formats['tm_dashed']}",
             f"TM-{tm_formats['tm_dashed']}",
             tm_formats['tm_dashed'].replace('-', ' ')
         ]
+        return [
+            f"https://radionerds.com/index.php?search={urllib.parse.quote(query)}&title=Special:Search"
+            for query in search_queries
+        ]
+
+    @staticmethod
+    def _radio_nerds_search_link(href, link_text, tm_parts):
+        """给搜索结果页中的链接分类：('pdf', url)、('page', url)，不相关时返回None"""
+        # 更严格的匹配：要求至少匹配3个部分
+        href_matches = sum(1 for part in tm_parts if part in href.lower())
+        text_matches = sum(1 for part in tm_parts if part in link_text.lower())
+        if href_matches < 3 and text_matches < 3:
+            return None
+        
+        if href.startswith('/'):
+            href = f"https://radionerds.com{href}"
+        elif not href.startswith('http'):
+            return None
+        
+        # If it's a direct PDF link
+        if '.pdf' in href.lower():
+            return 'pdf', href
+        # If it's a page that might contain PDF links
+        if 'index.php' in href or 'MEP' in link_text.upper():
+            return 'page', href
+        return None
+
+    @staticmethod
+    def _radio_nerds_page_link(pdf_href, tm_parts):
+        """RadioNerds页面中匹配TM号的PDF链接（绝对URL），其他链接返回None"""
+        if '.pdf' not in pdf_href.lower():
+            return None
+        # 在页面爬取中也使用严格匹配：要求至少匹配3个部分
+        if sum(1 for part in tm_parts if part in pdf_href.lower()) < 3:
+            return None
+        if pdf_href.startswith('/'):
+            pdf_href = f"https://radionerds.com{pdf_href}"
+        return pdf_href
+
+    def _radio_nerds_result(self, href, tm_formats, method, confidence):
+        # 从PDF链接中提取实际的TM号
+        actual_tm = self.extract_tm_from_url(href) or tm_formats['tm_dashed']
+        return {
+            'url': href,
+            'title': f"TM {actual_tm}",  # 使用提取的实际TM号
+            'confidence': confidence,
+            'method': method,
+            'site': 'Radio Nerds',
+            'verified': True,
+            'actual_tm_found': actual_tm
+        }
+
+    def search_radio_nerds(self, tm_formats, cancel_token=None):
+        """Hybrid RadioNerds search: try intelligent patterns first, then fallbacks"""
+        results = []
+        
+        print("📻 Searching Radio Nerds (hybrid method)...")
+        print("  🔍 Trying MediaWiki search...")
+        tm_parts = tm_formats['tm_dashed'].split('-')
+        errors = []
         
-        for query in search_queries:
+        for search_url in self._radio_nerds_search_urls(tm_formats):
             try:
-                search_url = f"https://radionerds.com/index.php?search={urllib.parse.quote(query)}&title=Special:Search"
                 print(f"  🔍 MediaWiki search: {search_url}")
                 
-                response = self._make_safe_request(search_url, timeout=15)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                # Look for any links containing our TM number，找到结果后立即返回，不再读取剩余页面
+                for href, link_text in self.fetch_links(search_url, timeout=15, safe=True,
+                                                        cancel_token=cancel_token):
+                    link = self._radio_nerds_search_link(href, link_text, tm_parts)
+                    if not link:
+                        continue
+                    kind, href = link
                     
-                    # Look for any links containing our TM number
-                    for link in soup.find_all('a', href=True):
-                        href = link.get('href', '')
-                        link_text = link.get_text().strip()
-                        
-                        # 更严格的匹配：要求至少匹配3个部分
-                        tm_parts = tm_formats['tm_dashed'].split('-')
-                        href_matches = sum(1 for part in tm_parts if part in href.lower())
-                        text_matches = sum(1 for part in tm_parts if part in link_text.lower())
-                        
-                        if href_matches >= 3 or text_matches >= 3:
-                            if href.startswith('/'):
-                                href = f"https://radionerds.com{href}"
-                            elif not href.startswith('http'):
-                                continue
-                            
-                            # If it's a direct PDF link
-                            if '.pdf' in href.lower():
-                                # 从PDF链接中提取实际的TM号
-                                actual_tm = self.extract_tm_from_url(pdf_href)
-                                if actual_tm:
-                                    title = f"TM {actual_tm}"
-                                else:
-                                    actual_tm = tm_formats['tm_dashed']
-                                    title = f"TM {actual_tm}"
-                                
-                                try:
-                                    head_response = self.session.head(href, timeout=5)
-                                    if head_response.status_code == 200:
-                                        results.append({
-                                            'url': href,
-                                            'title': title,  # 使用提取的实际TM号
-                                            'confidence': 90,
-                                            'method': 'mediawiki_search',
-                                            'site': 'Radio Nerds',
-                                            'verified': True,
-                                            'actual_tm_found': actual_tm
-                                        })
-                                        print(f"    Found via MediaWiki search: {href}")
-                                        return results
-                                except:
-                                    continue
-                            
-                            # If it's a page that might contain PDF links
-                            elif 'index.php' in href or 'MEP' in link_text.upper():
-                                try:
-                                    page_response = self.session.get(href, timeout=10)
-                                    if page_response.status_code == 200:
-                                        page_soup = BeautifulSoup(page_response.text, 'html.parser')
-                                        
-                                        # Look for PDF links on this page
-                                        for pdf_link in page_soup.find_all('a', href=True):
-                                            pdf_href = pdf_link.get('href', '')
-                                            if '.pdf' in pdf_href.lower():
-                                                # 在页面爬取中也使用严格匹配
-                                                tm_parts = tm_formats['tm_dashed'].split('-')
-                                                pdf_matches = sum(1 for part in tm_parts if part in pdf_href.lower())
-                                                
-                                                if pdf_matches >= 3:  # 要求至少匹配3个部分
-                                                    if pdf_href.startswith('/'):
-                                                        pdf_href = f"https://radionerds.com{pdf_href}"
-                                                    
-                                                    # 从PDF链接中提取实际的TM号
-                                                    actual_tm = self.extract_tm_from_url(pdf_href)
-                                                    if actual_tm:
-                                                        title = f"TM {actual_tm}"
-                                                    else:
-                                                        actual_tm = tm_formats['tm_dashed']
-                                                        title = f"TM {actual_tm}"
-                                                    
-                                                    try:
-                                                        pdf_head = self.session.head(pdf_href, timeout=5)
-                                                        if pdf_head.status_code == 200:
-                                                            results.append({
-                                                                'url': pdf_href,
-                                                                'title': title,  # 使用提取的实际TM号
-                                                                'confidence': 88,
-                                                                'method': 'page_crawl',
-                                                                'site': 'Radio Nerds',
-                                                                'verified': True,
-                                                                'actual_tm_found': actual_tm
-                                                            })
-                                                            print(f"    ✅ Found via page crawl: {pdf_href}")
-                                                            return results
-                                                    except:
-                                                        continue
-                                except:
-                                    continue
+                    if kind == 'pdf':
+                        try:
+                            head_response = self._site_request('head', href, timeout=5,
+                                                               cancel_token=cancel_token)
+                            if head_response.status_code == 200:
+                                results.append(self._radio_nerds_result(href, tm_formats, 'mediawiki_search', 90))
+                                print(f"    Found via MediaWiki search: {href}")
+                                return results
+                        except Exception as e:
+                            errors.append(e)
+                            continue
+                    else:
+                        try:
+                            page_result = self._radio_nerds_page_pdf(href, tm_formats, tm_parts, cancel_token,
+                                                                     errors)
+                            if page_result:
+                                results.append(page_result)
+                                return results
+                        except Exception as e:
+                            errors.append(e)
+                            continue
                 
             except Exception as e:
                 print(f"    ❌ MediaWiki search error: {e}")
+                errors.append(e)
         
+        if errors:
+            raise SiteSearchError('Radio Nerds', errors)
         return results
 
-    def search_green_mountain(self, tm_formats):
-        """搜索Green Mountain Generators - 收集所有匹配结果"""
-        results = []
+    def _radio_nerds_page_pdf(self, page_url, tm_formats, tm_parts, cancel_token=None, errors=None):
+        """在Radio Nerds页面中找第一个匹配TM号且HEAD可访问的PDF链接，HEAD出错时追加到errors"""
+        # Look for PDF links on this page
+        for pdf_href, _ in self.fetch_links(page_url, timeout=10, cancel_token=cancel_token):
+            pdf_href = self._radio_nerds_page_link(pdf_href, tm_parts)
+            if not pdf_href:
+                continue
+            
+            try:
+                pdf_head = self._site_request('head', pdf_href, timeout=5, cancel_token=cancel_token)
+                if pdf_head.status_code == 200:
+                    print(f"    ✅ Found via page crawl: {pdf_href}")
+                    return self._radio_nerds_result(pdf_href, tm_formats, 'page_crawl', 88)
+            except Exception as e:
+                if errors is not None:
+                    errors.append(e)
+                continue
         
-        print("搜索Green Mountain Generators...")
+        return None
+
+    def _green_mountain_add_link(self, href, page_links, page_index, exact_tm):
+        """记录一个带TM号的PDF链接；已有3个精确匹配时返回True，结果已确定，可以停止读取页面"""
+        if not href.endswith('.pdf'):
+            return False
+        tm_match = re.search(r'tm[_-]?(\d+)[_-](\d+)[_-](\d+)[_-](\d+[a-z]*)', href.lower())
+        if not tm_match:
+            return False
         
-        manual_pages = [
-            'https://greenmountaingenerators.com/manuals-and-support/'
-        ]
+        actual_tm = '-'.join(tm_match.groups()).upper()
+        page_links.setdefault(actual_tm, []).append(href)
+        page_index.add(actual_tm)
+        self.tm_index.add(actual_tm)
+        return actual_tm == exact_tm and len(page_links[exact_tm]) >= 3
+
+    @staticmethod
+    def _green_mountain_results(page_links, page_index, exact_tm, tm_formats):
+        """精确匹配排在最前，其次是前三段相同的兄弟TM号，最多3个结果"""
+        candidates = []
+        if exact_tm:
+            # 所有4段完全匹配
+            for href in page_links.get(exact_tm, []):
+                candidates.append({'url': href, 'actual_tm': exact_tm, 'match_type': 'exact', 'confidence': 95})
+                print(f"    找到精确匹配: {exact_tm}")
+            
+            # 前3段匹配，最接近的兄弟TM号优先
+            for sibling in page_index.siblings(exact_tm):
+                for href in page_links[sibling]:
+                    candidates.append({'url': href, 'actual_tm': sibling, 'match_type': 'partial', 'confidence': 85})
+                    print(f"    找到部分匹配: {sibling}")
+        
+        results = []
+        for match in candidates[:3]:  # 最多返回3个结果
+            title_suffix = "" if match['match_type'] == 'exact' else f"Partial match for {tm_formats['tm_dashed']}"
+            
+            results.append({
+                'url': match['url'],
+                'title': f"TM {match['actual_tm']}",
+                'title_suffix': title_suffix,
+                'confidence': match['confidence'],
+                'method': 'manual_page_crawl',
+                'site': 'Green Mountain Generators',
+                'verified': False,
+                'actual_tm_found': match['actual_tm']
+            })
+        return results
+
+    def search_green_mountain(self, tm_formats, cancel_token=None):
+        """搜索Green Mountain Generators - 收集所有匹配结果"""
+        print("搜索Green Mountain Generators...")
+        errors = []
         
-        for page_url in manual_pages:
+        for page_url in self.GREEN_MOUNTAIN_MANUAL_PAGES:
             try:
                 print(f"  检查手册页面: {page_url}")
                 
-                response = self.session.get(page_url, timeout=15)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    candidates = []
-                    tm_parts = tm_formats['tm_dashed'].split('-')
-                    
-                    # 收集所有匹配的候选结果
-                    for link in soup.find_all('a', href=True):
-                        href = link.get('href', '')
-                        
-                        if href.endswith('.pdf'):
-                            import re
-                            tm_match = re.search(r'tm[_-]?(\d+)[_-](\d+)[_-](\d+)[_-](\d+[a-z]*)', href.lower())
-                            
-                            if tm_match:
-                                found_parts = [tm_match.group(1), tm_match.group(2), tm_match.group(3), tm_match.group(4)]
-                                
-                                # 检查前3段是否完全匹配
-                                first_three_match = (tm_parts[0] == found_parts[0] and 
-                                                  tm_parts[1] == found_parts[1] and 
-                                                  tm_parts[2] == found_parts[2])
-                                
-                                # 检查所有4段是否完全匹配
-                                all_match = (len(tm_parts) >= 4 and 
-                                          tm_parts[0] == found_parts[0] and 
-                                          tm_parts[1] == found_parts[1] and 
-                                          tm_parts[2] == found_parts[2] and 
-                                          tm_parts[3] == found_parts[3])
-                                
-                                if all_match:
-                                    actual_tm = '-'.join(found_parts)
-                                    candidates.append({
-                                        'url': href,
-                                        'actual_tm': actual_tm,
-                                        'match_type': 'exact',
-                                        'confidence': 95
-                                    })
-                                    print(f"    找到精确匹配: {actual_tm}")
-                                elif first_three_match:
-                                    actual_tm = '-'.join(found_parts)
-                                    candidates.append({
-                                        'url': href,
-                                        'actual_tm': actual_tm,
-                                        'match_type': 'partial',
-                                        'confidence': 85
-                                    })
-                                    print(f"    找到部分匹配: {actual_tm}")
-                    
-                    # 选择最佳匹配结果
-                    if candidates:
-                        # 优先精确匹配，然后是部分匹配
-                        exact_matches = [c for c in candidates if c['match_type'] == 'exact']
-                        partial_matches = [c for c in candidates if c['match_type'] == 'partial']
-                        
-                        all_matches = exact_matches + partial_matches
-                        
-                        for match in all_matches[:3]:  # 最多返回3个结果
-                            title_suffix = "" if match['match_type'] == 'exact' else f"Partial match for {tm_formats['tm_dashed']}"
-                            
-                            results.append({
-                                'url': match['url'],
-                                'title': f"TM {match['actual_tm']}",
-                                'title_suffix': title_suffix,
-                                'confidence': match['confidence'],
-                                'method': 'manual_page_crawl',
-                                'site': 'Green Mountain Generators',
-                                'verified': False,
-                                'actual_tm_found': match['actual_tm']
-                            })
-                        
-                        return results
+                tm_parts = tm_formats['tm_dashed'].split('-')
+                exact_tm = '-'.join(tm_parts[:4]) if len(tm_parts) >= 3 else None
+                page_links = {}
+                page_index = TMPrefixIndex()
+                
+                # 收集页面上所有带TM号的PDF链接
+                for href, _ in self.fetch_links(page_url, timeout=15, cancel_token=cancel_token):
+                    if self._green_mountain_add_link(href, page_links, page_index, exact_tm):
+                        print(f"    已找到足够的精确匹配，停止读取页面")
+                        break
+                
+                # 选择最佳匹配结果
+                results = self._green_mountain_results(page_links, page_index, exact_tm, tm_formats)
+                if results:
+                    return results
                             
             except Exception as e:
                 print(f"    检查{page_url}时出错: {e}")
+                errors.append(e)
                 continue
         
-        return results
+        if errors:
+            raise SiteSearchError('Green Mountain Generators', errors)
+        return []
 
-    def search_combat_index(self, tm_formats):
+    def search_combat_index(self, tm_formats, cancel_token=None):
         """搜索Combat Index"""
         results = []
         
         print("⚔️ Searching Combat Index...")
         
-        patterns = [
-            'http://combatindex.com/store/tech_man/Sample/Generators/TM_{tm_underscore}.pdf',
-            'http://combatindex.com/store/tech_man/Sample/Generators/TM_{tm_dashed}.pdf',
-            'https://combatindex.com/store/tech_man/Sample/Generators/TM_{tm_underscore}.pdf',
-            'https://combatindex.com/store/tech_man/Sample/Generators/TM_{tm_dashed}.pdf',
-            'http://combatindex.com/store/tech_man/Sample/TM_{tm_underscore}.pdf'
-        ]
-        
-        for pattern in patterns:
-            try:
-                url = pattern.format(**tm_formats)
-                print(f"  🔗 Testing: {url}")
-                
-                response = self.session.head(url, timeout=10, allow_redirects=True)
-                if response.status_code == 200:
-                    content_type = response.headers.get('content-type', '').lower()
-                    if 'pdf' in content_type:
-                        results.append({
-                            'url': url,
-                            'title': f"TM {tm_formats['tm_dashed']}",
-                            'confidence': 90,
-                            'method': 'direct_pdf',
-                            'site': 'Combat Index',
-                            'verified': True
-                        })
-                        print(f"    ✅ Found PDF!")
-                        break
-                        
-            except Exception as e:
-                print(f"    ❌ Error testing {url}: {e}")
+        hit = self.probe_candidate_urls(self.COMBAT_INDEX_PATTERNS, tm_formats, timeout=10,
+                                        cancel_token=cancel_token, site_name='Combat Index')
+        if hit:
+            results.append(self._direct_pdf_result(hit, tm_formats, 'Combat Index', 90))
         
         return results
 
-    def search_site_intelligently(self, site_config, tm_formats):
+    def search_site(self, site_name, tm_formats, cancel_token=None):
+        """调用站点的专用搜索方法，相同站点和TM号的并发请求共享一次搜索
+
+        共享的搜索只有在所有调用方都取消后才会停止
+        """
+        return self.site_flight.do(
+            (site_name, tm_formats['tm_dashed']), self.site_search_methods[site_name], tm_formats,
+            cancel_token=cancel_token
+        )
+
+    def search_site_intelligently(self, site_config, tm_formats, cancel_token=None):
         """Generic intelligent site search based on configuration"""
         results = []
         site_name = site_config['name']
@@ -577,7 +1923,12 @@ class RealisticManualSearcher:
         for method_config in site_config['methods']:
             method_type = method_config['type']
             
-            if method_type == 'site_search_and_direct':
+            if method_type in ('direct_pdf_patterns', 'direct_and_search'):
+                # 有专用搜索方法的站点直接调用
+                if site_name in self.site_search_methods:
+                    results.extend(self.search_site(site_name, tm_formats, cancel_token))
+            
+            elif method_type == 'site_search_and_direct':
                 # Try direct patterns first, then site search
                 if 'direct_patterns' in method_config:
                     for pattern in method_config['direct_patterns']:
@@ -585,7 +1936,8 @@ class RealisticManualSearcher:
                             url = pattern.format(**tm_formats)
                             print(f"  🔗 Testing direct: {url}")
                             
-                            response = self.session.head(url, timeout=8, allow_redirects=True)
+                            response = self._site_request('head', url, timeout=8, allow_redirects=True,
+                                                          cancel_token=cancel_token)
                             if response.status_code == 200 and 'pdf' in response.headers.get('content-type', '').lower():
                                 results.append({
                                     'url': url,
@@ -607,33 +1959,28 @@ class RealisticManualSearcher:
                     
                     try:
                         print(f"  🔍 Site search: {search_url}")
-                        response = self.session.get(search_url, timeout=15)
-                        if response.status_code == 200:
-                            soup = BeautifulSoup(response.text, 'html.parser')
+                        # Look for PDF links
+                        for href, text in self.fetch_links(search_url, timeout=15, cancel_token=cancel_token):
+                            text = text.lower()
                             
-                            # Look for PDF links
-                            for link in soup.find_all('a', href=True):
-                                href = link.get('href', '')
-                                text = link.get_text().lower()
+                            if ('.pdf' in href.lower() and 
+                                ('tm' in text or 'tm' in href.lower()) and
+                                any(part in href.lower() for part in tm_formats['tm_dashed'].split('-'))):
                                 
-                                if ('.pdf' in href.lower() and 
-                                    ('tm' in text or 'tm' in href.lower()) and
-                                    any(part in href.lower() for part in tm_formats['tm_dashed'].split('-'))):
-                                    
-                                    if not href.startswith('http'):
-                                        domain = site_config['domain']
-                                        href = f"https://{domain}{href}" if href.startswith('/') else f"https://{domain}/{href}"
-                                    
-                                    results.append({
-                                        'url': href,
-                                        'title': f"TM {tm_formats['tm_dashed']}",
-                                        'confidence': 85,
-                                        'method': 'site_search',
-                                        'site': site_name,
-                                        'verified': False
-                                    })
-                                    print(f"    ✅ Found via site search: {href}")
-                                    return results
+                                if not href.startswith('http'):
+                                    domain = site_config['domain']
+                                    href = f"https://{domain}{href}" if href.startswith('/') else f"https://{domain}/{href}"
+                                
+                                results.append({
+                                    'url': href,
+                                    'title': f"TM {tm_formats['tm_dashed']}",
+                                    'confidence': 85,
+                                    'method': 'site_search',
+                                    'site': site_name,
+                                    'verified': False
+                                })
+                                print(f"    ✅ Found via site search: {href}")
+                                return results
                     
                     except Exception as e:
                         print(f"    ❌ Site search error: {e}")
@@ -641,7 +1988,7 @@ class RealisticManualSearcher:
             elif method_type == 'site_search_only':
                 # Special handling for RadioNerds - use hybrid method
                 if site_name == 'Radio Nerds':
-                    return self.search_radio_nerds_hybrid(tm_formats)
+                    return self.search_site(site_name, tm_formats, cancel_token)
                 
                 # For other sites with this method type
                 query = f"TM {tm_formats['tm_dashed']}"
@@ -649,41 +1996,37 @@ class RealisticManualSearcher:
                 
                 try:
                     print(f"  🔍 Site-only search: {search_url}")
-                    response = self.session.get(search_url, timeout=15)
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.text, 'html.parser')
+                    # Look for PDF links in search results
+                    for href, text in self.fetch_links(search_url, timeout=15, cancel_token=cancel_token):
+                        text = text.lower()
                         
-                        # Look for PDF links in search results
-                        for link in soup.find_all('a', href=True):
-                            href = link.get('href', '')
-                            text = link.get_text().lower()
+                        if ('.pdf' in href.lower() and 
+                            ('tm' in text or 'tm' in href.lower()) and
+                            any(part in href.lower() for part in tm_formats['tm_dashed'].split('-'))):
                             
-                            if ('.pdf' in href.lower() and 
-                                ('tm' in text or 'tm' in href.lower()) and
-                                any(part in href.lower() for part in tm_formats['tm_dashed'].split('-'))):
-                                
-                                if href.startswith('/'):
-                                    href = f"https://{site_config['domain']}{href}"
-                                elif not href.startswith('http'):
-                                    href = f"https://{site_config['domain']}/{href}"
-                                
-                                # Verify PDF exists
-                                try:
-                                    head_response = self.session.head(href, timeout=5)
-                                    if head_response.status_code == 200:
-                                        results.append({
-                                            'url': href,
-                                            'title': f"TM {tm_formats['tm_dashed']}",
-                                            'confidence': 88,
-                                            'method': 'site_search',
-                                            'site': site_name,
-                                            'verified': True
-                                        })
-                                        print(f"    ✅ Found and verified: {href}")
-                                        return results
-                                except:
-                                    continue
-                
+                            if href.startswith('/'):
+                                href = f"https://{site_config['domain']}{href}"
+                            elif not href.startswith('http'):
+                                href = f"https://{site_config['domain']}/{href}"
+                            
+                            # Verify PDF exists
+                            try:
+                                head_response = self._site_request('head', href, timeout=5,
+                                                                   cancel_token=cancel_token)
+                                if head_response.status_code == 200:
+                                    results.append({
+                                        'url': href,
+                                        'title': f"TM {tm_formats['tm_dashed']}",
+                                        'confidence': 88,
+                                        'method': 'site_search',
+                                        'site': site_name,
+                                        'verified': True
+                                    })
+                                    print(f"    ✅ Found and verified: {href}")
+                                    return results
+                            except Exception:
+                                continue
+                    
                 except Exception as e:
                     print(f"    ❌ Site search error: {e}")
                 
@@ -722,16 +2065,113 @@ class RealisticManualSearcher:
         
         return results
     
-    def search_tm_number(self, tm_number, max_results=5, use_partial_match=True):
-        """Enhanced TM search with intelligent site searching"""
+    def search_tm_number(self, tm_number, max_results=5, use_partial_match=True, parallel=None, deadline=None,
+                         skipped_sites=None, cancel_token=None, incomplete_sites=None):
+        """Enhanced TM search with intelligent site searching
+
+        parallel为True时同时探测所有站点，deadline为整个搜索的秒数上限（包括兄弟TM号的后备搜索）；
+        skipped_sites为列表时，因熔断被跳过的站点名会追加到其中；
+        incomplete_sites为列表时，超过deadline被放弃或出错的站点名会追加到其中；
+        cancel_token取消后尽快抛出 SearchCancelledError
+        """
         print(f"\n🎯 Enhanced TM search for: {tm_number}")
         
         if not tm_number:
             return []
         
+        if parallel is None:
+            parallel = SEARCH_PARALLEL
+        if deadline is None:
+            deadline = SEARCH_DEADLINE
+        end_time = time.time() + deadline
+        
         tm_formats = self.format_tm_number(tm_number)
+        
+        # 本地索引精确命中才直接返回；前缀匹配只在实时精确搜索也没有结果时使用
+        catalog_results = self.search_catalog(tm_formats)
+        if catalog_results:
+            print(f"📚 Catalog hit: {len(catalog_results)} result(s)")
+            return catalog_results[:max_results]
+        
+        sorted_sites = self.available_sites(sorted(self.target_sites, key=lambda x: x['priority']), skipped_sites)
+        
+        if cancel_token:
+            cancel_token.check()
+        
+        if parallel:
+            all_results = self._search_sites_parallel(sorted_sites, tm_formats, deadline, cancel_token,
+                                                      incomplete_sites)
+        else:
+            all_results = self._search_sites_sequential(sorted_sites, tm_formats, max_results, cancel_token,
+                                                        incomplete_sites)
+        
+        if not all_results and use_partial_match:
+            catalog_results = self.search_catalog_partial(tm_formats)
+            if catalog_results:
+                print(f"📚 Catalog partial match: {len(catalog_results)} result(s)")
+                return catalog_results[:max_results]
+        
+        # 没有结果时尝试最接近的已知兄弟TM号（前三段相同）
+        if not all_results and use_partial_match:
+            sibling_tm = self.tm_index.closest_sibling(tm_formats['tm_dashed'])
+            if sibling_tm:
+                # 本地索引里的兄弟TM号已由上面的前缀匹配返回；实时搜索只用本次搜索剩余的时间，不重新计时
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    print(f"  ⏱️ No time left to search closest known sibling: {sibling_tm}")
+                    self._mark_incomplete(incomplete_sites, [site['name'] for site in sorted_sites])
+                else:
+                    print(f"  🔁 No results, trying closest known sibling: {sibling_tm} ({remaining:.1f}s left)")
+                    all_results = self.search_tm_number(sibling_tm, max_results, use_partial_match=False,
+                                                        parallel=parallel, deadline=remaining,
+                                                        skipped_sites=skipped_sites, cancel_token=cancel_token,
+                                                        incomplete_sites=incomplete_sites)
+                self._mark_partial_results(all_results, tm_formats, sibling_tm)
+        
+        return self._rank_results(all_results, max_results)
+
+    @staticmethod
+    def _mark_partial_results(results, tm_formats, sibling_tm):
+        """兄弟TM号的结果标记为部分匹配"""
+        for result in results:
+            result['partial_match'] = True
+            result['original_query'] = tm_formats['tm_dashed']
+            result['matched_tm'] = sibling_tm
+            result.setdefault('title_suffix', f"Partial match for {tm_formats['tm_dashed']}")
+
+    @staticmethod
+    def _rank_results(results, max_results):
+        # Sort by confidence and verification status
+        results.sort(key=lambda x: (x.get('verified', False), x.get('confidence', 0)), reverse=True)
+        
+        print(f"\n📊 Enhanced search complete: {len(results)} total results")
+        return results[:max_results]
+
+    @staticmethod
+    def _mark_incomplete(incomplete_sites, site_names):
+        """记录没有搜索完整的站点（超过deadline或出错），这样的空结果不能写入缓存"""
+        if incomplete_sites is None:
+            return
+        for site_name in site_names:
+            if site_name not in incomplete_sites:
+                incomplete_sites.append(site_name)
+
+    def available_sites(self, sites, skipped_sites=None):
+        """过滤掉熔断中的站点，被跳过的站点名追加到skipped_sites"""
+        available = []
+        for site_config in sites:
+            if self.site_health.skip(site_config['name']):
+                print(f"  ⛔ Skipping {site_config['name']} - circuit open")
+                if skipped_sites is not None and site_config['name'] not in skipped_sites:
+                    skipped_sites.append(site_config['name'])
+                continue
+            available.append(site_config)
+        return available
+
+    def _search_sites_sequential(self, sorted_sites, tm_formats, max_results, cancel_token=None,
+                                 incomplete_sites=None):
+        """按优先级逐个搜索站点"""
         all_results = []
-        sorted_sites = sorted(self.target_sites, key=lambda x: x['priority'])
         
         # Search each site intelligently
         for site_config in sorted_sites:
@@ -745,7 +2185,7 @@ class RealisticManualSearcher:
                 continue
             
             try:
-                site_results = self.search_site_intelligently(site_config, tm_formats)
+                site_results = self.search_site_intelligently(site_config, tm_formats, cancel_token)
                 all_results.extend(site_results)
                 
                 if site_results:
@@ -758,21 +2198,232 @@ class RealisticManualSearcher:
                 
             except Exception as e:
                 print(f"  ❌ {site_config['name']} error: {e}")
+                self._mark_incomplete(incomplete_sites, [site_config['name']])
         
-        # Sort by confidence and verification status
-        all_results.sort(key=lambda x: (x.get('verified', False), x.get('confidence', 0)), reverse=True)
+        return all_results
+
+    def _search_sites_parallel(self, sorted_sites, tm_formats, deadline=None, cancel_token=None,
+                               incomplete_sites=None):
+        """同时搜索所有站点，找到verified PDF或超过deadline后放弃其余站点
+
+        站点搜索使用本次搜索的子取消标记，放弃时取消它，正在运行的站点搜索在下一次检查时停止，
+        不会一直占着 site_executor 线程等到请求超时
+        """
+        if deadline is None:
+            deadline = SEARCH_DEADLINE
+        end_time = time.time() + deadline
+        sites_token = CancellationToken(parent=cancel_token)
+        site_executor, _ = self.executors_for(cancel_token)
         
-        print(f"\n📊 Enhanced search complete: {len(all_results)} total results")
-        return all_results[:max_results]
+        futures = {
+            site_executor.submit(self.search_site_intelligently, site_config, tm_formats, sites_token): site_config
+            for site_config in sorted_sites
+        }
+        pending = set(futures)
+        site_results = {}
+        
+        try:
+            while pending:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    print(f"  ⏱️ Deadline {deadline}s reached, abandoning {len(pending)} site(s)")
+                    self._mark_incomplete(incomplete_sites, [futures[future]['name'] for future in pending])
+                    break
+                
+                if cancel_token:
+                    remaining = min(remaining, CANCEL_POLL_INTERVAL)
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                if cancel_token:
+                    cancel_token.check()
+                for future in done:
+                    site_config = futures[future]
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        print(f"  ❌ {site_config['name']} error: {e}")
+                        self._mark_incomplete(incomplete_sites, [site_config['name']])
+                        results = []
+                    
+                    site_results[site_config['name']] = results
+                    if results:
+                        print(f"  ✅ {site_config['name']}: Found {len(results)} result(s)")
+                    else:
+                        print(f"  ❌ {site_config['name']}: No results")
+                
+                # 找到verified PDF后不再等待较慢的站点
+                if pending and any(r.get('verified', False) for results in site_results.values() for r in results):
+                    print(f"  ⏹️ Verified PDF found, cancelling {len(pending)} slower site(s)")
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+            if pending and not sites_token.cancelled:
+                sites_token.cancel('sites_abandoned', len(pending))
+        
+        return self._merge_site_results(sorted_sites, site_results)
+
+    @staticmethod
+    def _merge_site_results(sorted_sites, site_results):
+        """按站点优先级合并并发搜索的结果，与顺序搜索保持一致"""
+        all_results = []
+        for site_config in sorted_sites:
+            results = site_results.get(site_config['name'], [])
+            if site_config['name'] == 'Radio Nerds' and all_results and results:
+                print(f"  ⏭️ Dropping RadioNerds results - already found {len(all_results)} result(s)")
+                continue
+            all_results.extend(results)
+        
+        return all_results
 
-    def search_model_number(self, model_number, max_results=5):
-        """增强的模型号搜索 - 包含映射搜索"""
+    def search_catalog(self, tm_formats):
+        """从本地PDF索引精确查找TM号"""
+        if not self.catalog:
+            return []
+        
+        return [self._catalog_result(entry, 'exact', tm_formats)
+                for entry in self.catalog.lookup(tm_formats['tm_dashed'])]
+
+    def search_catalog_partial(self, tm_formats):
+        """从本地PDF索引查找前三段相同的TM号，只在精确的实时搜索也没有结果时使用"""
+        if not self.catalog or 'tm_partial' not in tm_formats:
+            return []
+        
+        return [self._catalog_result(entry, 'partial', tm_formats)
+                for entry in self.catalog.lookup_prefix(tm_formats['tm_dashed'])]
+
+    def _catalog_result(self, entry, match_type, tm_formats):
+        return {
+            'url': entry['url'],
+            'title': f"TM {entry['tm']}",
+            'title_suffix': "" if match_type == 'exact' else f"Partial match for {tm_formats['tm_dashed']}",
+            'confidence': 95 if match_type == 'exact' else 85,
+            'method': 'catalog_index',
+            'site': entry['site'],
+            'verified': entry['last_verified'] is not None,
+            'actual_tm_found': entry['tm']
+        }
+
+    def crawl_catalog(self, verify_pdfs=False, max_pages=None):
+        """爬取每个目标站点的索引页面，收集所有PDF链接写入本地索引"""
+        if not self.catalog:
+            print("⚠️ Manual catalog is disabled")
+            return 0
+        
+        if max_pages is None:
+            max_pages = CATALOG_MAX_PAGES
+        
+        total_found = 0
+        for site_config in sorted(self.target_sites, key=lambda x: x['priority']):
+            site_name = site_config['name']
+            domain = site_config['domain']
+            queue = list(site_config.get('index_pages', []))
+            visited = set()
+            site_found = 0
+            
+            print(f"🕷️ Crawling {site_name}...")
+            
+            while queue and len(visited) < max_pages:
+                page_url = queue.pop(0)
+                if page_url in visited:
+                    continue
+                visited.add(page_url)
+                
+                try:
+                    links = [href for href, _ in self.fetch_links(page_url, timeout=15, safe=True)]
+                except Exception as e:
+                    print(f"  ❌ Failed to crawl {page_url}: {e}")
+                    continue
+                
+                for href in links:
+                    href = urljoin(page_url, href.strip())
+                    parsed = urlparse(href)
+                    
+                    if parsed.path.lower().endswith('.pdf'):
+                        actual_tm = self.extract_tm_from_url(href)
+                        if not actual_tm:
+                            continue
+                        
+                        last_verified = None
+                        content_length = None
+                        if verify_pdfs:
+                            try:
+                                head_response = self._site_request('head', href, timeout=10, allow_redirects=True)
+                                if head_response.status_code != 200:
+                                    continue
+                                last_verified = time.time()
+                                content_length = int(head_response.headers.get('content-length', 0)) or None
+                            except Exception as e:
+                                print(f"    ❌ Failed to verify {href}: {e}")
+                                continue
+                        
+                        self.catalog.add(actual_tm.upper(), site_name, href, last_verified, content_length)
+                        site_found += 1
+                    
+                    # 同域名的HTML页面继续爬取
+                    elif parsed.netloc.endswith(domain) and parsed.scheme in ('http', 'https'):
+                        extension = os.path.splitext(parsed.path)[1].lower()
+                        if extension in ('', '.html', '.htm', '.php') and href not in visited:
+                            queue.append(href.split('#')[0])
+            
+            print(f"  ✅ {site_name}: {site_found} PDF link(s) from {len(visited)} page(s)")
+            total_found += site_found
+        
+        print(f"📚 Catalog crawl complete: {total_found} PDF link(s), {self.catalog.stats()}")
+        return total_found
+
+    @staticmethod
+    def _mark_mapped_results(results, model_number, tm_number):
+        for result in results:
+            result['title'] = f"{result['title']} (Mapped from {model_number})"
+            result['description'] = f"Found via model mapping: {model_number} → TM {tm_number}"
+            result['method'] = 'model_to_tm_mapping'
+            result['mapped_from'] = model_number
+            result['mapped_tm'] = tm_number
+
+    @staticmethod
+    def _model_variations(model_number):
+        clean_model = model_number.upper().strip()
+        return [
+            clean_model,
+            clean_model.replace('-', ''),
+            clean_model.replace(' ', ''),
+            clean_model.replace('/', '-'),
+            f"MEP-{clean_model}" if not clean_model.startswith('MEP') else clean_model
+        ]
+
+    @staticmethod
+    def _model_search_result(href, text, model_number, model_variations):
+        """Liberated Manuals搜索页中匹配型号的PDF链接，不匹配时返回None"""
+        if not href.lower().endswith('.pdf'):
+            return None
+        text = text.lower()
+        if not any(var.lower() in href.lower() or var.lower() in text for var in model_variations):
+            return None
+        
+        if not href.startswith('http'):
+            href = f"https://www.liberatedmanuals.com{href}"
+        return {
+            'url': href,
+            'title': f"Manual for {model_number}",
+            'confidence': 80,
+            'method': 'model_search',
+            'site': 'Liberated Manuals',
+            'verified': False
+        }
+
+    def search_model_number(self, model_number, max_results=5, skipped_sites=None, cancel_token=None,
+                            incomplete_sites=None, deadline=None):
+        """增强的模型号搜索 - 包含映射搜索
+
+        deadline为所有映射TM号搜索共用的秒数上限，时间用完后剩余的映射TM号不再搜索
+        """
         print(f"\n🔍 Enhanced model search for: {model_number}")
         
         if not model_number:
             return []
         
         all_results = []
+        end_time = time.time() + (deadline if deadline is not None else SEARCH_DEADLINE)
         
         # 1. 首先尝试映射搜索
         print("🎯 Step 1: Trying model-to-TM mapping...")
@@ -783,20 +2434,21 @@ class RealisticManualSearcher:
             
             # 为每个映射的TM号执行搜索
             for tm_number in tm_numbers:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    print(f"   ⏱️ Deadline reached, not searching mapped TM: {tm_number}")
+                    self._mark_incomplete(incomplete_sites, [f"TM {tm_number}"])
+                    continue
                 print(f"   🎯 Searching for mapped TM: {tm_number}")
                 
                 try:
                     # 使用部分匹配功能搜索
-                    tm_results = self.search_tm_number(tm_number, max_results=3, use_partial_match=True)
+                    tm_results = self.search_tm_number(tm_number, max_results=3, use_partial_match=True,
+                                                       deadline=remaining, skipped_sites=skipped_sites,
+                                                       cancel_token=cancel_token, incomplete_sites=incomplete_sites)
                     
                     # 为结果添加映射信息
-                    for result in tm_results:
-                        result['title'] = f"{result['title']} (Mapped from {model_number})"
-                        result['description'] = f"Found via model mapping: {model_number} → TM {tm_number}"
-                        result['method'] = 'model_to_tm_mapping'
-                        result['mapped_from'] = model_number
-                        result['mapped_tm'] = tm_number
-                    
+                    self._mark_mapped_results(tm_results, model_number, tm_number)
                     all_results.extend(tm_results)
                     
                     if tm_results:
@@ -807,6 +2459,7 @@ class RealisticManualSearcher:
                         
                 except Exception as e:
                     print(f"     ❌ Error searching TM {tm_number}: {e}")
+                    self._mark_incomplete(incomplete_sites, [f"TM {tm_number}"])
             
             if all_results:
                 return all_results[:max_results]
@@ -816,78 +2469,215 @@ class RealisticManualSearcher:
         # 2. 如果映射搜索没有结果，使用传统搜索
         print("🔄 Step 2: Trying direct model search...")
         
-        clean_model = model_number.upper().strip()
-        model_variations = [
-            clean_model,
-            clean_model.replace('-', ''),
-            clean_model.replace(' ', ''),
-            clean_model.replace('/', '-'),
-            f"MEP-{clean_model}" if not clean_model.startswith('MEP') else clean_model
-        ]
-        
+        model_variations = self._model_variations(model_number)
         print(f"📋 Model variations: {model_variations}")
         
+        liberated = [site for site in self.target_sites if site['name'] == 'Liberated Manuals']
+        if not self.available_sites(liberated, skipped_sites):
+            return all_results[:max_results]
+        
         try:
             print("📚 Searching Liberated Manuals for model...")
             for model_var in model_variations:
                 search_url = f"https://www.liberatedmanuals.com/search?q={urllib.parse.quote(model_var)}"
                 print(f"  🔍 Searching: {search_url}")
                 
-                response = self.session.get(search_url, timeout=15)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    pdf_links = soup.find_all('a', href=re.compile(r'\.pdf$', re.I))
-                    
-                    for link in pdf_links:
-                        href = link.get('href')
-                        text = link.get_text().lower()
-                        
-                        if href and any(var.lower() in href.lower() or var.lower() in text for var in model_variations):
-                            if not href.startswith('http'):
-                                href = f"https://www.liberatedmanuals.com{href}"
-                            
-                            all_results.append({
-                                'url': href,
-                                'title': f"Manual for {model_number}",
-                                'confidence': 80,
-                                'method': 'model_search',
-                                'site': 'Liberated Manuals',
-                                'verified': False
-                            })
-                            print(f"    ✅ Found: {href}")
-                            break
+                for href, text in self.fetch_links(search_url, timeout=15, cancel_token=cancel_token):
+                    result = self._model_search_result(href, text, model_number, model_variations)
+                    if result:
+                        all_results.append(result)
+                        print(f"    ✅ Found: {result['url']}")
+                        break
                 
                 if all_results:
                     break
                     
         except Exception as e:
             print(f"    ❌ Liberated Manuals model search error: {e}")
+            self._mark_incomplete(incomplete_sites, ['Liberated Manuals'])
         
         print(f"📊 Enhanced model search complete: {len(all_results)} total results")
         return all_results[:max_results]
 
-# 创建搜索器实例
-searcher = RealisticManualSearcher()
-
-def search_manual_pdfs_realistic(tm_number=None, model_number=None):
-    """主搜索接口 - TM优先（支持部分匹配），Model备用"""
-    all_results = []
+class SearchResultCache:
+    """搜索结果缓存 - SQLite持久化，正/负结果分别设置TTL，按最近访问时间LRU淘汰"""
     
-    if tm_number:
-        print(f"🎯 Priority search: TM {tm_number} (with partial matching)")
-        # 启用部分匹配功能
-        tm_results = searcher.search_tm_number(tm_number, max_results=5, use_partial_match=True)
-        all_results.extend(tm_results)
+    def __init__(self, path, ttl, negative_ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
         
-        if tm_results:
-            print(f"✅ TM search successful: {len(tm_results)} results")
-            return all_results
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS search_cache ('
+            'key TEXT PRIMARY KEY, results TEXT NOT NULL, negative INTEGER NOT NULL, '
+            'expires_at REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_search_cache_access ON search_cache (last_access)')
+        self.conn.commit()
+
+    def get(self, key):
+        """返回缓存的结果列表，未命中或已过期时返回None"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT results, expires_at FROM search_cache WHERE key = ?', (key,)
+            ).fetchone()
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            if row[1] <= now:
+                self.conn.execute('DELETE FROM search_cache WHERE key = ?', (key,))
+                self.conn.commit()
+                self.misses += 1
+                return None
+            
+            self.conn.execute('UPDATE search_cache SET last_access = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, results):
+        """写入结果，空结果使用较短的负缓存TTL"""
+        now = time.time()
+        negative = not results
+        expires_at = now + (self.negative_ttl if negative else self.ttl)
+        
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO search_cache (key, results, negative, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, json.dumps(results), int(negative), expires_at, now)
+            )
+            
+            # 超出容量时淘汰最久未访问的条目
+            count = self.conn.execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    'DELETE FROM search_cache WHERE key IN '
+                    '(SELECT key FROM search_cache ORDER BY last_access ASC LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            entries, negative = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(negative), 0) FROM search_cache'
+            ).fetchone()
+            return {
+                'entries': entries,
+                'negative_entries': negative,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+# 创建搜索器实例
+searcher = RealisticManualSearcher()
+
+result_cache = SearchResultCache(
+    RESULT_CACHE_PATH, RESULT_CACHE_TTL, RESULT_CACHE_NEGATIVE_TTL, RESULT_CACHE_MAX_ENTRIES
+) if RESULT_CACHE_ENABLED else None
+
+catalog_refresh_lock = None
+
+def acquire_catalog_refresh_lock():
+    """多进程部署时只让一个进程定期爬取索引（非阻塞文件锁，进程退出时自动释放）"""
+    global catalog_refresh_lock
+    if fcntl is None:
+        return True
     
-    if not all_results and model_number:
-        print(f"🔄 Enhanced model search: {model_number}")
-        model_results = searcher.search_model_number(model_number, max_results=5)
-        all_results.extend(model_results)
+    lock_file = open(CATALOG_PATH + '.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    catalog_refresh_lock = lock_file
+    return True
+
+def start_catalog_refresher():
+    """按CATALOG_REFRESH_INTERVAL在后台定期重新爬取本地索引，多个进程中只有一个会启动"""
+    if not searcher.catalog or CATALOG_REFRESH_INTERVAL <= 0:
+        return None
+    if not acquire_catalog_refresh_lock():
+        print(f"🕷️ Catalog refresher already running in another process")
+        return None
+    
+    def refresh_loop():
+        while True:
+            try:
+                searcher.crawl_catalog()
+            except Exception as e:
+                print(f"❌ Catalog refresh failed: {e}")
+            time.sleep(CATALOG_REFRESH_INTERVAL)
+    
+    thread = threading.Thread(target=refresh_loop, name='catalog-refresh', daemon=True)
+    thread.start()
+    print(f"🕷️ Catalog refresher started (every {CATALOG_REFRESH_INTERVAL:.0f}s)")
+    return thread
+
+def make_search_cache_key(tm_number=None, model_number=None, namespace=None):
+    """缓存键 - 使用标准化后的TM号和模型号
+
+    结果形状不同的搜索（如只做精确匹配的流式搜索）用namespace区分，互不读取对方的结果
+    """
+    tm_key = searcher.format_tm_number(tm_number).get('tm_dashed', '') if tm_number else ''
+    model_key = searcher.model_mapper.normalize_model_number(model_number) if model_number else ''
+    key = f"tm={tm_key}|model={model_key}"
+    return f"{namespace}:{key}" if namespace else key
+
+def get_cached_search_results(tm_number=None, model_number=None, namespace=None):
+    """读取缓存的搜索结果，结果标记为cached"""
+    if result_cache is None:
+        return None
+    
+    cache_key = make_search_cache_key(tm_number, model_number, namespace)
+    cached_results = result_cache.get(cache_key)
+    if cached_results is None:
+        return None
+    
+    print(f"⚡ Cache hit: {cache_key} ({len(cached_results)} results)")
+    for result in cached_results:
+        result['cached'] = True
+    return cached_results
+
+def store_search_results(tm_number, model_number, results, namespace=None):
+    """写入搜索结果缓存"""
+    if result_cache is None:
+        return
+    
+    try:
+        result_cache.set(make_search_cache_key(tm_number, model_number, namespace), results)
+    except Exception as e:
+        print(f"⚠️ Failed to cache search results: {e}")
+
+def search_manual_pdfs_realistic(tm_number=None, model_number=None, skipped_sites=None, engine='sync',
+                                 cancel_token=None):
+    """主搜索接口 - TM优先（支持部分匹配），Model备用，结果先查缓存
+
+    skipped_sites为列表时，因熔断被跳过的站点名会追加到其中；
+    engine为'async'时实时搜索由 AsyncManualSearcher 执行（结果相同，共用缓存）；
+    cancel_token传给同步引擎的实时搜索（取消和按主机限速）
+    """
+    all_results = get_cached_search_results(tm_number, model_number)
+    cached = all_results is not None
+    
+    if not cached:
+        # 相同TM/Model的并发请求共享一次实时搜索
+        all_results, skipped = search_flight.do(
+            make_search_cache_key(tm_number, model_number), _search_and_store, tm_number, model_number, engine,
+            cancel_token=cancel_token
+        )
+        if skipped_sites is not None:
+            skipped_sites.extend(site for site in skipped if site not in skipped_sites)
     
     if not all_results:
         manual_search_query = tm_number if tm_number else model_number
@@ -898,160 +2688,1766 @@ def search_manual_pdfs_realistic(tm_number=None, model_number=None):
             'confidence': 50,
             'site': 'Google Manual Search',
             'method': 'manual_fallback',
-            'verified': False
+            'verified': False,
+            'cached': cached
         }]
     
-    return all_results
+    return all_results
+
+search_flight = SingleFlight('search', cancellable=True)
+
+# /search-stream-fixed 的结果缓存命名空间
+STREAM_CACHE_NAMESPACE = 'stream'
+
+def _search_and_store(tm_number, model_number, engine='sync', cancel_token=None):
+    """实时搜索并写入结果缓存，返回 (结果, 被跳过的站点)"""
+    skipped_sites = []
+    incomplete_sites = []
+    if engine == 'async':
+        all_results = async_searcher.run(
+            async_searcher.search_live(tm_number, model_number, skipped_sites, incomplete_sites)
+        )
+    else:
+        all_results = _search_manual_pdfs_live(tm_number, model_number, skipped_sites, cancel_token, incomplete_sites)
+    # 有站点被跳过、超时或出错时的空结果不可信，不写入缓存
+    if all_results or not (skipped_sites or incomplete_sites):
+        store_search_results(tm_number, model_number, all_results)
+    elif incomplete_sites:
+        print(f"⚠️ Not caching empty results - incomplete sites: {incomplete_sites}")
+    return all_results, skipped_sites
+
+def _search_manual_pdfs_live(tm_number=None, model_number=None, skipped_sites=None, cancel_token=None,
+                             incomplete_sites=None):
+    """实际访问外部站点的搜索，TM和Model搜索共用SEARCH_DEADLINE"""
+    all_results = []
+    end_time = time.time() + SEARCH_DEADLINE
+    
+    if tm_number:
+        print(f"🎯 Priority search: TM {tm_number} (with partial matching)")
+        # 启用部分匹配功能
+        tm_results = searcher.search_tm_number(tm_number, max_results=5, use_partial_match=True,
+                                               skipped_sites=skipped_sites, cancel_token=cancel_token,
+                                               incomplete_sites=incomplete_sites)
+        all_results.extend(tm_results)
+        
+        if tm_results:
+            print(f"✅ TM search successful: {len(tm_results)} results")
+            return all_results
+    
+    if not all_results and model_number:
+        print(f"🔄 Enhanced model search: {model_number}")
+        model_results = searcher.search_model_number(model_number, max_results=5, skipped_sites=skipped_sites,
+                                                     cancel_token=cancel_token, incomplete_sites=incomplete_sites,
+                                                     deadline=end_time - time.time())
+        all_results.extend(model_results)
+    
+    return all_results
+
+async def aiter_response_links(response, chunk_size=None):
+    """iter_response_links 的 aiohttp 版本：边下载边解析，逐个产出 (href, 链接文字)
+
+    编码与 requests 的 response.encoding 一致（text/* 没有 charset 时为 ISO-8859-1）
+    """
+    parser = LinkExtractor()
+    encoding = requests.utils.get_encoding_from_headers(response.headers) or 'utf-8'
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    async for chunk in response.content.iter_chunked(chunk_size or LINK_SCAN_CHUNK_SIZE):
+        parser.feed(decoder.decode(chunk))
+        for link in parser.pop_links():
+            yield link
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    for link in parser.pop_links():
+        yield link
+
+class AsyncLoopThread:
+    """在后台线程里运行一个共享的事件循环，同步代码（Flask路由）通过 run() 提交协程
+
+    事件循环在第一次使用时才启动，gunicorn fork 出的每个进程各有自己的循环
+    """
+    
+    def __init__(self, name='async-search'):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+    
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+                self.thread.start()
+            return self.loop
+    
+    def run(self, coro, timeout=None):
+        """在共享循环中执行协程并等待结果，超时时取消协程"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.start())
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+    
+    def stop(self):
+        with self.lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=5)
+                self.loop = None
+                self.thread = None
+
+class AsyncManualSearcher:
+    """RealisticManualSearcher 的 asyncio 版本 - 同样的站点策略，基于 aiohttp 的共享连接池
+
+    每个URL探测是一个协程而不是一个线程，几百个并发搜索也只占用一个事件循环线程。
+    TM格式化、结果构造、本地索引、熔断器、SSL回退策略和页面缓存都与同步搜索器共用，
+    同样的输入返回同样的结果。async 框架中直接 await 各个方法，同步代码里用 run()
+    """
+    
+    # 这些方法类型由站点的专用搜索方法处理；其他类型（只靠配置的通用策略）在线程池里运行同步版本
+    DEDICATED_METHOD_TYPES = ('direct_pdf_patterns', 'direct_and_search')
+    
+    def __init__(self, sync_searcher, limit=ASYNC_HTTP_LIMIT, limit_per_host=HTTP_POOL_MAXSIZE):
+        self.sync = sync_searcher
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.session = None
+        self.loop_thread = AsyncLoopThread()
+        
+        self.site_search_methods = {
+            'Liberated Manuals': self.search_liberated_manuals,
+            'Green Mountain Generators': self.search_green_mountain,
+            'Combat Index': self.search_combat_index,
+            'Radio Nerds': self.search_radio_nerds,
+        }
+    
+    def run(self, coro, timeout=None):
+        return self.loop_thread.run(coro, timeout)
+    
+    def get_session(self):
+        """在事件循环中第一次使用时创建 aiohttp 会话，所有搜索共用它的连接池"""
+        if self.session is None or self.session.closed:
+            headers = {key: value for key, value in self.sync.session.headers.items() if key != 'Connection'}
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host, force_close=not HTTP_KEEPALIVE
+            )
+            self.session = aiohttp.ClientSession(connector=connector, headers=headers)
+        return self.session
+    
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+    
+    def shutdown(self):
+        """关闭连接池并停止事件循环线程"""
+        if self.loop_thread.loop is not None:
+            try:
+                self.run(self.close(), timeout=5)
+            except Exception as e:
+                print(f"⚠️ Failed to close async search session: {e}")
+            self.loop_thread.stop()
+    
+    async def _site_request(self, method, url, timeout, **kwargs):
+        """与同步版相同：熔断检查、已知主机跳过SSL验证、只重试连接失败、记录站点健康
+
+        返回的响应需要调用方 async with 释放
+        """
+        site = self.sync.site_for_url(url)
+        if site and self.sync.site_health.is_open(site):
+            raise SiteUnavailableError(f"{site} temporarily skipped (circuit open)")
+        
+        host = (urlparse(url).hostname or '').lower()
+        verify = kwargs.pop('verify', None)
+        if verify is None:
+            verify = self.sync.tls_policy.should_verify(host)
+        retries = self.sync.http.host_settings.get(host, self.sync.http.defaults)['retries']
+        client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+        request = getattr(self.get_session(), method)
+        
+        start_time = time.time()
+        for attempt in itertools.count(1):
+            try:
+                response = await request(url, timeout=client_timeout, ssl=None if verify else False, **kwargs)
+                break
+            except aiohttp.ClientSSLError:
+                raise
+            except aiohttp.ClientConnectorError:
+                if attempt > retries:
+                    if site:
+                        self.sync.site_health.record(site, time.time() - start_time, False)
+                    raise
+                if attempt > 1:
+                    await asyncio.sleep(HTTP_RETRY_BACKOFF * (2 ** (attempt - 1)))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if site:
+                    self.sync.site_health.record(site, time.time() - start_time, False)
+                raise
+        
+        if site:
+            self.sync.site_health.record(site, time.time() - start_time, response.status < 500)
+        if verify and url.startswith('https'):
+            self.sync.tls_policy.record_verified(host)
+        return response
+    
+    async def _make_safe_request(self, url, timeout, **kwargs):
+        """SSL证书错误时跳过验证重试一次，并记入SSL回退策略"""
+        try:
+            return await self._site_request('get', url, timeout, **kwargs)
+        except aiohttp.ClientSSLError as ssl_error:
+            print(f"  ⚠️ SSL certificate error for {url}: {ssl_error}")
+            print(f"  🔄 Retrying without SSL verification...")
+            host = (urlparse(url).hostname or '').lower()
+            self.sync.tls_policy.record_ssl_failure(host, ssl_error)
+            try:
+                response = await self._site_request('get', url, timeout, verify=False, **kwargs)
+                self.sync.tls_policy.record_fallback(host, True)
+                print(f"  ✅ Request successful without SSL verification")
+                return response
+            except Exception as retry_error:
+                self.sync.tls_policy.record_fallback(host, False, retry_error)
+                print(f"  ❌ Request failed even without SSL verification: {retry_error}")
+                raise
+        except Exception as other_error:
+            print(f"  ❌ Request failed: {other_error}")
+            raise
+    
+    async def fetch_links(self, url, timeout=15, safe=False):
+        """与同步版 fetch_links 相同，共用页面缓存；调用方提前停止时用 aclosing() 及时释放连接
+
+        页面缓存的SQLite读写和锁与同步引擎的线程共用，放到线程里执行，不阻塞事件循环
+        """
+        page_cache = self.sync.page_cache
+        cached = await asyncio.to_thread(page_cache.get, url) if page_cache else None
+        if cached and cached['fresh']:
+            await asyncio.to_thread(page_cache.record_hit, cached['body_bytes'], fresh=True)
+            for link in cached['links']:
+                yield link
+            return
+        
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        
+        if safe:
+            response = await self._make_safe_request(url, timeout, headers=headers)
+        else:
+            response = await self._site_request('get', url, timeout, headers=headers)
+        
+        async with response:
+            max_age = parse_max_age(response)
+            if response.status == 304 and cached:
+                print(f"  ♻️ Not modified, using cached links: {url}")
+                await asyncio.to_thread(page_cache.record_hit, cached['body_bytes'])
+                await asyncio.to_thread(page_cache.revalidated, url, max_age if max_age and max_age > 0 else None)
+                links = cached['links']
+            elif response.status == 200:
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                collected = [] if page_cache and (etag or last_modified) and max_age != -1 else None
+                
+                async for link in aiter_response_links(response):
+                    if collected is not None:
+                        collected.append(link)
+                    yield link
+                
+                if collected is not None:
+                    await asyncio.to_thread(page_cache.set, url, etag, last_modified, collected,
+                                            response.content.total_bytes, max_age)
+                return
+            else:
+                return
+        
+        for link in links:
+            yield link
+    
+    async def probe_candidate_urls(self, patterns, tm_formats, timeout=10, site_name=None):
+        """并发HEAD探测候选URL，第一个响应PDF的URL胜出，其余探测直接取消；没有命中且有探测出错时抛出 SiteSearchError"""
+        candidates = self.sync._candidate_urls(patterns, tm_formats)
+        if not candidates:
+            return None
+        
+        start_time = time.time()
+        tasks = [asyncio.ensure_future(self._probe_candidate_url(pattern, url, timeout)) for pattern, url in candidates]
+        timings = []
+        
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                probe = await next_done
+                timings.append(probe)
+                if probe['is_pdf']:
+                    print(f"    ✅ Found PDF! ({probe['elapsed']:.2f}s)")
+                    return {
+                        'url': probe['url'],
+                        'pattern': probe['pattern'],
+                        'elapsed': round(time.time() - start_time, 3),
+                        'timings': timings
+                    }
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        errors = [probe['error'] for probe in timings if probe['error']]
+        if errors:
+            raise SiteSearchError(site_name or urlparse(candidates[0][1]).hostname, errors)
+        return None
+    
+    async def _probe_candidate_url(self, pattern, url, timeout):
+        print(f"  🔗 Testing: {url}")
+        start_time = time.time()
+        status = None
+        is_pdf = False
+        
+        try:
+            async with await self._site_request('head', url, timeout, allow_redirects=True) as response:
+                status = response.status
+                if status == 200:
+                    content_type = response.headers.get('content-type', '').lower()
+                    is_pdf = 'pdf' in content_type
+        except Exception as e:
+            print(f"    ❌ Error testing {url}: {e}")
+            error = e
+        else:
+            error = None
+        
+        return self.sync._record_probe(pattern, url, status, is_pdf, time.time() - start_time, error)
+    
+    async def _head_status(self, url, timeout):
+        async with await self._site_request('head', url, timeout) as response:
+            return response.status
+    
+    async def search_liberated_manuals(self, tm_formats):
+        print("📚 Searching Liberated Manuals...")
+        hit = await self.probe_candidate_urls(self.sync.LIBERATED_MANUALS_PATTERNS, tm_formats, timeout=10,
+                                              site_name='Liberated Manuals')
+        return [self.sync._direct_pdf_result(hit, tm_formats, 'Liberated Manuals', 95)] if hit else []
+    
+    async def search_combat_index(self, tm_formats):
+        print("⚔️ Searching Combat Index...")
+        hit = await self.probe_candidate_urls(self.sync.COMBAT_INDEX_PATTERNS, tm_formats, timeout=10,
+                                              site_name='Combat Index')
+        return [self.sync._direct_pdf_result(hit, tm_formats, 'Combat Index', 90)] if hit else []
+    
+    async def search_green_mountain(self, tm_formats):
+        print("搜索Green Mountain Generators...")
+        errors = []
+        
+        for page_url in self.sync.GREEN_MOUNTAIN_MANUAL_PAGES:
+            try:
+                print(f"  检查手册页面: {page_url}")
+                
+                tm_parts = tm_formats['tm_dashed'].split('-')
+                exact_tm = '-'.join(tm_parts[:4]) if len(tm_parts) >= 3 else None
+                page_links = {}
+                page_index = TMPrefixIndex()
+                
+                async with aclosing(self.fetch_links(page_url, timeout=15)) as links:
+                    async for href, _ in links:
+                        if self.sync._green_mountain_add_link(href, page_links, page_index, exact_tm):
+                            print(f"    已找到足够的精确匹配，停止读取页面")
+                            break
+                
+                results = self.sync._green_mountain_results(page_links, page_index, exact_tm, tm_formats)
+                if results:
+                    return results
+            
+            except Exception as e:
+                print(f"    检查{page_url}时出错: {e}")
+                errors.append(e)
+                continue
+        
+        if errors:
+            raise SiteSearchError('Green Mountain Generators', errors)
+        return []
+    
+    async def search_radio_nerds(self, tm_formats):
+        print("📻 Searching Radio Nerds (hybrid method)...")
+        print("  🔍 Trying MediaWiki search...")
+        tm_parts = tm_formats['tm_dashed'].split('-')
+        errors = []
+        
+        for search_url in self.sync._radio_nerds_search_urls(tm_formats):
+            try:
+                print(f"  🔍 MediaWiki search: {search_url}")
+                
+                async with aclosing(self.fetch_links(search_url, timeout=15, safe=True)) as links:
+                    async for href, link_text in links:
+                        link = self.sync._radio_nerds_search_link(href, link_text, tm_parts)
+                        if not link:
+                            continue
+                        kind, href = link
+                        
+                        if kind == 'pdf':
+                            try:
+                                if await self._head_status(href, timeout=5) == 200:
+                                    print(f"    Found via MediaWiki search: {href}")
+                                    return [self.sync._radio_nerds_result(href, tm_formats, 'mediawiki_search', 90)]
+                            except Exception as e:
+                                errors.append(e)
+                                continue
+                        else:
+                            try:
+                                page_result = await self._radio_nerds_page_pdf(href, tm_formats, tm_parts, errors)
+                                if page_result:
+                                    return [page_result]
+                            except Exception as e:
+                                errors.append(e)
+                                continue
+            
+            except Exception as e:
+                print(f"    ❌ MediaWiki search error: {e}")
+                errors.append(e)
+        
+        if errors:
+            raise SiteSearchError('Radio Nerds', errors)
+        return []
+    
+    async def _radio_nerds_page_pdf(self, page_url, tm_formats, tm_parts, errors=None):
+        async with aclosing(self.fetch_links(page_url, timeout=10)) as links:
+            async for pdf_href, _ in links:
+                pdf_href = self.sync._radio_nerds_page_link(pdf_href, tm_parts)
+                if not pdf_href:
+                    continue
+                
+                try:
+                    if await self._head_status(pdf_href, timeout=5) == 200:
+                        print(f"    ✅ Found via page crawl: {pdf_href}")
+                        return self.sync._radio_nerds_result(pdf_href, tm_formats, 'page_crawl', 88)
+                except Exception as e:
+                    if errors is not None:
+                        errors.append(e)
+                    continue
+        
+        return None
+    
+    async def search_site_intelligently(self, site_config, tm_formats):
+        site_name = site_config['name']
+        method_types = [method_config['type'] for method_config in site_config['methods']]
+        dedicated = all(
+            method_type in self.DEDICATED_METHOD_TYPES or
+            (method_type == 'site_search_only' and site_name == 'Radio Nerds')
+            for method_type in method_types
+        )
+        if not dedicated:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.sync.site_executor, self.sync.search_site_intelligently, site_config, tm_formats
+            )
+        
+        print(f"🔍 Searching {site_name} intelligently...")
+        results = []
+        for method_type in method_types:
+            if method_type == 'site_search_only':
+                return await self.site_search_methods[site_name](tm_formats)
+            if site_name in self.site_search_methods:
+                results.extend(await self.site_search_methods[site_name](tm_formats))
+        return results
+    
+    async def search_tm_number(self, tm_number, max_results=5, use_partial_match=True, parallel=None, deadline=None,
+                               skipped_sites=None, incomplete_sites=None):
+        """与 RealisticManualSearcher.search_tm_number 相同的策略和结果"""
+        print(f"\n🎯 Async TM search for: {tm_number}")
+        
+        if not tm_number:
+            return []
+        
+        if parallel is None:
+            parallel = SEARCH_PARALLEL
+        if deadline is None:
+            deadline = SEARCH_DEADLINE
+        end_time = time.time() + deadline
+        
+        tm_formats = self.sync.format_tm_number(tm_number)
+        
+        # 本地索引的查找与同步引擎共用锁，同样放到线程里执行
+        catalog_results = await asyncio.to_thread(self.sync.search_catalog, tm_formats)
+        if catalog_results:
+            print(f"📚 Catalog hit: {len(catalog_results)} result(s)")
+            return catalog_results[:max_results]
+        
+        sorted_sites = self.sync.available_sites(sorted(self.sync.target_sites, key=lambda x: x['priority']), skipped_sites)
+        
+        if parallel:
+            all_results = await self._search_sites_parallel(sorted_sites, tm_formats, deadline, incomplete_sites)
+        else:
+            all_results = await self._search_sites_sequential(sorted_sites, tm_formats, max_results, incomplete_sites)
+        
+        if not all_results and use_partial_match:
+            catalog_results = await asyncio.to_thread(self.sync.search_catalog_partial, tm_formats)
+            if catalog_results:
+                print(f"📚 Catalog partial match: {len(catalog_results)} result(s)")
+                return catalog_results[:max_results]
+        
+        if not all_results and use_partial_match:
+            sibling_tm = self.sync.tm_index.closest_sibling(tm_formats['tm_dashed'])
+            if sibling_tm:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    print(f"  ⏱️ No time left to search closest known sibling: {sibling_tm}")
+                    self.sync._mark_incomplete(incomplete_sites, [site['name'] for site in sorted_sites])
+                else:
+                    print(f"  🔁 No results, trying closest known sibling: {sibling_tm} ({remaining:.1f}s left)")
+                    all_results = await self.search_tm_number(sibling_tm, max_results, use_partial_match=False,
+                                                              parallel=parallel, deadline=remaining,
+                                                              skipped_sites=skipped_sites,
+                                                              incomplete_sites=incomplete_sites)
+                self.sync._mark_partial_results(all_results, tm_formats, sibling_tm)
+        
+        return self.sync._rank_results(all_results, max_results)
+    
+    async def _search_sites_sequential(self, sorted_sites, tm_formats, max_results, incomplete_sites=None):
+        all_results = []
+        
+        for site_config in sorted_sites:
+            if len(all_results) >= max_results:
+                break
+            
+            if site_config['name'] == 'Radio Nerds' and len(all_results) > 0:
+                print(f"  ⏭️ Skipping RadioNerds - already found {len(all_results)} verified result(s)")
+                continue
+            
+            try:
+                site_results = await self.search_site_intelligently(site_config, tm_formats)
+                all_results.extend(site_results)
+                
+                if site_results:
+                    print(f"  ✅ {site_config['name']}: Found {len(site_results)} result(s)")
+                    if any(r.get('verified', False) for r in site_results):
+                        break
+                else:
+                    print(f"  ❌ {site_config['name']}: No results")
+            
+            except Exception as e:
+                print(f"  ❌ {site_config['name']} error: {e}")
+                self.sync._mark_incomplete(incomplete_sites, [site_config['name']])
+        
+        return all_results
+    
+    async def _search_sites_parallel(self, sorted_sites, tm_formats, deadline=None, incomplete_sites=None):
+        """同时搜索所有站点，找到verified PDF或超过deadline后取消其余站点"""
+        if deadline is None:
+            deadline = SEARCH_DEADLINE
+        end_time = time.time() + deadline
+        
+        tasks = {
+            asyncio.ensure_future(self.search_site_intelligently(site_config, tm_formats)): site_config
+            for site_config in sorted_sites
+        }
+        pending = set(tasks)
+        site_results = {}
+        
+        try:
+            while pending:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    print(f"  ⏱️ Deadline {deadline}s reached, abandoning {len(pending)} site(s)")
+                    self.sync._mark_incomplete(incomplete_sites, [tasks[task]['name'] for task in pending])
+                    break
+                
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    site_config = tasks[task]
+                    try:
+                        results = task.result()
+                    except Exception as e:
+                        print(f"  ❌ {site_config['name']} error: {e}")
+                        self.sync._mark_incomplete(incomplete_sites, [site_config['name']])
+                        results = []
+                    
+                    site_results[site_config['name']] = results
+                    if results:
+                        print(f"  ✅ {site_config['name']}: Found {len(results)} result(s)")
+                    else:
+                        print(f"  ❌ {site_config['name']}: No results")
+                
+                if pending and any(r.get('verified', False) for results in site_results.values() for r in results):
+                    print(f"  ⏹️ Verified PDF found, cancelling {len(pending)} slower site(s)")
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        return self.sync._merge_site_results(sorted_sites, site_results)
+    
+    async def search_model_number(self, model_number, max_results=5, skipped_sites=None, incomplete_sites=None,
+                                  deadline=None):
+        """与 RealisticManualSearcher.search_model_number 相同的策略和结果"""
+        print(f"\n🔍 Async model search for: {model_number}")
+        
+        if not model_number:
+            return []
+        
+        all_results = []
+        end_time = time.time() + (deadline if deadline is not None else SEARCH_DEADLINE)
+        
+        tm_numbers = self.sync.model_mapper.find_tm_numbers_for_model(model_number)
+        if tm_numbers:
+            print(f"   ✅ Found TM mappings: {tm_numbers}")
+            
+            for tm_number in tm_numbers:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    print(f"   ⏱️ Deadline reached, not searching mapped TM: {tm_number}")
+                    self.sync._mark_incomplete(incomplete_sites, [f"TM {tm_number}"])
+                    continue
+                try:
+                    tm_results = await self.search_tm_number(tm_number, max_results=3, use_partial_match=True,
+                                                             deadline=remaining, skipped_sites=skipped_sites,
+                                                             incomplete_sites=incomplete_sites)
+                    self.sync._mark_mapped_results(tm_results, model_number, tm_number)
+                    all_results.extend(tm_results)
+                    
+                    if tm_results:
+                        print(f"     ✅ Found {len(tm_results)} results for TM {tm_number}")
+                        break
+                    else:
+                        print(f"     ❌ No results for TM {tm_number}")
+                
+                except Exception as e:
+                    print(f"     ❌ Error searching TM {tm_number}: {e}")
+                    self.sync._mark_incomplete(incomplete_sites, [f"TM {tm_number}"])
+            
+            if all_results:
+                return all_results[:max_results]
+        else:
+            print(f"   ❌ No TM mappings found for {model_number}")
+        
+        model_variations = self.sync._model_variations(model_number)
+        
+        liberated = [site for site in self.sync.target_sites if site['name'] == 'Liberated Manuals']
+        if not self.sync.available_sites(liberated, skipped_sites):
+            return all_results[:max_results]
+        
+        try:
+            for model_var in model_variations:
+                search_url = f"https://www.liberatedmanuals.com/search?q={urllib.parse.quote(model_var)}"
+                print(f"  🔍 Searching: {search_url}")
+                
+                async with aclosing(self.fetch_links(search_url, timeout=15)) as links:
+                    async for href, text in links:
+                        result = self.sync._model_search_result(href, text, model_number, model_variations)
+                        if result:
+                            all_results.append(result)
+                            print(f"    ✅ Found: {result['url']}")
+                            break
+                
+                if all_results:
+                    break
+        
+        except Exception as e:
+            print(f"    ❌ Liberated Manuals model search error: {e}")
+            self.sync._mark_incomplete(incomplete_sites, ['Liberated Manuals'])
+        
+        print(f"📊 Async model search complete: {len(all_results)} total results")
+        return all_results[:max_results]
+    
+    async def search_live(self, tm_number=None, model_number=None, skipped_sites=None, incomplete_sites=None):
+        """_search_manual_pdfs_live 的异步版本：TM优先，无结果时按Model搜索，两者共用SEARCH_DEADLINE"""
+        end_time = time.time() + SEARCH_DEADLINE
+        if tm_number:
+            tm_results = await self.search_tm_number(tm_number, max_results=5, use_partial_match=True,
+                                                     skipped_sites=skipped_sites, incomplete_sites=incomplete_sites)
+            if tm_results:
+                return tm_results
+        
+        if model_number:
+            return await self.search_model_number(model_number, max_results=5, skipped_sites=skipped_sites,
+                                                  incomplete_sites=incomplete_sites,
+                                                  deadline=end_time - time.time())
+        
+        return []
+
+async_searcher = AsyncManualSearcher(searcher) if aiohttp is not None else None
+
+# OCR 相关函数
+class FieldExtractor:
+    """预编译的MODEL/TM提取引擎 - 所有模式在导入时编译一次
+
+    按模式优先级和出现位置给候选排序，第一个候选与逐个模式findall的结果一致。
+    以\\b开头的模式没有字面前缀，正则引擎要在每个位置尝试匹配，
+    所以每个模式带一个必需的字面量，文本中没有时直接跳过该模式。
+    没有字面量的兜底模式只在前面的模式都没有候选时才扫描，每个字段最多收集 MAX_CANDIDATES 个候选
+    """
+    
+    MAX_CANDIDATES = 5
+    
+    # TM号匹配模式 - 支持4段和5段TM号: (模式, 置信度, 必需字面量)
+    TM_PATTERNS = [
+        (r'TM[:\s]*(\d+-\d+-\d+-\d+[A-Z]*)', 95, 'TM'),  # 支持如 9-6115-585-24P
+        (r'TM[:\s]*(\d+-\d+-\d+-\d+)', 90, 'TM'),         # 标准4段
+        (r'\b(\d+-\d+-\d+-\d+[A-Z]*)\b', 75, '-'),        # 无TM前缀
+        (r'TM[:\s]*(\d+-\d+-\d+-\d+-\d+)', 85, 'TM'),     # 5段数字格式
+    ]
+    
+    # 模型号匹配模式
+    MODEL_PATTERNS = [
+        (r'\b(MEP[-\s]*[0-9]+[A-Z]*)\b', 90, 'MEP'),
+        (r'MODEL[:\s]*([A-Z0-9\-/]+)', 85, 'MODEL'),
+        (r'\b(M[0-9]+[A-Z]*/?[A-Z]*)\b', 65, 'M'),
+        (r'\b([A-Z]{2,4}[-]?[0-9]{2,5}[A-Z]*/?[A-Z]*)\b', 50, '')
+    ]
+    
+    MODEL_EXCLUDE_PATTERNS = [
+        r'TM\b', r'TO\b', r'\d+-\d+-\d+-',
+        r'120\b', r'208\b', r'240\b', r'480\b'
+    ]
+    
+    MODEL_EXCLUDE_WORDS = [
+        'US', 'NATO', 'DEPARTMENT', 'GENERATOR', 'ENGINE', 'DIESEL',
+        'POWER', 'ARMY', 'SYSTEM'
+    ]
+    
+    def __init__(self):
+        self.tm_patterns = [(re.compile(pattern), confidence, literal) for pattern, confidence, literal in self.TM_PATTERNS]
+        self.model_patterns = [(re.compile(pattern), confidence, literal) for pattern, confidence, literal in self.MODEL_PATTERNS]
+        self.tm_valid = re.compile(r'\d+-\d+-\d+-')
+        self.model_exclude = re.compile('(?:' + '|'.join(self.MODEL_EXCLUDE_PATTERNS) + ')')
+        self.model_exclude_words = re.compile('|'.join(re.escape(word) for word in self.MODEL_EXCLUDE_WORDS))
+        self.whitespace = re.compile(r'\s+')
+
+    def clean_tm(self, value):
+        clean_match = value.strip()
+        if len(clean_match) >= 8 and self.tm_valid.match(clean_match):
+            return clean_match
+        return None
+
+    def clean_model(self, value):
+        clean_match = self.whitespace.sub('', value.strip())
+        should_exclude = (
+            self.model_exclude.match(clean_match) or
+            self.model_exclude_words.search(clean_match) or
+            len(clean_match) < 2 or clean_match.isdigit()
+        )
+        return None if should_exclude else clean_match
+
+    def _scan(self, patterns, clean, text_upper, limit):
+        """按模式优先级扫描，最多返回 limit 个 [(值, 位置, 置信度, 模式序号)]"""
+        candidates = []
+        seen = set()
+        for rank, (pattern, confidence, literal) in enumerate(patterns):
+            if literal not in text_upper or (not literal and candidates):
+                continue
+            for match in pattern.finditer(text_upper):
+                value = clean(match.group(1))
+                if not value or (value, match.start(1)) in seen:
+                    continue
+                seen.add((value, match.start(1)))
+                candidates.append((value, match.start(1), confidence, rank))
+                if len(candidates) >= limit:
+                    return candidates
+        return candidates
+
+    def extract(self, text, with_candidates=False):
+        """提取MODEL和TM字段；with_candidates为True时附带所有排序后的候选"""
+        if not text:
+            result = {"model": None, "tm": None}
+            if with_candidates:
+                result["candidates"] = {"tm": [], "model": []}
+            return result
+        
+        text_upper = text.upper()
+        limit = self.MAX_CANDIDATES if with_candidates else 1
+        tm_candidates = self._scan(self.tm_patterns, self.clean_tm, text_upper, limit)
+        model_candidates = self._scan(self.model_patterns, self.clean_model, text_upper, limit)
+        
+        result = {
+            "model": model_candidates[0][0] if model_candidates else None,
+            "tm": tm_candidates[0][0] if tm_candidates else None
+        }
+        
+        if with_candidates:
+            result["candidates"] = {
+                field: [
+                    {"value": value, "position": position, "confidence": confidence, "pattern": rank}
+                    for value, position, confidence, rank in candidates
+                ]
+                for field, candidates in (("tm", tm_candidates), ("model", model_candidates))
+            }
+        
+        return result
+
+field_extractor = FieldExtractor()
+
+def extract_model_tm(text, with_candidates=False):
+    """提取MODEL和TM字段"""
+    return field_extractor.extract(text, with_candidates)
+
+class LayoutFieldExtractor:
+    """基于版面的MODEL/TM提取 - 取标签右侧或正下方的值
+
+    铭牌上电压、序列号常与型号挨在一起，纯文本提取容易选错；
+    有 "MODEL"/"TM" 标签时，按坐标找标签对应的值更可靠
+    """
+    
+    # 标签词，允许带冒号/点/#，也允许值和标签粘连（如 "MODEL:MEP-803A"）
+    LABELS = {
+        "model": re.compile(r'^(?:MODEL|MDL)(?:\s*(?:NO|NUMBER))?[.:#]*(.*)$'),
+        "tm": re.compile(r'^(?:TM|T\.M\.)[.:#]*(.*)$'),
+    }
+    
+    # 标签和值之间可能出现的填充词
+    FILLER_WORDS = {'NO', 'NO.', 'NUMBER', '#', ':', '-', 'NR', 'NR.'}
+    
+    # 其他字段的标签 - 标签右侧紧跟的是另一个标签时（表头行），值应在下方
+    OTHER_LABELS = {
+        'SERIAL', 'S/N', 'SN', 'NSN', 'VOLTS', 'VOLTAGE', 'AMPS', 'AMPERES', 'HZ',
+        'KW', 'PHASE', 'WEIGHT', 'DATE', 'CONTRACT', 'MFR', 'MODEL', 'TM', 'RPM', 'PF'
+    }
+    
+    # 下方的值最多相隔几个标签行高，右侧的值最多相隔几个标签宽度
+    BELOW_MAX_LINES = 3
+    RIGHT_MAX_WIDTHS = 6
+    
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self.tm_value = re.compile(r'(\d+-\d+-\d+-\d+(?:-\d+)?[A-Z]*)')
+        self.strip_chars = ':.,;()[]'
+    
+    def _value(self, field, tokens):
+        """从标签后的词序列中取出并校验字段值"""
+        tokens = [token.upper().strip(self.strip_chars) for token in tokens]
+        tokens = [token for token in tokens if token and token not in self.FILLER_WORDS]
+        if not tokens or tokens[0] in self.OTHER_LABELS:
+            return None
+        
+        if field == "tm":
+            match = self.tm_value.search(' '.join(tokens[:2]))
+            return self.extractor.clean_tm(match.group(1)) if match else None
+        
+        value = tokens[0]
+        # "MEP 803A" 这类被OCR拆开的型号与文本提取一致地合并为 "MEP803A"
+        if value.isalpha() and len(tokens) > 1 and tokens[1][:1].isdigit():
+            value += tokens[1]
+        return self.extractor.clean_model(value)
+    
+    def _right_tokens(self, layout, line, word, label_box):
+        """同一行标签之后的词；没有时取同一水平带上、标签右侧最近的行"""
+        word_end = layout["line_words"][line][1]
+        if word + 1 < word_end:
+            return layout["word_text"][word + 1:word_end]
+        
+        left, top, right, bottom = label_box
+        center = (top + bottom) / 2
+        max_gap = (right - left) * self.RIGHT_MAX_WIDTHS
+        best, best_gap = None, None
+        for other, box in enumerate(layout["line_box"]):
+            if other == line or layout["line_page"][other] != layout["line_page"][line]:
+                continue
+            gap = box[0] - right
+            if box[1] <= center <= box[3] and 0 <= gap <= max_gap and (best_gap is None or gap < best_gap):
+                best, best_gap = other, gap
+        if best is None:
+            return []
+        word_start, word_end = layout["line_words"][best]
+        return layout["word_text"][word_start:word_end] or [layout["line_text"][best]]
+    
+    def _below_tokens(self, layout, line, label_box):
+        """标签正下方最近一行中，从与标签水平重叠的词开始的词序列"""
+        left, top, right, bottom = label_box
+        height = max(bottom - top, 1)
+        best, best_gap = None, None
+        for other, box in enumerate(layout["line_box"]):
+            if other == line or layout["line_page"][other] != layout["line_page"][line]:
+                continue
+            gap = box[1] - bottom
+            overlaps = box[0] <= right and box[2] >= left
+            if overlaps and -height / 2 <= gap <= height * self.BELOW_MAX_LINES and (best_gap is None or gap < best_gap):
+                best, best_gap = other, gap
+        if best is None:
+            return []
+        
+        word_start, word_end = layout["line_words"][best]
+        for index in range(word_start, word_end):
+            if layout["word_box"][index][2] >= left:
+                return layout["word_text"][index:word_end]
+        return [layout["line_text"][best]]
+    
+    def extract(self, layout):
+        """返回 {"model", "tm", "sources"}，sources记录每个字段取自标签的哪一侧"""
+        fields = {"model": None, "tm": None, "sources": {}}
+        if not layout:
+            return fields
+        
+        for line, (word_start, word_end) in enumerate(layout["line_words"]):
+            for word in range(word_start, word_end):
+                word_text = layout["word_text"][word].upper()
+                for field, label in self.LABELS.items():
+                    if fields[field]:
+                        continue
+                    match = label.match(word_text)
+                    if not match:
+                        continue
+                    
+                    label_box = layout["word_box"][word]
+                    attempts = (
+                        ("inline", [match.group(1)] if match.group(1) else []),
+                        ("right", self._right_tokens(layout, line, word, label_box)),
+                        ("below", self._below_tokens(layout, line, label_box)),
+                    )
+                    for side, tokens in attempts:
+                        value = self._value(field, tokens)
+                        if value:
+                            fields[field] = value
+                            fields["sources"][field] = side
+                            break
+            if fields["model"] and fields["tm"]:
+                break
+        
+        return fields
+
+layout_extractor = LayoutFieldExtractor(field_extractor)
+
+# Azure请求共用的连接池：批量OCR和异步任务会同时提交/轮询多个操作
+ocr_http = HTTPClient(pool_maxsize=OCR_HTTP_POOL_MAXSIZE)
+ocr_session = ocr_http.session
+
+def get_azure_credentials():
+    return os.getenv('AZURE_VISION_KEY'), os.getenv('AZURE_VISION_ENDPOINT')
+
+def parse_retry_after(response):
+    """解析Retry-After头（秒数），无法解析时返回None"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+def azure_read_submit(image_data, timeout=30):
+    """提交Azure Read分析请求，成功时返回Operation-Location"""
+    api_key, endpoint = get_azure_credentials()
+    headers = {
+        'Ocp-Apim-Subscription-Key': api_key,
+        'Content-Type': 'application/octet-stream'
+    }
+    
+    url = f"{endpoint}/vision/v3.2/read/analyze"
+    response = ocr_session.post(url, headers=headers, data=image_data, timeout=timeout)
+    
+    if response.status_code == 202:
+        return {"success": True, "operation_url": response.headers["Operation-Location"], "submitted_at": time.time()}
+    
+    return {
+        "success": False, 
+        "error": f"Azure API错误: {response.status_code} - {response.text}"
+    }
+
+def azure_read_poll(operation_url, timeout=30):
+    """查询一次Azure Read操作状态，返回 (status, result, retry_after)
+
+    status为notStarted/running/succeeded/failed，临时错误（429/5xx）返回retry，其他错误返回error
+    """
+    api_key, _ = get_azure_credentials()
+    response = ocr_session.get(
+        operation_url,
+        headers={'Ocp-Apim-Subscription-Key': api_key},
+        timeout=timeout
+    )
+    retry_after = parse_retry_after(response)
+    
+    if response.status_code == 200:
+        result = response.json()
+        return result.get("status"), result, retry_after
+    if response.status_code == 429 or response.status_code >= 500:
+        return 'retry', None, retry_after
+    return 'error', f"Azure API错误: {response.status_code} - {response.text}", retry_after
+
+def bounding_box(polygon):
+    """把Azure的四点多边形 [x1,y1,...,x4,y4] 转成 (left, top, right, bottom)"""
+    xs = polygon[0::2]
+    ys = polygon[1::2]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def parse_azure_read_result(result):
+    """从成功的Azure Read结果中提取文本行和版面信息
+
+    版面(layout)用平行数组保存，不为每行每词建dict：
+    line_*数组按行序号对齐，line_words[i]是第i行的词在word_*数组中的 [起, 止) 区间
+    """
+    layout = {
+        "line_text": [], "line_box": [], "line_page": [], "line_words": [],
+        "word_text": [], "word_box": [], "word_confidence": []
+    }
+    
+    for page, read_result in enumerate(result.get("analyzeResult", {}).get("readResults", [])):
+        for line in read_result.get("lines", []):
+            layout["line_text"].append(line["text"])
+            layout["line_box"].append(bounding_box(line.get("boundingBox") or [0] * 8))
+            layout["line_page"].append(page)
+            
+            word_start = len(layout["word_text"])
+            for word in line.get("words", []):
+                layout["word_text"].append(word["text"])
+                layout["word_box"].append(bounding_box(word.get("boundingBox") or [0] * 8))
+                layout["word_confidence"].append(word.get("confidence"))
+            layout["line_words"].append((word_start, len(layout["word_text"])))
+    
+    if layout["line_text"]:
+        return {
+            "success": True,
+            "text": '\n'.join(layout["line_text"]),
+            "layout": layout,
+            "engine": "Azure Computer Vision Read API"
+        }
+    return {"success": False, "error": "未检测到文字"}
+
+def next_poll_delay(delay, retry_after=None):
+    """自适应轮询间隔：指数退避直到上限，服务端要求的Retry-After更长时以它为准"""
+    backoff = min(delay * OCR_POLL_BACKOFF, OCR_POLL_MAX)
+    if retry_after is not None:
+        return max(retry_after, backoff)
+    return backoff
+
+def azure_ocr_with_layout(image_data, timeout=None):
+    """Azure OCR处理，image_data为图片bytes或可读的流，timeout为包括轮询在内的总秒数上限
+
+    先短间隔轮询，之后指数退避，结果中记录轮询次数(polls)和排队时间(queue_time)
+    """
+    api_key, endpoint = get_azure_credentials()
+    
+    if not api_key or not endpoint:
+        return {
+            "success": False, 
+            "error": "请设置AZURE_VISION_KEY和AZURE_VISION_ENDPOINT环境变量"
+        }
+    
+    if timeout is None:
+        timeout = OCR_TIMEOUT
+    deadline_at = time.time() + timeout
+    polls = 0
+    
+    try:
+        submit = azure_read_submit(image_data, timeout=min(30, timeout))
+        if not submit["success"]:
+            return submit
+        
+        operation_url = submit["operation_url"]
+        delay = OCR_POLL_INITIAL
+        
+        while True:
+            remaining = deadline_at - time.time()
+            if remaining <= 0:
+                return {"success": False, "error": f"Azure Read API超时 ({timeout:.0f}s)", "polls": polls}
+            
+            time.sleep(min(delay, remaining))
+            polls += 1
+            status, result, retry_after = azure_read_poll(operation_url, timeout=max(1, min(30, deadline_at - time.time())))
+            
+            if status == "succeeded":
+                ocr_result = parse_azure_read_result(result)
+                ocr_result["polls"] = polls
+                ocr_result["queue_time"] = round(time.time() - submit["submitted_at"], 3)
+                return ocr_result
+            elif status == "failed":
+                return {"success": False, "error": "Azure Read API处理失败", "polls": polls}
+            elif status == "error":
+                return {"success": False, "error": result, "polls": polls}
+            
+            delay = next_poll_delay(delay, retry_after)
+            
+    except Exception as e:
+        return {"success": False, "error": f"请求失败: {str(e)}", "polls": polls}
+
+class AzureOCRBackend:
+    """Azure Read API后端"""
+    
+    name = 'azure'
+    display_name = 'Azure Computer Vision'
+    local = False
+    
+    def available(self):
+        api_key, endpoint = get_azure_credentials()
+        return bool(api_key and endpoint)
+    
+    def recognize(self, image_data, timeout=None):
+        return azure_ocr_with_layout(image_data, timeout=timeout)
+
+class TesseractOCRBackend:
+    """本地Tesseract后端 - 无需网络，输出与Azure相同结构的文本和版面"""
+    
+    name = 'tesseract'
+    display_name = 'Tesseract OCR'
+    local = True
+    
+    def __init__(self, lang, config):
+        self.lang = lang
+        self.config = config
+        self._available = None
+    
+    def available(self):
+        if self._available is None:
+            if pytesseract is None or Image is None:
+                self._available = False
+            else:
+                try:
+                    pytesseract.get_tesseract_version()
+                    self._available = True
+                except Exception:
+                    self._available = False
+        return self._available
+    
+    def recognize(self, image_data, timeout=None):
+        if not self.available():
+            return {"success": False, "error": "本地OCR不可用：需要安装pytesseract、Pillow和tesseract"}
+        
+        if not isinstance(image_data, (bytes, bytearray)):
+            image_data = image_data.read()
+        
+        try:
+            image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_data)))
+            data = pytesseract.image_to_data(
+                image, lang=self.lang, config=self.config,
+                output_type=pytesseract.Output.DICT, timeout=timeout or 0
+            )
+        except RuntimeError as e:
+            return {"success": False, "error": f"Tesseract超时或失败: {str(e)}"}
+        except Exception as e:
+            return {"success": False, "error": f"Tesseract处理失败: {str(e)}"}
+        
+        return self.parse_data(data)
+    
+    @staticmethod
+    def parse_data(data):
+        """把image_to_data的逐词输出按 (块, 段, 行) 分组，生成与parse_azure_read_result相同的layout"""
+        layout = {
+            "line_text": [], "line_box": [], "line_page": [], "line_words": [],
+            "word_text": [], "word_box": [], "word_confidence": []
+        }
+        current_line = None
+        
+        for index, text in enumerate(data["text"]):
+            text = (text or '').strip()
+            confidence = float(data["conf"][index])
+            if not text or confidence < 0:
+                continue
+            
+            line_key = (data["page_num"][index], data["block_num"][index], data["par_num"][index], data["line_num"][index])
+            if line_key != current_line:
+                current_line = line_key
+                layout["line_text"].append(text)
+                layout["line_page"].append(data["page_num"][index] - 1)
+                layout["line_words"].append((len(layout["word_text"]), len(layout["word_text"])))
+                layout["line_box"].append(None)
+            else:
+                layout["line_text"][-1] += ' ' + text
+            
+            left, top = data["left"][index], data["top"][index]
+            box = (left, top, left + data["width"][index], top + data["height"][index])
+            layout["word_text"].append(text)
+            layout["word_box"].append(box)
+            layout["word_confidence"].append(round(confidence / 100, 3))
+            
+            line_box = layout["line_box"][-1]
+            layout["line_box"][-1] = box if line_box is None else (
+                min(line_box[0], box[0]), min(line_box[1], box[1]),
+                max(line_box[2], box[2]), max(line_box[3], box[3])
+            )
+            layout["line_words"][-1] = (layout["line_words"][-1][0], len(layout["word_text"]))
+        
+        if layout["line_text"]:
+            return {
+                "success": True,
+                "text": '\n'.join(layout["line_text"]),
+                "layout": layout,
+                "engine": "Tesseract OCR"
+            }
+        return {"success": False, "error": "未检测到文字"}
+
+class OCRBackendStats:
+    """各OCR后端的调用次数、成功率和最近调用的延迟分布"""
+    
+    def __init__(self, window):
+        self.window = window
+        self.backends = {}
+        self.escalations = 0
+        self.lock = threading.Lock()
+    
+    def record(self, name, elapsed, success):
+        with self.lock:
+            entry = self.backends.setdefault(name, {
+                "calls": 0, "succeeded": 0, "failed": 0, "latencies": deque(maxlen=self.window)
+            })
+            entry["calls"] += 1
+            entry["succeeded" if success else "failed"] += 1
+            entry["latencies"].append(elapsed)
+    
+    def record_escalation(self):
+        with self.lock:
+            self.escalations += 1
+    
+    def stats(self):
+        with self.lock:
+            backends = {}
+            for name, backend in ocr_backends.items():
+                entry = self.backends.get(name, {"calls": 0, "succeeded": 0, "failed": 0, "latencies": ()})
+                latencies = sorted(entry["latencies"])
+                backends[name] = {
+                    "available": backend.available(),
+                    "calls": entry["calls"],
+                    "succeeded": entry["succeeded"],
+                    "failed": entry["failed"],
+                    "avg_latency": round(sum(latencies) / len(latencies), 3) if latencies else None,
+                    "p50_latency": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                    "p95_latency": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else None,
+                }
+            return {"default": OCR_BACKEND, "escalations": self.escalations, "backends": backends}
+
+ocr_backends = {
+    backend.name: backend
+    for backend in (AzureOCRBackend(), TesseractOCRBackend(OCR_TESSERACT_LANG, OCR_TESSERACT_CONFIG))
+}
+OCR_BACKEND_CHOICES = set(ocr_backends) | {'auto'}
+ocr_backend_stats = OCRBackendStats(OCR_BACKEND_STATS_WINDOW)
+
+def run_ocr_backend(name, image_data, timeout=None):
+    """用指定后端识别并记录延迟"""
+    start = time.time()
+    try:
+        ocr_result = ocr_backends[name].recognize(image_data, timeout=timeout)
+    except Exception as e:
+        ocr_result = {"success": False, "error": f"请求失败: {str(e)}"}
+    ocr_result["backend"] = name
+    ocr_backend_stats.record(name, time.time() - start, ocr_result["success"])
+    return ocr_result
+
+def run_local_ocr_first(image_data, backend, timeout):
+    """backend为本地后端或auto时先在本地识别
+
+    返回 (结果, 本地后端名)：结果为None表示需要升级到Azure。
+    auto模式下extract_model_tm提取不到MODEL/TM、且Azure可用时才升级
+    """
+    if backend != 'auto':
+        return run_ocr_backend(backend, image_data, timeout), backend
+    
+    local = next((b for b in ocr_backends.values() if b.local and b.available()), None)
+    if local is None:
+        return None, None
+    
+    local_result = run_ocr_backend(local.name, image_data, timeout)
+    if local_result["success"]:
+        fields = extract_model_tm(local_result["text"])
+        if fields["model"] or fields["tm"]:
+            return local_result, local.name
+    
+    if not ocr_backends['azure'].available():
+        return local_result, local.name
+    
+    print(f"⬆️ 本地OCR未提取到字段，升级到Azure")
+    ocr_backend_stats.record_escalation()
+    return None, local.name
+
+def ocr_with_backend(image_data, backend=None, timeout=None):
+    """按后端选择执行OCR：azure、本地后端名，或auto（先本地，必要时升级到Azure）"""
+    backend = (backend or OCR_BACKEND).lower()
+    if backend not in OCR_BACKEND_CHOICES:
+        return {"success": False, "error": f"未知的OCR后端: {backend}"}
+    if backend == 'azure':
+        return run_ocr_backend('azure', image_data, timeout)
+    
+    if timeout is None:
+        timeout = OCR_TIMEOUT
+    deadline_at = time.time() + timeout
+    
+    # 本地识别后可能还要上传给Azure，流只能读一次
+    if not isinstance(image_data, (bytes, bytearray)):
+        image_data = image_data.read()
+    
+    ocr_result, local_name = run_local_ocr_first(image_data, backend, timeout)
+    if ocr_result is not None:
+        return ocr_result
+    
+    remaining = deadline_at - time.time()
+    if remaining <= 0:
+        return {"success": False, "error": f"OCR超时 ({timeout:.0f}s)", "backend": local_name}
+    
+    ocr_result = run_ocr_backend('azure', image_data, remaining)
+    if local_name:
+        ocr_result["escalated_from"] = local_name
+    return ocr_result
+
+def requested_ocr_backend():
+    """读取请求中的backend（查询参数或表单字段），未指定时使用OCR_BACKEND"""
+    return (request.args.get('backend') or request.form.get('backend') or OCR_BACKEND).lower()
+
+def unknown_backend_response(backend):
+    return jsonify({"error": f"未知的OCR后端: {backend}，可选: {', '.join(sorted(OCR_BACKEND_CHOICES))}"}), 400
+
+# Flask 路由
+@app.route('/health', methods=['GET'])
+def health():
+    """健康检查"""
+    return jsonify({
+        "status": "ok",
+        "service": "Enhanced Manual Search System with Partial TM Matching",
+        "features": {
+            "partial_tm_matching": True,
+            "model_to_tm_mapping": True,
+            "five_segment_tm_support": True,
+            "green_mountain_direct_pdf": True
+        },
+        "target_sites": [site['name'] for site in searcher.target_sites],
+        "search_strategy": "TM priority with partial matching, enhanced Model backup",
+        "model_mappings": len(searcher.model_mapper.all_mappings),
+        "result_cache": result_cache.stats() if result_cache else None,
+        "catalog": searcher.catalog.stats() if searcher.catalog else None,
+        "ocr_jobs": ocr_jobs.stats(),
+        "ocr_cache": ocr_cache.stats() if ocr_cache else None,
+        "ocr_backends": ocr_backend_stats.stats(),
+        "site_health": searcher.site_health.stats(),
+        "tls_policy": searcher.tls_policy.stats()['metrics'],
+        "page_cache": searcher.page_cache.stats() if searcher.page_cache else None,
+        "cancellation": cancel_stats.stats(),
+        "bulk_rate_limit": bulk_rate_limiter.stats(),
+        "single_flight": {
+            "search": search_flight.stats(),
+            "site": searcher.site_flight.stats()
+        },
+    })
+
+def preprocess_image(image_data):
+    """OCR上传前缩小、转灰度并按大小预算重新编码JPEG
+
+    只有图片超过OCR_MAX_DIMENSION或OCR_TARGET_BYTES时才重新编码，返回 (图片bytes, 预处理信息)
+    """
+    info = {
+        'enabled': OCR_PREPROCESS and Image is not None,
+        'applied': False,
+        'original_bytes': len(image_data),
+        'processed_bytes': len(image_data),
+        'timings': {}
+    }
+    if not info['enabled']:
+        return image_data, info
+    
+    timings = info['timings']
+    try:
+        stage_start = time.time()
+        image = Image.open(io.BytesIO(image_data))
+        width, height = image.size
+        scale = OCR_MAX_DIMENSION / max(width, height)
+        if image.format == 'JPEG' and scale < 1:
+            # JPEG解码时直接按DCT缩放，只解码需要的分辨率
+            image.draft('L' if OCR_GRAYSCALE else 'RGB', (int(width * scale), int(height * scale)))
+        image = ImageOps.exif_transpose(image)
+        info['original_size'] = [width, height]
+        timings['decode'] = round((time.time() - stage_start) * 1000, 1)
+        
+        # 按draft之前的原始尺寸判断，draft已经缩小的JPEG仍然需要重新编码上传
+        needs_resize = scale < 1
+        if not needs_resize and len(image_data) <= OCR_TARGET_BYTES:
+            info['processed_size'] = info['original_size']
+            return image_data, info
+        
+        if needs_resize:
+            stage_start = time.time()
+            image.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION), Image.LANCZOS)
+            timings['resize'] = round((time.time() - stage_start) * 1000, 1)
+        
+        stage_start = time.time()
+        image = image.convert('L') if OCR_GRAYSCALE else image.convert('RGB')
+        timings['grayscale' if OCR_GRAYSCALE else 'convert'] = round((time.time() - stage_start) * 1000, 1)
+        
+        # 逐步降低质量直到满足大小预算
+        stage_start = time.time()
+        quality = OCR_JPEG_QUALITY
+        while True:
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=quality, optimize=True)
+            encoded = buffer.getvalue()
+            if len(encoded) <= OCR_TARGET_BYTES or quality <= OCR_MIN_JPEG_QUALITY:
+                break
+            quality = max(quality - 10, OCR_MIN_JPEG_QUALITY)
+        timings['encode'] = round((time.time() - stage_start) * 1000, 1)
+        
+    except Exception as e:
+        print(f"⚠️ Image preprocessing skipped: {e}")
+        info['error'] = str(e)
+        return image_data, info
+    
+    # 只为压缩大小而重新编码、结果反而更大时保留原图；超过尺寸上限的图片总是上传缩小后的版本
+    if not needs_resize and len(encoded) >= len(image_data):
+        info['processed_size'] = info['original_size']
+        return image_data, info
+    
+    info.update({
+        'applied': True,
+        'processed_bytes': len(encoded),
+        'processed_size': list(image.size),
+        'grayscale': OCR_GRAYSCALE,
+        'quality': quality
+    })
+    print(f"🖼️ Preprocessed image: {info['original_bytes']} → {info['processed_bytes']} bytes, "
+          f"{info['original_size']} → {info['processed_size']}")
+    return encoded, info
+
+class OCRResultCache:
+    """按图片内容哈希缓存OCR结果；phash_distance>=0且安装Pillow时还用感知哈希识别近似重复的照片"""
+    
+    def __init__(self, max_entries, ttl, phash_distance):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_hash(image_data):
+        return hashlib.sha256(image_data).hexdigest()
+
+    @staticmethod
+    def perceptual_hash(image_data):
+        """64位dHash，Pillow不可用或无法解码时返回None"""
+        if Image is None:
+            return None
+        try:
+            with Image.open(io.BytesIO(image_data)) as image:
+                pixels = list(image.convert('L').resize((9, 8)).getdata())
+        except Exception:
+            return None
+        
+        value = 0
+        for row in range(8):
+            for col in range(8):
+                value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+        return value
+
+    @staticmethod
+    def backend_matches(entry, backend):
+        """明确指定了后端（不是auto）时，只接受该后端识别的结果"""
+        return backend in (None, 'auto') or entry['result'].get('backend') == backend
+
+    def get(self, image_data, backend=None):
+        """返回 (缓存结果, 匹配方式, 哈希)，未命中时缓存结果为None
+
+        backend为具体后端名时，其他后端缓存的结果视为未命中，重新识别后覆盖该条目
+        """
+        digest = self.content_hash(image_data)
+        now = time.time()
+        
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry and entry['expires_at'] > now and self.backend_matches(entry, backend):
+                self.entries.move_to_end(digest)
+                self.hits += 1
+                return entry['result'], 'exact', (digest, entry['phash'])
+        
+        phash = self.perceptual_hash(image_data) if self.phash_distance >= 0 else None
+        
+        with self.lock:
+            if phash is not None:
+                for key, entry in self.entries.items():
+                    if (entry['phash'] is not None and entry['expires_at'] > now and
+                            bin(entry['phash'] ^ phash).count('1') <= self.phash_distance and
+                            self.backend_matches(entry, backend)):
+                        self.entries.move_to_end(key)
+                        self.near_hits += 1
+                        return entry['result'], 'perceptual', (digest, phash)
+            
+            self.misses += 1
+        return None, None, (digest, phash)
+
+    def set(self, hashes, result):
+        digest, phash = hashes
+        with self.lock:
+            self.entries[digest] = {
+                'result': result,
+                'phash': phash,
+                'expires_at': time.time() + self.ttl
+            }
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'perceptual_hash': Image is not None and self.phash_distance >= 0
+            }
+
+ocr_cache = OCRResultCache(OCR_CACHE_MAX_ENTRIES, OCR_CACHE_TTL, OCR_CACHE_PHASH_DISTANCE) if OCR_CACHE_ENABLED else None
+
+def prepare_ocr_image(image_data, backend=None):
+    """OCR前的准备：查缓存并预处理图片
+
+    返回 (缓存命中的结果或None, 待上传的图片, 预处理信息, 缓存哈希)；
+    backend为请求的OCR后端，指定了具体后端时不使用其他后端缓存的结果
+    """
+    cache_hashes = None
+    if ocr_cache is not None:
+        if not isinstance(image_data, (bytes, bytearray)):
+            image_data = image_data.read()
+        
+        cached_result, match_type, cache_hashes = ocr_cache.get(image_data, (backend or OCR_BACKEND).lower())
+        if cached_result is not None:
+            print(f"⚡ OCR cache hit ({match_type}): Model={cached_result['model']}, TM={cached_result['tm']}")
+            result_data = dict(cached_result)
+            result_data.update({
+                "cached": True,
+                "cache_match": match_type
+            })
+            return result_data, image_data, None, cache_hashes
+    
+    preprocess_info = None
+    if OCR_PREPROCESS:
+        if not isinstance(image_data, (bytes, bytearray)):
+            image_data = image_data.read()
+        image_data, preprocess_info = preprocess_image(image_data)
+    
+    return None, image_data, preprocess_info, cache_hashes
 
-# OCR 相关函数
-def extract_model_tm(text):
-    """提取MODEL和TM字段"""
-    if not text:
-        return {"model": None, "tm": None}
-    
-    result = {"model": None, "tm": None}
-    text_upper = text.upper()
-    
-    # TM号匹配模式 - 支持4段和5段TM号
-    tm_patterns = [
-        r'TM[:\s]*(\d+-\d+-\d+-\d+[A-Z]*)',  # 支持如 9-6115-585-24P
-        r'TM[:\s]*(\d+-\d+-\d+-\d+)',         # 标准4段
-        r'\b(\d+-\d+-\d+-\d+[A-Z]*)\b',       # 无TM前缀
-        r'TM[:\s]*(\d+-\d+-\d+-\d+-\d+)',     # 5段数字格式
-    ]
+def build_ocr_result(ocr_result, start_time, ocr_time=None, preprocess_info=None, cache_hashes=None):
+    """从OCR文本提取MODEL/TM字段，组装响应并写入OCR缓存"""
+    if not ocr_result["success"]:
+        return {
+            "success": False,
+            "error": ocr_result["error"],
+            "model": None,
+            "tm": None,
+            "found": False
+        }
     
-    for pattern in tm_patterns:
-        matches = re.findall(pattern, text_upper)
-        for match in matches:
-            clean_match = match.strip()
-            if len(clean_match) >= 8 and re.match(r'\d+-\d+-\d+-', clean_match):
-                result['tm'] = clean_match
-                break
-        if result['tm']:
-            break
+    fields = extract_model_tm(ocr_result["text"], with_candidates=True)
+    field_sources = {key: "text" for key in ("model", "tm") if fields[key]}
+    if OCR_LAYOUT_EXTRACTION and ocr_result.get("layout"):
+        layout_fields = layout_extractor.extract(ocr_result["layout"])
+        for key, side in layout_fields["sources"].items():
+            fields[key] = layout_fields[key]
+            field_sources[key] = f"layout:{side}"
+    total_time = time.time() - start_time
     
-    # 模型号匹配模式
-    model_patterns = [
-        r'\b(MEP[-\s]*[0-9]+[A-Z]*)\b',
-        r'MODEL[:\s]*([A-Z0-9\-/]+)',
-        r'\b(M[0-9]+[A-Z]*/?[A-Z]*)\b',
-        r'\b([A-Z]{2,4}[-]?[0-9]{2,5}[A-Z]*/?[A-Z]*)\b'
-    ]
+    result_data = {
+        "success": True,
+        "model": fields["model"],
+        "tm": fields["tm"],
+        "found": bool(fields["model"] or fields["tm"]),
+        "ocr_text": ocr_result["text"],
+        "candidates": fields["candidates"],
+        "field_sources": field_sources,
+        "engine": ocr_backends[ocr_result.get("backend", "azure")].display_name,
+        "backend": ocr_result.get("backend", "azure"),
+        "escalated_from": ocr_result.get("escalated_from"),
+        "processing_time": round(total_time, 2),
+        "ocr_time": round(ocr_time, 2) if ocr_time is not None else None,
+        "preprocess": preprocess_info,
+        "ocr_polls": ocr_result.get("polls"),
+        "ocr_queue_time": ocr_result.get("queue_time"),
+        "cached": False
+    }
     
-    for pattern in model_patterns:
-        matches = re.findall(pattern, text_upper)
-        for match in matches:
-            clean_match = re.sub(r'\s+', '', match.strip())
-            
-            exclude_patterns = [
-                r'^TM\b', r'^TO\b', r'^\d+-\d+-\d+-',
-                r'^120\b|^208\b|^240\b|^480\b'
-            ]
-            
-            exclude_words = [
-                'US', 'NATO', 'DEPARTMENT', 'GENERATOR', 'ENGINE', 'DIESEL',
-                'POWER', 'ARMY', 'SYSTEM'
-            ]
-            
-            should_exclude = (
-                any(re.match(exclude_pattern, clean_match) for exclude_pattern in exclude_patterns) or
-                any(word in clean_match for word in exclude_words) or
-                len(clean_match) < 2 or clean_match.isdigit()
-            )
-            
-            if not should_exclude:
-                result['model'] = clean_match
-                break
-        if result['model']:
-            break
+    if cache_hashes is not None:
+        ocr_cache.set(cache_hashes, {
+            key: result_data[key] for key in ("success", "model", "tm", "found", "ocr_text", "candidates", "field_sources", "engine", "backend")
+        })
     
-    return result
+    print(f"✅ 成功: Model={fields['model']}, TM={fields['tm']}, 耗时={total_time:.2f}s")
+    return result_data
 
-def azure_ocr_with_layout(image_path):
-    """Azure OCR处理"""
-    api_key = os.getenv('AZURE_VISION_KEY')
-    endpoint = os.getenv('AZURE_VISION_ENDPOINT')
+def run_ocr_extraction(image_data, timeout=None, backend=None):
+    """对图片执行OCR并提取MODEL/TM字段，/extract和异步任务共用
+
+    image_data为bytes；未启用OCR缓存时也可以是流，直接流式上传给Azure。
+    相同（或近似）的图片直接返回缓存的结果，不再调用OCR后端
+    """
+    start_time = time.time()
     
-    if not api_key or not endpoint:
-        return {
-            "success": False, 
-            "error": "请设置AZURE_VISION_KEY和AZURE_VISION_ENDPOINT环境变量"
-        }
+    cached_result, image_data, preprocess_info, cache_hashes = prepare_ocr_image(image_data, backend)
+    if cached_result is not None:
+        cached_result["processing_time"] = round(time.time() - start_time, 2)
+        return cached_result
+    
+    ocr_start = time.time()
+    ocr_result = ocr_with_backend(image_data, backend=backend, timeout=timeout)
+    return build_ocr_result(ocr_result, start_time, time.time() - ocr_start, preprocess_info, cache_hashes)
+
+def read_upload(file):
+    """读取上传的图片；OCR_STREAM_UPLOAD=1且未启用OCR缓存时直接返回流"""
+    if OCR_STREAM_UPLOAD and ocr_cache is None:
+        return file.stream
+    return file.read()
+
+class JobQueueFullError(Exception):
+    """排队中的OCR任务已达到OCR_JOB_MAX_QUEUED"""
+
+def callback_url_error(callback_url):
+    """检查callback_url，允许时返回None，否则返回错误信息
+
+    设置了OCR_CALLBACK_ALLOWED_HOSTS时只允许其中的主机；
+    否则主机解析出的每个地址都必须是公网地址（拒绝私有、回环、链路本地等地址）
+    """
+    parsed = urlparse(callback_url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return "callback_url must be an http(s) URL"
+    
+    host = parsed.hostname.lower()
+    if OCR_CALLBACK_ALLOWED_HOSTS:
+        for allowed in OCR_CALLBACK_ALLOWED_HOSTS:
+            if host == allowed or (allowed.startswith('.') and host.endswith(allowed)):
+                return None
+        return f"callback_url host is not allowed: {host}"
     
     try:
-        headers = {
-            'Ocp-Apim-Subscription-Key': api_key,
-            'Content-Type': 'application/octet-stream'
-        }
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, ValueError):
+        return f"callback_url host cannot be resolved: {host}"
+    
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if getattr(ip, 'ipv4_mapped', None):
+            ip = ip.ipv4_mapped
+        if not ip.is_global:
+            return f"callback_url must not point to a private or local address: {host}"
+    return None
+
+class OCRJobManager:
+    """异步OCR任务 - 有界线程池执行Azure处理，每个任务有硬性截止时间"""
+    
+    def __init__(self, max_workers, deadline, retention, max_queued):
+        self.deadline = deadline
+        self.retention = retention
+        self.max_queued = max_queued
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ocr-job')
+
+    def submit(self, image_data, filename=None, callback_url=None, backend=None):
+        """创建任务并立即返回任务信息，排队中的任务已满时抛出 JobQueueFullError"""
+        self._purge_finished()
         
-        with open(image_path, 'rb') as image_file:
-            image_data = image_file.read()
+        now = time.time()
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'status': 'queued',
+            'filename': filename,
+            'callback_url': callback_url,
+            'backend': backend or OCR_BACKEND,
+            'created_at': now,
+            'deadline_at': now + self.deadline,
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
         
-        url = f"{endpoint}/vision/v3.2/read/analyze"
-        response = requests.post(url, headers=headers, data=image_data, timeout=30)
+        with self.lock:
+            queued = sum(1 for existing in self.jobs.values() if existing['status'] == 'queued')
+            if queued >= self.max_queued:
+                raise JobQueueFullError(f"{queued} OCR jobs already queued, try again later")
+            self.jobs[job['job_id']] = job
         
-        if response.status_code == 202:
-            operation_url = response.headers["Operation-Location"]
+        self.executor.submit(self._run, job['job_id'], image_data)
+        print(f"📥 OCR job queued: {job['job_id']} ({filename})")
+        return self.get(job['job_id'])
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {key: value for key, value in job.items() if key != 'callback_url'}
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _run(self, job_id, image_data):
+        try:
+            with self.lock:
+                deadline_at = self.jobs[job_id]['deadline_at']
+                backend = self.jobs[job_id]['backend']
             
-            while True:
-                time.sleep(1)
-                result_response = requests.get(
-                    operation_url, 
-                    headers={'Ocp-Apim-Subscription-Key': api_key},
-                    timeout=30
-                )
-                
-                if result_response.status_code == 200:
-                    result = result_response.json()
-                    if result["status"] == "succeeded":
-                        text_lines = []
-                        for read_result in result.get("analyzeResult", {}).get("readResults", []):
-                            for line in read_result.get("lines", []):
-                                text_lines.append(line["text"])
-                        
-                        if text_lines:
-                            return {
-                                "success": True,
-                                "text": '\n'.join(text_lines),
-                                "engine": "Azure Computer Vision Read API"
-                            }
-                        else:
-                            return {"success": False, "error": "未检测到文字"}
-                    elif result["status"] == "failed":
-                        return {"success": False, "error": "Azure Read API处理失败"}
-        else:
-            return {
-                "success": False, 
-                "error": f"Azure API错误: {response.status_code} - {response.text}"
-            }
+            remaining = deadline_at - time.time()
+            if remaining <= 0:
+                self._update(job_id, status='expired', error='Job deadline exceeded while queued', finished_at=time.time())
+                return
             
-    except Exception as e:
-        return {"success": False, "error": f"请求失败: {str(e)}"}
+            self._update(job_id, status='running', started_at=time.time())
+            result = run_ocr_extraction(image_data, timeout=remaining, backend=backend)
+            
+            if result['success']:
+                self._update(job_id, status='succeeded', result=result, finished_at=time.time())
+            else:
+                status = 'expired' if time.time() >= deadline_at else 'failed'
+                self._update(job_id, status=status, error=result['error'], finished_at=time.time())
+                
+        except Exception as e:
+            print(f"❌ OCR job {job_id} error: {e}")
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+        finally:
+            self._send_callback(job_id)
 
-# Flask 路由
-@app.route('/health', methods=['GET'])
-def health():
-    """健康检查"""
+    def _send_callback(self, job_id):
+        """任务结束后POST结果到callback_url"""
+        with self.lock:
+            callback_url = self.jobs[job_id].get('callback_url')
+        if not callback_url:
+            return
+        
+        # 提交后DNS可能已变化，发送前再检查一次；不跟随重定向，避免被转到内网地址
+        error = callback_url_error(callback_url)
+        if error:
+            print(f"⚠️ OCR job callback skipped for {job_id}: {error}")
+            return
+        
+        try:
+            requests.post(callback_url, json=self.get(job_id), timeout=10, allow_redirects=False)
+            print(f"📤 OCR job callback sent: {job_id} → {callback_url}")
+        except Exception as e:
+            print(f"⚠️ OCR job callback failed for {job_id}: {e}")
+
+    def _purge_finished(self):
+        """清理超过保留时间的已完成任务"""
+        cutoff = time.time() - self.retention
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job['finished_at'] is not None and job['finished_at'] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+
+    def stats(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return counts
+
+ocr_jobs = OCRJobManager(OCR_JOB_WORKERS, OCR_JOB_DEADLINE, OCR_JOB_RETENTION, OCR_JOB_MAX_QUEUED)
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    """上传超过MAX_UPLOAD_BYTES（批量OCR为OCR_BATCH_MAX_BYTES）"""
+    if request.endpoint == 'extract_batch':
+        error = f"批量上传过大，最大 {OCR_BATCH_MAX_BYTES // (1024 * 1024)} MB"
+    else:
+        error = f"上传文件过大，最大 {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
     return jsonify({
-        "status": "ok",
-        "service": "Enhanced Manual Search System with Partial TM Matching",
-        "features": {
-            "partial_tm_matching": True,
-            "model_to_tm_mapping": True,
-            "five_segment_tm_support": True,
-            "green_mountain_direct_pdf": True
-        },
-        "target_sites": [site['name'] for site in searcher.target_sites],
-        "search_strategy": "TM priority with partial matching, enhanced Model backup",
-        "model_mappings": len(searcher.model_mapper.all_mappings),
-    })
+        "error": error,
+        "model": None,
+        "tm": None,
+        "found": False
+    }), 413
 
 @app.route('/extract', methods=['POST'])
 def extract():
     """提取铭牌信息"""
     try:
-        print(f"[{time.strftime('%H:%M:%S')}] 开始Azure OCR处理")
-        start_time = time.time()
+        backend = requested_ocr_backend()
+        if backend not in OCR_BACKEND_CHOICES:
+            return unknown_backend_response(backend)
+        
+        print(f"[{time.strftime('%H:%M:%S')}] 开始OCR处理 (backend={backend})")
         
         if 'file' not in request.files:
             return jsonify({"error": "请上传图片文件"}), 400
@@ -1060,49 +4456,337 @@ def extract():
         if file.filename == '':
             return jsonify({"error": "请选择图片文件"}), 400
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            file.save(temp_file.name)
-            temp_path = temp_file.name
-        
         print(f"处理文件: {file.filename}")
         
-        ocr_result = azure_ocr_with_layout(temp_path)
-        
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
+        result = run_ocr_extraction(read_upload(file), backend=backend)
         
-        if ocr_result["success"]:
-            fields = extract_model_tm(ocr_result["text"])
-            total_time = time.time() - start_time
-            
-            result_data = {
-                "model": fields["model"],
-                "tm": fields["tm"],
-                "found": bool(fields["model"] or fields["tm"]),
-                "ocr_text": ocr_result["text"],
-                "engine": "Azure Computer Vision",
-                "processing_time": round(total_time, 2)
-            }
-            
-            print(f"✅ 成功: Model={fields['model']}, TM={fields['tm']}, 耗时={total_time:.2f}s")
-            return jsonify(result_data)
+        if result.pop("success"):
+            return jsonify(result)
         else:
-            return jsonify({
-                "error": ocr_result["error"],
-                "model": None,
-                "tm": None,
-                "found": False
-            }), 500
+            return jsonify(result), 500
             
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        print(f"❌ 错误: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/extract-jobs', methods=['POST'])
+def create_extract_job():
+    """异步OCR - 立即返回任务ID，通过GET轮询或callback_url获取结果"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "请上传图片文件"}), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"error": "请选择图片文件"}), 400
+        
+        callback_url = request.form.get('callback_url') or None
+        if callback_url:
+            error = callback_url_error(callback_url)
+            if error:
+                return jsonify({"error": error}), 400
+        
+        backend = requested_ocr_backend()
+        if backend not in OCR_BACKEND_CHOICES:
+            return unknown_backend_response(backend)
+        
+        # 任务在请求结束后才执行，必须先把图片读入内存
+        job = ocr_jobs.submit(file.read(), filename=file.filename, callback_url=callback_url, backend=backend)
+        job['status_url'] = f"/extract-jobs/{job['job_id']}"
+        
+        return jsonify(job), 202
+        
+    except JobQueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {'Retry-After': '5'}
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        print(f"❌ 错误: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/extract-jobs/<job_id>', methods=['GET'])
+def get_extract_job(job_id):
+    """查询异步OCR任务状态"""
+    job = ocr_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+def sse_event(msg_type, data=None, message=None, **fields):
+    """格式化一条Server-Sent Event"""
+    msg = {'type': msg_type}
+    msg.update(fields)
+    if message:
+        msg['message'] = message
+    if data is not None:
+        msg['data'] = data
+    return f"data: {json.dumps(msg)}\n\n"
+
+batch_executor = ThreadPoolExecutor(max_workers=OCR_BATCH_WORKERS, thread_name_prefix='ocr-batch')
+
+def _prepare_and_submit_batch_image(index, image_data, backend):
+    """批量OCR：查缓存、预处理，本地后端直接识别，否则提交Azure操作"""
+    item = {'index': index, 'start_time': time.time()}
+    try:
+        cached_result, image_data, preprocess_info, cache_hashes = prepare_ocr_image(image_data, backend)
+        if cached_result is not None:
+            cached_result["processing_time"] = round(time.time() - item['start_time'], 2)
+            item['result'] = cached_result
+            return item
+        
+        escalated_from = None
+        if backend != 'azure':
+            ocr_start = time.time()
+            ocr_result, escalated_from = run_local_ocr_first(image_data, backend, OCR_BATCH_TIMEOUT)
+            if ocr_result is not None:
+                item['result'] = build_ocr_result(
+                    ocr_result, item['start_time'], time.time() - ocr_start, preprocess_info, cache_hashes
+                )
+                return item
+        
+        submit = azure_read_submit(image_data, timeout=30)
+        if not submit["success"]:
+            item['error'] = submit["error"]
+            return item
+        
+        item.update({
+            'operation_url': submit["operation_url"],
+            'submitted_at': submit["submitted_at"],
+            'preprocess_info': preprocess_info,
+            'cache_hashes': cache_hashes,
+            'escalated_from': escalated_from,
+            'delay': OCR_POLL_INITIAL,
+            'next_poll_at': time.time() + OCR_POLL_INITIAL,
+            'polls': 0
+        })
+    except Exception as e:
+        item['error'] = f"请求失败: {str(e)}"
+    return item
+
+@app.route('/extract-batch', methods=['POST'])
+def extract_batch():
+    """批量OCR - 同时提交所有图片，统一轮询，每张图片完成后立即以SSE返回
+
+    表单字段 search=1 时，OCR完成后对所有不同的TM号执行手册搜索；
+    客户端断开时取消还没开始的图片和搜索，不再轮询Azure
+    """
+    try:
+        files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+        if not files:
+            return jsonify({"error": "请上传图片文件"}), 400
+        if len(files) > OCR_BATCH_MAX_FILES:
+            return jsonify({"error": f"一次最多上传 {OCR_BATCH_MAX_FILES} 张图片"}), 400
+        
+        backend = requested_ocr_backend()
+        if backend not in OCR_BACKEND_CHOICES:
+            return unknown_backend_response(backend)
+        usable = [name for name in (ocr_backends if backend == 'auto' else [backend]) if ocr_backends[name].available()]
+        if not usable:
+            if backend == 'azure':
+                return jsonify({"error": "请设置AZURE_VISION_KEY和AZURE_VISION_ENDPOINT环境变量"}), 500
+            return jsonify({"error": f"OCR后端不可用: {backend}"}), 500
+        
+        with_search = request.form.get('search', '').lower() in ('1', 'true', 'yes')
+        # 响应流开始后无法再读取请求，先把所有图片读入内存
+        images = [(file.filename, file.read()) for file in files]
+        filenames = [filename for filename, _ in images]
+        oversized = [filename for filename, image_data in images if len(image_data) > MAX_UPLOAD_BYTES]
+        if oversized:
+            return jsonify({
+                "error": f"单张图片最大 {MAX_UPLOAD_BYTES // (1024 * 1024)} MB",
+                "files": oversized
+            }), 413
+        print(f"[{time.strftime('%H:%M:%S')}] 批量OCR: {len(images)} 张图片")
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         print(f"❌ 错误: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    
+    def generate():
+        start_time = time.time()
+        deadline_at = start_time + OCR_BATCH_TIMEOUT
+        succeeded = 0
+        failed = 0
+        found_tms = []
+        futures = []
+        search_futures = {}
+        cancel_token = CancellationToken()
+        
+        yield sse_event('start', data={'total': len(filenames), 'search': with_search, 'backend': backend})
+        
+        def finish(index, result):
+            nonlocal succeeded, failed
+            result['filename'] = filenames[index]
+            if result.pop('success', False):
+                succeeded += 1
+                if result.get('tm') and result['tm'] not in found_tms:
+                    found_tms.append(result['tm'])
+                return sse_event('result', data=result, index=index)
+            failed += 1
+            return sse_event('error', data=result, index=index, message=result.get('error'))
+        
+        def failure(error):
+            return {"success": False, "error": error, "model": None, "tm": None, "found": False}
+        
+        try:
+            # 1. 并发提交所有Azure Read操作，缓存命中的图片立即返回
+            futures = [batch_executor.submit(_prepare_and_submit_batch_image, index, image_data, backend)
+                       for index, (_, image_data) in enumerate(images)]
+            # 图片数据只由排队中的任务持有，处理完即释放
+            images.clear()
+            pending = {}
+            for future in iter_completed_with_heartbeat(futures):
+                if future is None:
+                    yield ': keepalive\n\n'
+                    continue
+                item = future.result()
+                if 'result' in item:
+                    yield finish(item['index'], item['result'])
+                elif 'error' in item:
+                    yield finish(item['index'], failure(item['error']))
+                else:
+                    pending[item['index']] = item
+            
+            if pending:
+                yield sse_event('status', message=f'Submitted {len(pending)} image(s) to Azure, polling...')
+            
+            # 2. 统一轮询所有操作，每次查询最早到期的一个；长时间没有结果时发送心跳，及时发现客户端断开
+            last_sent = time.time()
+            while pending:
+                if time.time() - last_sent >= STREAM_HEARTBEAT_INTERVAL:
+                    yield ': keepalive\n\n'
+                    last_sent = time.time()
+                
+                index, item = min(pending.items(), key=lambda entry: entry[1]['next_poll_at'])
+                now = time.time()
+                if now >= deadline_at:
+                    for index in list(pending):
+                        yield finish(index, failure(f"Azure Read API超时 ({OCR_BATCH_TIMEOUT:.0f}s)"))
+                    pending.clear()
+                    break
+                
+                if item['next_poll_at'] > now:
+                    time.sleep(min(item['next_poll_at'], deadline_at) - now)
+                    continue
+                
+                item['polls'] += 1
+                try:
+                    status, result, retry_after = azure_read_poll(
+                        item['operation_url'], timeout=max(1, min(30, deadline_at - time.time()))
+                    )
+                except Exception as e:
+                    status, result, retry_after = 'error', f"请求失败: {str(e)}", None
+                
+                if status == 'succeeded':
+                    ocr_result = parse_azure_read_result(result)
+                    ocr_result['polls'] = item['polls']
+                    ocr_result['queue_time'] = round(time.time() - item['submitted_at'], 3)
+                    ocr_result['backend'] = 'azure'
+                    ocr_result['escalated_from'] = item['escalated_from']
+                    ocr_backend_stats.record('azure', time.time() - item['submitted_at'], ocr_result['success'])
+                    del pending[index]
+                    yield finish(index, build_ocr_result(
+                        ocr_result, item['start_time'], time.time() - item['submitted_at'],
+                        item['preprocess_info'], item['cache_hashes']
+                    ))
+                elif status in ('failed', 'error'):
+                    ocr_backend_stats.record('azure', time.time() - item['submitted_at'], False)
+                    del pending[index]
+                    yield finish(index, failure(result if status == 'error' else "Azure Read API处理失败"))
+                else:
+                    item['delay'] = next_poll_delay(item['delay'], retry_after)
+                    item['next_poll_at'] = time.time() + item['delay']
+            
+            # 3. 可选：对每个不同的TM号搜索手册
+            if with_search and found_tms:
+                yield sse_event('status', message=f'Searching manuals for {len(found_tms)} unique TM number(s)')
+                search_futures = {batch_executor.submit(search_manual_pdfs_realistic, tm, cancel_token=cancel_token): tm
+                                  for tm in found_tms}
+                for future in iter_completed_with_heartbeat(search_futures):
+                    if future is None:
+                        yield ': keepalive\n\n'
+                        continue
+                    tm = search_futures[future]
+                    try:
+                        yield sse_event('search', data={'tm': tm, 'results': future.result()})
+                    except Exception as e:
+                        yield sse_event('search', data={'tm': tm, 'results': []}, message=f'Search error: {str(e)}')
+            
+            yield sse_event('complete', data={
+                'total': len(filenames),
+                'succeeded': succeeded,
+                'failed': failed,
+                'unique_tms': found_tms,
+                'processing_time': round(time.time() - start_time, 2)
+            })
+            
+        except GeneratorExit:
+            print(f"🔌 Batch OCR client disconnected after {succeeded + failed}/{len(filenames)} image(s)")
+            cancel_stats.record('batches_disconnected')
+            raise
+        except Exception as e:
+            print(f"❌ Batch OCR error: {e}")
+            yield sse_event('error', message=f'Batch OCR error: {str(e)}')
+        finally:
+            # 客户端断开或出错时，取消排队中的图片和搜索；已提交的Azure操作不再轮询
+            cancelled = sum(future.cancel() for future in futures + list(search_futures))
+            if cancelled:
+                print(f"🛑 Cancelled {cancelled} queued batch task(s)")
+            if search_futures and not all(future.done() for future in search_futures):
+                cancel_token.cancel()
+    
+    return app.response_class(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    )
 
 @app.route('/search', methods=['POST'])
 def search_manuals():
     """基于真实URL模式的精准搜索 - TM优先策略，增强模型映射"""
+    return handle_search_request('sync')
+
+@app.route('/search-async', methods=['POST'])
+def search_manuals_async():
+    """与 /search 相同，实时搜索由 asyncio 搜索引擎执行"""
+    if async_searcher is None:
+        return jsonify({"error": "Async search engine unavailable: pip install aiohttp"}), 503
+    return handle_search_request('async')
+
+def format_search_result(result, tm_number=None, model_number=None):
+    """转换结果格式以匹配前端期望"""
+    formatted_result = {
+        'title': result.get('title', f"Manual for {tm_number or model_number}"),
+        'url': result['url'],
+        'description': result.get('description', f"Found via {result.get('site', 'search')} using {result.get('method', 'direct_pdf')} method"),
+        'confidence': result.get('confidence', 80),
+        'source': result.get('site', 'Enhanced Search'),
+        'verified': result.get('verified', True),
+        'method': result.get('method', 'enhanced_search'),
+        'cached': result.get('cached', False)
+    }
+    
+    # 添加部分匹配信息
+    if result.get('partial_match'):
+        formatted_result['partial_match'] = True
+        formatted_result['original_query'] = result.get('original_query')
+        formatted_result['matched_tm'] = result.get('matched_tm')
+    
+    # 添加映射信息到描述中
+    if result.get('mapped_tm'):
+        formatted_result['description'] += f" (Model {result.get('mapped_from')} → TM {result.get('mapped_tm')})"
+    
+    return formatted_result
+
+def handle_search_request(engine):
     try:
         data = request.get_json()
         if not data:
@@ -1127,32 +4811,10 @@ def search_manuals():
         print(f"📋 Search strategy: {search_strategy}")
         
         # 使用增强的搜索系统
-        results = search_manual_pdfs_realistic(tm_number, model_number)
+        skipped_sites = []
+        results = search_manual_pdfs_realistic(tm_number, model_number, skipped_sites, engine)
         
-        # 转换结果格式以匹配前端期望
-        formatted_results = []
-        for result in results:
-            formatted_result = {
-                'title': result.get('title', f"Manual for {tm_number or model_number}"),
-                'url': result['url'],
-                'description': result.get('description', f"Found via {result.get('site', 'search')} using {result.get('method', 'direct_pdf')} method"),
-                'confidence': result.get('confidence', 80),
-                'source': result.get('site', 'Enhanced Search'),
-                'verified': result.get('verified', True),
-                'method': result.get('method', 'enhanced_search')
-            }
-            
-            # 添加部分匹配信息
-            if result.get('partial_match'):
-                formatted_result['partial_match'] = True
-                formatted_result['original_query'] = result.get('original_query')
-                formatted_result['matched_tm'] = result.get('matched_tm')
-            
-            # 添加映射信息到描述中
-            if result.get('mapped_tm'):
-                formatted_result['description'] += f" (Model {result.get('mapped_from')} → TM {result.get('mapped_tm')})"
-            
-            formatted_results.append(formatted_result)
+        formatted_results = [format_search_result(result, tm_number, model_number) for result in results]
         
         return jsonify({
             "success": True,
@@ -1163,7 +4825,10 @@ def search_manuals():
             },
             "results": formatted_results,
             "total": len(formatted_results),
-            "search_method": "enhanced_partial_matching_search"
+            "cached": any(result.get('cached', False) for result in results),
+            "skipped_sites": skipped_sites,
+            "search_method": "enhanced_partial_matching_search",
+            "engine": engine
         })
         
     except Exception as e:
@@ -1181,6 +4846,214 @@ def search_manuals():
             "total": 0
         }), 500
 
+BULK_TM_FIELDS = ('tm', 'tm_number', 'tm number', 'tm no', 'technical manual')
+BULK_MODEL_FIELDS = ('model', 'model_number', 'model number', 'model no')
+
+# 所有批量任务共用：限制同时进行的解析数，以及每个外部主机的请求速率
+bulk_executor = ThreadPoolExecutor(max_workers=BULK_MAX_CONCURRENCY, thread_name_prefix='bulk-resolve')
+bulk_rate_limiter = HostRateLimiter(BULK_HOST_RATE, BULK_HOST_BURST)
+
+def bulk_input_format(filename, content_type, text):
+    """判断批量输入是CSV还是JSONL：先看 ?format=，再看文件扩展名和Content-Type，最后看内容"""
+    requested = (request.args.get('format') or request.form.get('format') or '').lower()
+    if requested in ('csv', 'jsonl'):
+        return requested
+    filename = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if filename.endswith(('.jsonl', '.ndjson')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'jsonl'
+    if filename.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    first_line = next((line for line in text.splitlines() if line.strip()), '')
+    return 'jsonl' if first_line.lstrip().startswith('{') else 'csv'
+
+def _bulk_field(row, names):
+    for name in names:
+        value = row.get(name)
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    return None
+
+def parse_bulk_csv(text):
+    """解析CSV，产出 (行号, tm, model, 错误)
+
+    第一行含 tm/model 列名时按列名取值，否则按 tm,model 两列处理
+    """
+    reader = csv.reader(io.StringIO(text))
+    header = None
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        names = [cell.strip().lower() for cell in row]
+        if header is None:
+            header = names
+            if set(names) & set(BULK_TM_FIELDS + BULK_MODEL_FIELDS):
+                continue
+            header = ['tm', 'model']
+        values = dict(zip(header, row))
+        yield reader.line_num, _bulk_field(values, BULK_TM_FIELDS), _bulk_field(values, BULK_MODEL_FIELDS), None
+
+def parse_bulk_jsonl(text):
+    """解析JSONL（每行一个 {"tm": ..., "model": ...} 对象），产出 (行号, tm, model, 错误)"""
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, None, "expected a JSON object"
+            continue
+        row = {str(key).strip().lower(): value for key, value in row.items()}
+        yield line_number, _bulk_field(row, BULK_TM_FIELDS), _bulk_field(row, BULK_MODEL_FIELDS), None
+
+def normalize_bulk_rows(rows):
+    """按 make_search_cache_key 标准化并去重，返回 (待解析项列表, 无效行列表)
+
+    每项记录标准化后的TM号/模型号和它出现的所有行号
+    """
+    items = OrderedDict()
+    invalid = []
+    for line, tm_number, model_number, error in rows:
+        if not error and not tm_number and not model_number:
+            error = "missing TM and model number"
+        if error:
+            invalid.append({'line': line, 'error': error})
+            continue
+        
+        key = make_search_cache_key(tm_number, model_number)
+        item = items.get(key)
+        if item is None:
+            item = items[key] = {
+                'key': key,
+                'tm': searcher.format_tm_number(tm_number).get('tm_dashed') if tm_number else None,
+                'model': searcher.model_mapper.normalize_model_number(model_number) if model_number else None,
+                'lines': []
+            }
+        item['lines'].append(line)
+    return list(items.values()), invalid
+
+def resolve_bulk_item(item, cancel_token):
+    """批量解析一项：与 /search 相同的搜索（共用缓存和合并），外部请求按主机限速"""
+    skipped_sites = []
+    results = search_manual_pdfs_realistic(item['tm'], item['model'], skipped_sites, cancel_token=cancel_token)
+    return results, skipped_sites
+
+@app.route('/search-bulk', methods=['POST'])
+def search_bulk():
+    """批量TM/模型号解析 - 上传CSV或JSONL，标准化去重后并发解析，以NDJSON流式返回
+
+    请求体可以是上传的文件（字段 file）或原始CSV/JSONL文本。每解析完一项返回一行
+    type=result，带 completed/total 进度；长时间没有完成项时返回 type=progress
+    """
+    try:
+        file = request.files.get('file')
+        if file is not None:
+            raw, filename, content_type = file.read(), file.filename, file.mimetype
+        else:
+            raw, filename, content_type = request.get_data(), None, request.mimetype
+        text = raw.decode('utf-8-sig', errors='replace')
+        if not text.strip():
+            return jsonify({"error": "Please upload a CSV or JSONL file of TM/model numbers"}), 400
+        
+        input_format = bulk_input_format(filename, content_type, text)
+        rows = list(parse_bulk_jsonl(text) if input_format == 'jsonl' else parse_bulk_csv(text))
+        if len(rows) > BULK_MAX_ITEMS:
+            return jsonify({"error": f"At most {BULK_MAX_ITEMS} rows per request, got {len(rows)}"}), 400
+        items, invalid = normalize_bulk_rows(rows)
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        print(f"❌ Bulk search error: {e}")
+        return jsonify({"error": str(e)}), 500
+    
+    print(f"📦 Bulk search: {len(rows)} {input_format} rows → {len(items)} unique, {len(invalid)} invalid")
+    
+    def line(msg_type, **fields):
+        return json.dumps({'type': msg_type, **fields}) + '\n'
+    
+    def generate():
+        start_time = time.time()
+        token = CancellationToken(rate_limiter=bulk_rate_limiter)
+        futures = {}
+        completed = 0
+        found = 0
+        failed = 0
+        
+        try:
+            yield line('start', format=input_format, rows=len(rows), total=len(items),
+                       duplicates=len(rows) - len(invalid) - len(items), invalid=len(invalid))
+            for entry in invalid:
+                yield line('invalid', **entry)
+            
+            futures = {bulk_executor.submit(resolve_bulk_item, item, token): item for item in items}
+            for future in iter_completed_with_heartbeat(futures):
+                if future is None:
+                    yield line('progress', completed=completed, total=len(items))
+                    continue
+                
+                item = futures[future]
+                completed += 1
+                fields = {'tm': item['tm'], 'model': item['model'], 'lines': item['lines'],
+                          'completed': completed, 'total': len(items)}
+                try:
+                    results, skipped_sites = future.result()
+                except Exception as e:
+                    failed += 1
+                    yield line('result', **fields, results=[], found=False, error=str(e))
+                    continue
+                
+                is_found = any(result.get('method') != 'manual_fallback' for result in results)
+                found += is_found
+                yield line('result', **fields, found=is_found,
+                           cached=any(result.get('cached', False) for result in results),
+                           skipped_sites=skipped_sites,
+                           results=[format_search_result(result, item['tm'], item['model']) for result in results])
+            
+            yield line('complete', total=len(items), completed=completed, found=found, failed=failed,
+                       invalid=len(invalid), processing_time=round(time.time() - start_time, 2))
+        except GeneratorExit:
+            cancel_stats.record('streams_disconnected')
+            print(f"🔌 Bulk search client disconnected after {completed}/{len(items)} items")
+            raise
+        except Exception as e:
+            print(f"❌ Bulk search error: {e}")
+            yield line('error', message=f'Bulk search error: {str(e)}')
+        finally:
+            # 客户端断开或出错时取消排队中的项，正在解析的在下一次检查时停止
+            if any(not future.done() for future in futures):
+                for future in futures:
+                    future.cancel()
+                token.cancel()
+    
+    return app.response_class(
+        generate(),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    )
+
+# 流式搜索中映射TM/模型搜索的后台线程池（与 site_executor 分开，避免嵌套提交占满线程池）
+stream_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix='stream-search')
+
+def iter_completed_with_heartbeat(futures, interval=None):
+    """按完成顺序产出future；interval 秒内没有任何完成时产出 None，提示调用方发送心跳"""
+    if interval is None:
+        interval = STREAM_HEARTBEAT_INTERVAL
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=interval, return_when=FIRST_COMPLETED)
+        if not done:
+            yield None
+        for future in done:
+            yield future
+
 @app.route('/search-stream-fixed', methods=['POST'])
 def search_stream_fixed():
     """修复的实时流式搜索 - 支持部分匹配"""
@@ -1211,67 +5084,135 @@ def search_stream_fixed():
                 print(f"📤 Sending: {json_str}")
                 return f"data: {json_str}\n\n"
             
-            # 定义搜索方法
-            search_methods = [
-                ('Liberated Manuals', searcher.search_liberated_manuals),
-                ('Green Mountain', searcher.search_green_mountain),
-                ('Combat Index', searcher.search_combat_index),
-                ('Radio Nerds', searcher.search_radio_nerds)
-            ]
+            # 同时搜索的站点（经 searcher.search_site 与其他请求共享进行中的同站点搜索）
+            search_sites = ['Liberated Manuals', 'Green Mountain Generators', 'Combat Index', 'Radio Nerds']
+            skipped_sites = []
+            incomplete_sites = []
+            outstanding = set()
+            # 客户端断开时取消，所有后台搜索在探测和请求之间检查
+            cancel_token = CancellationToken()
+            
+            def heartbeat():
+                return ': keepalive\n\n'
+            
+            def run_in_background(func, *args, **kwargs):
+                """后台执行阻塞搜索，等待期间发送心跳；用法: result = yield from run_in_background(...)"""
+                future = stream_executor.submit(func, *args, **kwargs)
+                outstanding.add(future)
+                for _ in iter_completed_with_heartbeat([future]):
+                    if _ is None:
+                        yield heartbeat()
+                outstanding.discard(future)
+                return future.result()
+            
+            def format_site_result(result, site_name):
+                return {
+                    'title': result.get('title', f'Manual from {site_name}'),
+                    'url': result['url'],
+                    'description': result.get('description', f'Found on {site_name}'),
+                    'confidence': result.get('confidence', 90),
+                    'source': result.get('site', site_name),
+                    'verified': result.get('verified', True),
+                    'isPdfResult': result.get('method', '') != 'manual_fallback',
+                    'title_suffix': result.get('title_suffix', '')
+                }
             
             try:
                 # 发送开始信号
                 yield send_data('start', message='Search started with partial matching support')
                 
+                # 先查结果缓存；流式搜索只做精确匹配，结果与/search的排序和部分匹配结果不同，单独缓存
+                cached_results = get_cached_search_results(tm_number, model_number, STREAM_CACHE_NAMESPACE)
+                if cached_results is not None:
+                    yield send_data('status', message=f'Serving {len(cached_results)} cached result(s)')
+                    
+                    for result in cached_results:
+                        formatted_result = {
+                            'title': result.get('title', 'Cached manual'),
+                            'url': result['url'],
+                            'description': result.get('description', f"Found on {result.get('site', 'search')}"),
+                            'confidence': result.get('confidence', 90),
+                            'source': result.get('site', 'Cache'),
+                            'verified': result.get('verified', True),
+                            'isPdfResult': result.get('method', '') != 'manual_fallback',
+                            'title_suffix': result.get('title_suffix', ''),
+                            'cached': True
+                        }
+                        yield send_data('result', data=formatted_result)
+                        all_results.append(result)
+                
                 # TM搜索（支持部分匹配）
-                if tm_number:
+                if tm_number and cached_results is None:
                     yield send_data('status', message=f'Starting TM search: {tm_number}')
                     
                     tm_formats = searcher.format_tm_number(tm_number)
-                    found_exact = False
                     
-                    # 首先尝试精确匹配
-                    for site_name, search_method in search_methods:
-                        if site_name =='Radio Nerds' and len(all_results) > 0:
-                            yield send_data('status', message=f'Skipping RadioNerds - already found{len(all_results)} result(s)')
+                    # 所有站点同时精确搜索，哪个先完成就先推送哪个的结果
+                    site_futures = {}
+                    for site_name in search_sites:
+                        if site_name in skipped_sites or searcher.site_health.skip(site_name):
+                            if site_name not in skipped_sites:
+                                skipped_sites.append(site_name)
+                            yield send_data('status', message=f'Skipping {site_name} - temporarily unavailable (circuit open)')
                             continue
                         
-                        yield send_data('status', message=f'Searching {site_name} for exact match...')
+                        print(f"🔍 Searching {site_name} for exact TM...")
+                        future = searcher.site_executor.submit(searcher.search_site, site_name, tm_formats, cancel_token)
+                        site_futures[future] = site_name
+                        outstanding.add(future)
+                    
+                    if site_futures:
+                        yield send_data('status', message=f'Searching {len(site_futures)} site(s) for exact match...')
+                    
+                    # RadioNerds 只作为兜底：其他站点都没有结果时才推送它的结果
+                    radio_nerds_results = None
+                    for future in iter_completed_with_heartbeat(site_futures):
+                        if future is None:
+                            yield heartbeat()
+                            continue
                         
+                        outstanding.discard(future)
+                        site_name = site_futures[future]
                         try:
-                            print(f"🔍 Searching {site_name} for exact TM...")
-                            site_results = search_method(tm_formats)
-                            print(f"📊 {site_name} returned {len(site_results)} results")
-                            
-                            if site_results:
-                                found_exact = True
-                                for result in site_results:
-                                    formatted_result = {
-                                        'title': result.get('title', f'Manual from {site_name}'),
-                                        'url': result['url'],
-                                        'description': result.get('description', f'Found on {site_name}'),
-                                        'confidence': result.get('confidence', 90),
-                                        'source': result.get('site', site_name),
-                                        'verified': result.get('verified', True),
-                                        'isPdfResult': result.get('method', '') != 'manual_fallback',
-                                        'title_suffix': result.get('title_suffix', '')
-                                    }
-                                    
-                                    print(f"✅ Sending result: {formatted_result['title']}")
-                                    yield send_data('result', data=formatted_result)
-                                    all_results.append(result)
-                                
-                                yield send_data('status', message=f'Found {len(site_results)} results on {site_name}')
-                            else:
-                                yield send_data('status', message=f'No exact match on {site_name}')
-                                
+                            site_results = future.result()
                         except Exception as e:
                             error_msg = f'Error searching {site_name}: {str(e)}'
                             print(f"❌ {error_msg}")
+                            incomplete_sites.append(site_name)
                             yield send_data('status', message=error_msg)
+                            continue
+                        
+                        print(f"📊 {site_name} returned {len(site_results)} results")
+                        if site_name == 'Radio Nerds':
+                            radio_nerds_results = site_results
+                            continue
+                        
+                        if site_results:
+                            for result in site_results:
+                                formatted_result = format_site_result(result, site_name)
+                                print(f"✅ Sending result: {formatted_result['title']}")
+                                yield send_data('result', data=formatted_result)
+                                all_results.append(result)
+                            
+                            yield send_data('status', message=f'Found {len(site_results)} results on {site_name}')
+                        else:
+                            yield send_data('status', message=f'No exact match on {site_name}')
+                    
+                    if radio_nerds_results is not None:
+                        if all_results and radio_nerds_results:
+                            yield send_data('status', message=f'Skipping RadioNerds - already found {len(all_results)} result(s)')
+                        elif radio_nerds_results:
+                            for result in radio_nerds_results:
+                                formatted_result = format_site_result(result, 'Radio Nerds')
+                                print(f"✅ Sending result: {formatted_result['title']}")
+                                yield send_data('result', data=formatted_result)
+                                all_results.append(result)
+                            yield send_data('status', message=f'Found {len(radio_nerds_results)} results on Radio Nerds')
+                        else:
+                            yield send_data('status', message='No exact match on Radio Nerds')
                 
                 # 模型搜索
-                if not all_results and model_number:
+                if not all_results and model_number and cached_results is None:
                     yield send_data('status', message=f'Starting model search: {model_number}')
                     
                     # 检查映射
@@ -1285,7 +5226,11 @@ def search_stream_fixed():
                             yield send_data('status', message=f'Searching mapped TM: {tm_num}')
                             
                             # 递归调用TM搜索（会自动包含部分匹配）
-                            tm_results = searcher.search_tm_number(tm_num, max_results=3, use_partial_match=True)
+                            tm_results = yield from run_in_background(
+                                searcher.search_tm_number, tm_num, max_results=3, use_partial_match=True,
+                                skipped_sites=skipped_sites, cancel_token=cancel_token,
+                                incomplete_sites=incomplete_sites
+                            )
                             
                             for result in tm_results:
                                 result['title'] = f"{result['title']} (Mapped from {model_number})"
@@ -1311,7 +5256,11 @@ def search_stream_fixed():
                         yield send_data('status', message=f'No mapping found for {model_number}, trying direct search...')
                         
                         # 直接模型搜索作为备选
-                        model_results = searcher.search_model_number(model_number, max_results=3)
+                        model_results = yield from run_in_background(
+                            searcher.search_model_number, model_number, max_results=3,
+                            skipped_sites=skipped_sites, cancel_token=cancel_token,
+                            incomplete_sites=incomplete_sites
+                        )
                         
                         for result in model_results:
                             formatted_result = {
@@ -1327,21 +5276,34 @@ def search_stream_fixed():
                             yield send_data('result', data=formatted_result)
                             all_results.append(result)
                 
+                if cached_results is None and (all_results or not (skipped_sites or incomplete_sites)):
+                    store_search_results(tm_number, model_number, all_results, STREAM_CACHE_NAMESPACE)
+                
                 # 发送完成信号
                 print(f"📊 Final result count: {len(all_results)}")
                 if all_results:
                     final_message = f'Search completed successfully - found {len(all_results)} manual(s)'
-                    yield send_data('complete', message=final_message, data={'total': len(all_results), 'success': True})
+                    yield send_data('complete', message=final_message, data={'total': len(all_results), 'success': True, 'skipped_sites': skipped_sites})
                     print(f"✅ {final_message}")
                 else:
                     final_message = 'Search completed - no results found'
-                    yield send_data('complete', message=final_message, data={'total': 0, 'success': False})
+                    yield send_data('complete', message=final_message, data={'total': 0, 'success': False, 'skipped_sites': skipped_sites})
                     print(f"⚠️ {final_message}")
                     
+            except GeneratorExit:
+                print(f"🔌 Client disconnected, cancelling {len(outstanding)} outstanding search(es)")
+                cancel_stats.record('streams_disconnected')
+                raise
             except Exception as e:
                 error_msg = f'Search error: {str(e)}'
                 print(f"❌ {error_msg}")
                 yield send_data('error', message=error_msg)
+            finally:
+                # 客户端断开或出错时，取消尚未开始的站点搜索，已在运行的在下一次检查时停止
+                if outstanding:
+                    cancel_token.cancel()
+                for future in outstanding:
+                    future.cancel()
         
         return app.response_class(
             generate(),
@@ -1349,6 +5311,7 @@ def search_stream_fixed():
             headers={
                 'Cache-Control': 'no-cache',
                 'Connection': 'keep-alive',
+                'X-Accel-Buffering': 'no',
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Headers': 'Content-Type'
             }
@@ -1358,6 +5321,14 @@ def search_stream_fixed():
         print(f"❌ Stream endpoint error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def run_site_test(search_method, tm_formats):
+    """调用单个站点的搜索，请求出错时返回错误信息而不是让整个调试请求失败"""
+    try:
+        return search_method(tm_formats)
+    except SiteSearchError as e:
+        print(f"❌ {e}")
+        return {'error': str(e)}
+
 @app.route('/test-tm/<tm_number>', methods=['GET'])
 def test_tm_search(tm_number):
     """测试TM搜索功能 - 调试用"""
@@ -1373,22 +5344,22 @@ def test_tm_search(tm_number):
         
         # Liberated Manuals
         print("\n📚 Testing Liberated Manuals...")
-        lib_results = searcher.search_liberated_manuals(tm_formats)
+        lib_results = run_site_test(searcher.search_liberated_manuals, tm_formats)
         site_results['liberated_manuals'] = lib_results
         
         # Radio Nerds
         print("\n📻 Testing Radio Nerds...")
-        radio_results = searcher.search_radio_nerds(tm_formats)
+        radio_results = run_site_test(searcher.search_radio_nerds, tm_formats)
         site_results['radio_nerds'] = radio_results
         
         # Green Mountain
         print("\n🔧 Testing Green Mountain...")
-        gm_results = searcher.search_green_mountain(tm_formats)
+        gm_results = run_site_test(searcher.search_green_mountain, tm_formats)
         site_results['green_mountain'] = gm_results
         
         # Combat Index
         print("\n⚔️ Testing Combat Index...")
-        combat_results = searcher.search_combat_index(tm_formats)
+        combat_results = run_site_test(searcher.search_combat_index, tm_formats)
         site_results['combat_index'] = combat_results
         
         # 完整搜索
@@ -1410,6 +5381,64 @@ def test_tm_search(tm_number):
             'error': str(e)
         }), 500
 
+@app.route('/probe-stats', methods=['GET'])
+def probe_stats():
+    """每个候选URL模式的探测统计 - 查看哪些模式从未命中"""
+    return jsonify({
+        'success': True,
+        'patterns': searcher.get_probe_stats()
+    })
+
+@app.route('/site-health', methods=['GET'])
+def site_health():
+    """各站点的滚动错误率、延迟、健康分和熔断状态"""
+    return jsonify({
+        'success': True,
+        'sites': searcher.site_health.stats()
+    })
+
+@app.route('/tls-policy', methods=['GET'])
+def tls_policy():
+    """跳过SSL验证的主机、决策计数和最近的审计日志"""
+    return jsonify({
+        'success': True,
+        **searcher.tls_policy.stats()
+    })
+
+@app.route('/http-stats', methods=['GET'])
+def http_stats():
+    """HTTP连接池统计 - 复用率低或等待多时调大HTTP_POOL_MAXSIZE"""
+    return jsonify({
+        'success': True,
+        'search': searcher.http.stats(),
+        'ocr': ocr_http.stats()
+    })
+
+@app.route('/ocr-backends', methods=['GET'])
+def ocr_backend_status():
+    """各OCR后端是否可用及调用延迟统计"""
+    return jsonify({
+        'success': True,
+        **ocr_backend_stats.stats()
+    })
+
+@app.route('/tm-index/<tm_prefix>', methods=['GET'])
+def tm_index_lookup(tm_prefix):
+    """查询TM前缀树 - 前缀下的所有TM号以及最接近的兄弟TM号"""
+    start_time = time.time()
+    
+    matches = searcher.tm_index.under(tm_prefix)
+    closest = searcher.tm_index.closest_sibling(tm_prefix) if len(TMPrefixIndex.split(tm_prefix)) >= 4 else None
+    
+    return jsonify({
+        'success': True,
+        'prefix': tm_prefix,
+        'matches': matches,
+        'closest_sibling': closest,
+        'indexed_tm_numbers': searcher.tm_index.size,
+        'elapsed_ms': round((time.time() - start_time) * 1000, 3)
+    })
+
 @app.route('/list-mappings', methods=['GET'])
 def list_mappings():
     """列出所有模型到TM的映射"""
@@ -1441,6 +5470,30 @@ def index():
     except FileNotFoundError:
         return jsonify({"error": "HTML interface not found"}), 404
     
+def init_worker():
+    """每个服务进程开始接收请求前调用一次
+
+    python ocr_server.py 在 app.run 之前调用，gunicorn 在 post_worker_init 钩子中调用。
+    搜索器、HTTP会话、线程池和SQLite连接在导入模块时按进程创建（gunicorn 不预加载应用），
+    这里只启动需要在进程间协调的后台任务
+    """
+    print(f"🚀 Worker {os.getpid()} ready")
+    start_catalog_refresher()
+
+def shutdown_worker():
+    """进程退出前调用：取消排队中的后台任务，关闭出站连接池"""
+    for executor in (searcher.site_executor, searcher.probe_executor, searcher.throttled_site_executor,
+                     searcher.throttled_probe_executor, stream_executor,
+                     bulk_executor, batch_executor, ocr_jobs.executor):
+        executor.shutdown(wait=False, cancel_futures=True)
+    searcher.session.close()
+    ocr_session.close()
+    if searcher.page_cache is not None:
+        searcher.page_cache.flush()
+    if async_searcher is not None:
+        async_searcher.shutdown()
+    print(f"👋 Worker {os.getpid()} stopped")
+
 if __name__ == '__main__':
     print("🎯 启动增强智能军用手册搜索系统 - 支持部分TM匹配")
     print("\n📋 新功能特性:")
@@ -1450,11 +5503,21 @@ if __name__ == '__main__':
     print("  ✅ 智能降级搜索策略")
     
     print("\n🌐 API端点:")
-    print("  POST /extract - OCR提取铭牌信息")
+    print("  POST /extract - OCR提取铭牌信息（?backend=azure|tesseract|auto）")
+    print("  POST /extract-jobs - 异步OCR任务（GET /extract-jobs/<id> 查询）")
+    print("  POST /extract-batch - 批量OCR（SSE流式返回）")
     print("  POST /search - 增强智能搜索（支持部分匹配）")
+    print("  POST /search-async - 与 /search 相同，使用 asyncio 搜索引擎（需要 aiohttp）")
     print("  POST /search-stream-fixed - 实时流式搜索")
+    print("  POST /search-bulk - 批量TM/模型号解析（CSV或JSONL，NDJSON流式返回）")
     print("  GET  /test-partial-match/<tm> - 测试部分匹配")
     print("  GET  /list-mappings - 列出所有映射")
+    print("  GET  /probe-stats - URL模式探测统计")
+    print("  GET  /tm-index/<tm> - TM前缀查询")
+    print("  GET  /ocr-backends - OCR后端可用性和延迟统计")
+    print("  GET  /http-stats - HTTP连接池统计")
+    print("  GET  /site-health - 站点健康和熔断状态")
+    print("  GET  /tls-policy - SSL验证回退策略和审计日志")
     print("  GET  /health - 系统健康检查")
     
     print("\n📊 搜索策略:")
@@ -1498,6 +5561,9 @@ if __name__ == '__main__':
     
     print("\n🌐 服务器启动在 http://127.0.0.1:3000")
     print("📌 完整功能已启用：部分匹配、5段TM、直接PDF链接")
+    print("⚠️ 开发服务器，生产环境请使用: gunicorn -c gunicorn.conf.py ocr_server:app")
+
+    init_worker()
 
     port = int(os.environ.get('PORT', 3000))
     app.run(host="0.0.0.0", port=port, debug=False)
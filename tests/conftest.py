@@ -0,0 +1,15 @@
+"""测试共用的环境：结果缓存写到临时目录，关闭页面缓存和本地索引，不读写仓库里的数据库"""
+import os
+import sys
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix='ocr-server-tests-')
+os.environ.update({
+    'RESULT_CACHE_ENABLED': '1',
+    'RESULT_CACHE_PATH': os.path.join(_tmpdir, 'search_cache.db'),
+    'OCR_CACHE_ENABLED': '0',
+    'PAGE_CACHE_ENABLED': '0',
+    'CATALOG_ENABLED': '0',
+    'SEARCH_DEADLINE': '10',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+"""页面缓存：读取不写数据库，LRU淘汰仍按最近访问时间"""
+import os
+import tempfile
+import unittest
+
+import ocr_server
+
+
+class PageCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(prefix='page-cache-'), 'page_cache.db')
+        self.links = [(f'/TM-9-6115-{n}-10.pdf', f'TM 9-6115-{n}-10') for n in range(20)]
+
+    def make_cache(self, max_bytes=10 * 1024 * 1024, access_flush_interval=3600):
+        return ocr_server.PageCache(self.path, max_bytes, access_flush_interval)
+
+    def stored_access(self, cache, url):
+        return cache.conn.execute('SELECT last_access FROM page_cache WHERE url = ?', (url,)).fetchone()[0]
+
+    def test_get_does_not_write(self):
+        cache = self.make_cache()
+        cache.set('https://a/', '"a"', None, self.links, 1000)
+        stored = self.stored_access(cache, 'https://a/')
+
+        for _ in range(5):
+            self.assertEqual(cache.get('https://a/')['links'], self.links)
+
+        self.assertFalse(cache.conn.in_transaction)
+        self.assertEqual(self.stored_access(cache, 'https://a/'), stored)
+        cache.flush()
+        self.assertGreater(self.stored_access(cache, 'https://a/'), stored)
+
+    def test_eviction_uses_in_memory_access_times(self):
+        entry_size = len(ocr_server.json.dumps(self.links))
+        cache = self.make_cache(max_bytes=entry_size * 4 + entry_size // 2)
+        for name in ('a', 'b', 'c'):
+            cache.set(f'https://{name}/', f'"{name}"', None, self.links, 1000)
+        # a 最早写入，但刚被读过，应该淘汰 b
+        cache.get('https://a/')
+        cache.set('https://d/', '"d"', None, self.links, 1000)
+        cache.set('https://e/', '"e"', None, self.links, 1000)
+
+        self.assertIsNotNone(cache.get('https://a/'))
+        self.assertIsNone(cache.get('https://b/'))
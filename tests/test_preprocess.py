@@ -0,0 +1,47 @@
+"""OCR上传前的图片预处理"""
+import io
+import unittest
+
+import ocr_server
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+
+def make_jpeg(width, height):
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    for y in range(100, height - 100, 200):
+        draw.text((100, y), 'TM 9-6115-639-13  MODEL MEP-803A  SERIAL 12345', fill='black')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+@unittest.skipIf(Image is None or not ocr_server.OCR_PREPROCESS, 'Pillow not installed or preprocessing disabled')
+class PreprocessImageTests(unittest.TestCase):
+
+    def test_large_jpeg_under_byte_budget_is_downscaled(self):
+        width, height = ocr_server.OCR_MAX_DIMENSION * 2, ocr_server.OCR_MAX_DIMENSION * 3 // 2
+        data = make_jpeg(width, height)
+        self.assertLess(len(data), ocr_server.OCR_TARGET_BYTES)
+
+        out, info = ocr_server.preprocess_image(data)
+
+        self.assertIsNot(out, data)
+        self.assertTrue(info['applied'])
+        uploaded_size = list(Image.open(io.BytesIO(out)).size)
+        self.assertLessEqual(max(uploaded_size), ocr_server.OCR_MAX_DIMENSION)
+        self.assertEqual(info['processed_size'], uploaded_size)
+        self.assertEqual(info['original_size'], [width, height])
+
+    def test_small_image_is_uploaded_unchanged(self):
+        data = make_jpeg(800, 600)
+
+        out, info = ocr_server.preprocess_image(data)
+
+        self.assertIs(out, data)
+        self.assertFalse(info['applied'])
+        self.assertEqual(info['processed_size'], [800, 600])
@@ -0,0 +1,84 @@
+"""站点请求出错时的空结果不能写入结果缓存
+
+python -m pytest tests
+"""
+import io
+import unittest
+from unittest import mock
+
+import requests
+
+import ocr_server
+
+GREEN_MOUNTAIN_HOST = 'greenmountaingenerators.com'
+
+
+def make_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers['Content-Type'] = 'text/html'
+    response.raw = io.BytesIO(b'')
+    return response
+
+
+class FakeSession:
+    """其他站点都返回404；failing_host 的请求抛出 ConnectionError"""
+
+    def __init__(self, failing_host=None):
+        self.failing_host = failing_host
+        self.requests = []
+
+    def _request(self, url, **kwargs):
+        self.requests.append(url)
+        if self.failing_host and self.failing_host in url:
+            raise requests.exceptions.ConnectionError(f"connection refused: {url}")
+        return make_response(404)
+
+    def get(self, url, **kwargs):
+        return self._request(url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self._request(url, **kwargs)
+
+
+class SearchResultCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.searcher = ocr_server.searcher
+        # 每个测试从关闭的熔断器开始
+        self.searcher.site_health = ocr_server.SiteHealthTracker(
+            ocr_server.SITE_HEALTH_WINDOW, ocr_server.SITE_BREAKER_FAILURES, ocr_server.SITE_BREAKER_ERROR_RATE,
+            ocr_server.SITE_BREAKER_MIN_CALLS, ocr_server.SITE_BREAKER_COOLDOWN
+        )
+
+    def search(self, tm_number, session):
+        with mock.patch.object(self.searcher, 'session', session):
+            return ocr_server.search_manual_pdfs_realistic(tm_number)
+
+    def test_site_error_is_not_negative_cached(self):
+        session = FakeSession(failing_host=GREEN_MOUNTAIN_HOST)
+        results = self.search('9-6115-639-10', session)
+
+        self.assertEqual(results[0]['method'], 'manual_fallback')
+        self.assertTrue(any(GREEN_MOUNTAIN_HOST in url for url in session.requests))
+        self.assertIsNone(ocr_server.get_cached_search_results('9-6115-639-10', None))
+
+    def test_complete_empty_search_is_negative_cached(self):
+        results = self.search('9-6115-639-11', FakeSession())
+
+        self.assertEqual(results[0]['method'], 'manual_fallback')
+        self.assertEqual(ocr_server.get_cached_search_results('9-6115-639-11', None), [])
+
+    def test_site_methods_report_request_errors(self):
+        tm_formats = self.searcher.format_tm_number('9-6115-639-12')
+        session = FakeSession(failing_host=GREEN_MOUNTAIN_HOST)
+        with mock.patch.object(self.searcher, 'session', session):
+            with self.assertRaises(ocr_server.SiteSearchError):
+                self.searcher.search_green_mountain(tm_formats)
+
+        with mock.patch.object(self.searcher, 'session', FakeSession(failing_host='liberatedmanuals.com')):
+            with self.assertRaises(ocr_server.SiteSearchError):
+                self.searcher.search_liberated_manuals(tm_formats)
+
+        with mock.patch.object(self.searcher, 'session', FakeSession()):
+            self.assertEqual(self.searcher.search_green_mountain(tm_formats), [])
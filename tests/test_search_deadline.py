@@ -0,0 +1,48 @@
+"""兄弟TM号和映射TM号的后备搜索共用一次搜索的deadline"""
+import time
+import unittest
+from unittest import mock
+
+import ocr_server
+
+SITE_DELAY = 0.8
+DEADLINE = 1.0
+
+
+class SearchDeadlineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.searcher = ocr_server.searcher
+        self.searched = []
+
+    def slow_site(self, site_config, tm_formats, cancel_token=None):
+        self.searched.append(tm_formats['tm_dashed'])
+        time.sleep(SITE_DELAY)
+        return []
+
+    def test_sibling_search_uses_remaining_time(self):
+        self.searcher.tm_index.add('9-6115-640-12')
+        incomplete_sites = []
+        with mock.patch.object(self.searcher, 'search_site_intelligently', self.slow_site):
+            start = time.time()
+            results = self.searcher.search_tm_number('9-6115-640-10', parallel=True, deadline=DEADLINE,
+                                                     incomplete_sites=incomplete_sites)
+            elapsed = time.time() - start
+
+        self.assertEqual(results, [])
+        self.assertIn('9-6115-640-12', self.searched)
+        self.assertLess(elapsed, DEADLINE + SITE_DELAY / 2)
+        self.assertTrue(incomplete_sites)
+
+    def test_mapped_tm_searches_share_one_deadline(self):
+        incomplete_sites = []
+        with mock.patch.object(self.searcher, 'search_site_intelligently', self.slow_site), \
+                mock.patch.object(self.searcher.model_mapper, 'find_tm_numbers_for_model',
+                                  return_value=['9-6115-641-10', '9-6115-642-10', '9-6115-643-10']), \
+                mock.patch.object(self.searcher, 'fetch_links', return_value=iter([])):
+            start = time.time()
+            self.searcher.search_model_number('MEP-TEST', deadline=DEADLINE, incomplete_sites=incomplete_sites)
+            elapsed = time.time() - start
+
+        self.assertLess(elapsed, DEADLINE + SITE_DELAY)
+        self.assertIn('TM 9-6115-643-10', incomplete_sites)